@@ -0,0 +1,247 @@
+# bench_api.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+"""
+Throughput, latency, CPU and memory benchmark of API traffic against the mock TV in mock_tv.py.
+
+Measures single commands over HTTP (port 1925 semantics) and HTTPS with digest auth (port 1926 semantics), the MQTT
+status update cycle, buffered and streamed channel list parsing, Wake-on-LAN power-on until the API is ready, TV
+discovery with capability detection, key sequences sent one command at a time and paced with run_keys (counting the
+keys the mock drops), Ambilight pixel streaming, and rendering and caching Ambilight effects (both need numpy). The
+mock runs in its own process, so the CPU time reported is Pylips' own.
+
+Usage: python benchmarks/bench_api.py [--runs 200] [--latency 0] [--drop-rate 0] [--json]
+"""
+
+import argparse
+import configparser
+import json
+import logging
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pylips  # noqa: E402
+from pylips_tools.tools_commands import load_command_index  # noqa: E402
+from pylips_tools.tools_discovery import discover  # noqa: E402
+from pylips_tools.tools_stream import CHANNELS_PATH  # noqa: E402
+
+SETTINGS = """[DEFAULT]
+verbose = False
+mqtt_listen = False
+mqtt_update = False
+num_retries = 3
+update_interval = 5
+request_deadline = 10
+retry_delay = 0.01
+power_on_timeout = 10
+wol_broadcast = 127.0.0.1
+wol_port = %(wol)d
+
+[TV]
+host = 127.0.0.1
+port = %(port)d
+apiv = 6
+user = %(user)s
+pass = %(pass)s
+protocol = %(protocol)s
+
+[MQTT]
+host =
+port =
+user =
+pass =
+tls = False
+cert_path =
+topic_pylips = pylips/cmd
+topic_status = pylips/status
+"""
+
+
+class NullMQTT:
+    """
+    Stand-in MQTT client that counts published messages.
+    """
+
+    def __init__(self):
+        self.published = 0
+
+    def publish(self, topic, payload, retain=False):
+        self.published += 1
+
+
+def start_mock(options):
+    """
+    Start mock_tv.py in a subprocess on free ports.
+
+    Returns:
+        tuple: Process and its ready line (ports, tls, credentials).
+    """
+    command = [
+        sys.executable, os.path.join(ROOT, "benchmarks", "mock_tv.py"), "--http-port", "0", "--https-port", "0",
+        "--latency", str(options.latency), "--jitter", str(options.jitter), "--error-rate", str(options.error_rate),
+        "--drop-rate", str(options.drop_rate), "--wake-delay", str(options.wake_delay), "--key-time",
+        str(options.key_time)
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    return process, json.loads(process.stdout.readline())
+
+
+def create_client(mock, secure):
+    """
+    Create a Pylips instance for the mock TV without running the CLI.
+
+    Args:
+        mock (dict): Ready line of the mock.
+        secure (bool): Use the HTTPS + digest auth port.
+
+    Returns:
+        Pylips: Configured instance.
+    """
+    config = configparser.ConfigParser()
+    config.read_string(SETTINGS % {
+        "port": mock["https"] if secure else mock["http"], "wol": mock["wol"], "user": mock["user"] if secure else "",
+        "pass": mock["pass"] if secure else "", "protocol": "https://" if secure and mock["tls"] else "http://"
+    })
+    available_commands, commands = load_command_index(os.path.join(ROOT, "available_commands.json"))
+    pylips.args = pylips.parse_args([])
+    parent = SimpleNamespace(
+        config=config, verbose=False, available_commands=available_commands, commands=commands, metrics=None
+    )
+    client = pylips.Pylips(None, "TV", parent)
+    client.mqtt = NullMQTT()
+    return client
+
+
+def measure(function, runs):
+    """
+    Call a function repeatedly and measure it.
+
+    Args:
+        function (callable): Operation to measure.
+        runs (int): Number of calls.
+
+    Returns:
+        dict: Operations per second, p50 and p99 latency in milliseconds, CPU milliseconds per operation.
+    """
+    function()
+    durations = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    durations.sort()
+    return {
+        "ops_per_s": runs / wall,
+        "p50_ms": statistics.median(durations) * 1000,
+        "p99_ms": durations[min(len(durations) - 1, int(len(durations) * 0.99))] * 1000,
+        "cpu_ms_per_op": cpu / runs * 1000
+    }
+
+
+def bench_scenarios(mock, runs, wake_delay):
+    """
+    Run every scenario.
+
+    Returns:
+        dict: Measurements keyed by scenario name.
+    """
+    results = {}
+    for scheme, secure in (("http", False), ("https+digest", True)):
+        client = create_client(mock, secure)
+        results[scheme + " get powerstate"] = measure(lambda: client.get("powerstate", False, 0, False), runs)
+        results[scheme + " command volume_up"] = measure(
+            lambda: client.run_command("volume_up", verbose=False, callback=False, print_response=False), runs
+        )
+        results[scheme + " update cycle"] = measure(client.mqtt_update_cycle, max(1, runs // 5))
+    client = create_client(mock, False)
+    list_runs = max(1, runs // 20)
+    results["channel list json.loads"] = measure(
+        lambda: json.loads(client.get(CHANNELS_PATH + "all", False, 0, False))["Channel"], list_runs
+    )
+    results["channel list streamed"] = measure(lambda: list(client.iter_channels()), list_runs)
+    results["channel list first record"] = measure(lambda: next(iter(client.iter_channels())), list_runs)
+    client.learn_mac()
+
+    def wake():
+        client.session.post(client.base_url.rsplit("/", 2)[0] + "/mock/sleep")
+        client.power_on()
+
+    results["power on (wol, %gs wake delay)" % wake_delay] = measure(wake, 3)
+    ports = ((mock["https"], "https://" if mock["tls"] else "http://"), (mock["http"], "http://"))
+    results["discover + capability profile"] = measure(lambda: discover(client, "127.0.0.1", ports), 5)
+    keys = ["digit_1", "digit_2", "cursor_down", "confirm"]
+    stats_url = client.base_url.rsplit("/", 2)[0] + "/mock/stats"
+    key_runs = max(1, runs // 20)
+    for scenario, send in (
+        ("4 keys run_command", lambda: [client.run_command(key, verbose=False, print_response=False) for key in keys]),
+        ("4 keys run_keys", lambda: client.run_keys(keys))
+    ):
+        time.sleep(0.1)
+        dropped = client.session.get(stats_url).json()["dropped_keys"]
+        results[scenario] = measure(send, key_runs)
+        dropped = client.session.get(stats_url).json()["dropped_keys"] - dropped
+        results[scenario]["dropped_keys_per_op"] = dropped / (key_runs + 1)
+    try:
+        import numpy as np
+        from pylips_tools.tools_ambilight import AmbilightStreamer
+    except ImportError:
+        logging.warning("numpy is not installed, skipping Ambilight streaming")
+        return results
+    client = create_client(mock, False)
+    streamer = AmbilightStreamer(client)
+    frames = np.random.default_rng(0).integers(0, 256, (16,) + streamer.topology.shape, dtype=np.uint8)
+    counter = iter(range(sys.maxsize))
+    results["ambilight frame"] = measure(lambda: streamer.send(frames[next(counter) % len(frames)]), runs)
+    from pylips_tools.tools_effects import EffectCache, render_effect
+    cache = EffectCache()
+    results["effect render (rainbow loop)"] = measure(
+        lambda: render_effect(streamer.topology, "rainbow", {"period": 10}, 20), max(1, runs // 10)
+    )
+    results["effect cached (rainbow loop)"] = measure(
+        lambda: cache.frames(streamer.topology, "rainbow", {"period": 10}, 20), runs
+    )
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark Pylips API traffic against a mock TV")
+    parser.add_argument("--runs", type=int, default=200, help="Number of operations per scenario")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the mock adds to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra latency of the mock")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests the mock fails with 500")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Share of connections the mock drops")
+    parser.add_argument("--wake-delay", type=float, default=0.5, help="Seconds the mock takes to wake up")
+    parser.add_argument("--key-time", type=float, default=0.02, help="Seconds a navigation key takes on the mock")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    options = parser.parse_args()
+    logging.disable(logging.INFO)
+    process, ready = start_mock(options)
+    try:
+        measurements = bench_scenarios(ready, options.runs, options.wake_delay)
+    finally:
+        process.terminate()
+        process.wait()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    if options.json:
+        print(json.dumps({"scenarios": measurements, "peak_rss_mb": peak_rss, "tls": ready["tls"]}, indent=2))
+    else:
+        for scenario, result in measurements.items():
+            print("%-32s %8.1f ops/s  p50 %7.2f ms  p99 %7.2f ms  cpu %6.2f ms/op%s" % (
+                scenario, result["ops_per_s"], result["p50_ms"], result["p99_ms"], result["cpu_ms_per_op"],
+                "  dropped keys %.2f/op" % result["dropped_keys_per_op"] if "dropped_keys_per_op" in result else ""
+            ))
+        print("peak RSS: %.1f MB%s" % (peak_rss, "" if ready["tls"] else " (digest port without TLS)"))
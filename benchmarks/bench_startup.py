@@ -0,0 +1,119 @@
+# bench_startup.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+"""
+Startup-time benchmark for one-shot CLI invocations.
+
+Usage: python benchmarks/bench_startup.py [--runs 20]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pylips_tools.tools_commands import CommandRegistry, load_command_index  # noqa: E402
+
+SETTINGS = """[DEFAULT]
+verbose = False
+mqtt_listen = False
+mqtt_update = False
+num_retries = 1
+update_interval = 5
+
+[TV]
+host = 127.0.0.1
+port = 1925
+apiv = 6
+user =
+pass =
+protocol = http://
+
+[MQTT]
+host =
+port =
+user =
+pass =
+tls = False
+cert_path =
+topic_pylips =
+topic_status =
+"""
+
+HEAVY_MODULES = ("paho", "httpx", "aiomqtt", "numpy")
+
+
+def time_call(function, runs):
+    """
+    Time a function.
+
+    Args:
+        function (callable): Function to time.
+        runs (int): Number of calls.
+
+    Returns:
+        float: Median duration in milliseconds.
+    """
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+def bench_command_index(runs):
+    """
+    Compare parsing and compiling available_commands.json with loading the cached index.
+    """
+    json_path = os.path.join(ROOT, "available_commands.json")
+
+    def parse_json():
+        with open(json_path) as json_file:
+            CommandRegistry(json.load(json_file))
+
+    load_command_index(json_path)
+    json_ms = time_call(parse_json, runs * 10)
+    cached_ms = time_call(lambda: load_command_index(json_path), runs * 10)
+    print("command index: json %.3f ms, cached %.3f ms (%.1fx)" % (json_ms, cached_ms, json_ms / cached_ms))
+
+
+def bench_cli(runs):
+    """
+    Time complete one-shot CLI invocations that exit without network traffic.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        settings_path = os.path.join(directory, "settings.ini")
+        with open(settings_path, "w") as settings_file:
+            settings_file.write(SETTINGS)
+        command = [
+            sys.executable, os.path.join(ROOT, "pylips.py"), "--config", settings_path, "--command",
+            "__startup_benchmark__"
+        ]
+        interpreter_ms = time_call(lambda: subprocess.run([sys.executable, "-c", "pass"], check=True), runs)
+        cli_ms = time_call(lambda: subprocess.run(command, capture_output=True, check=True), runs)
+    print("interpreter: %.1f ms, one-shot CLI: %.1f ms (%.1f ms over bare interpreter)" % (
+        interpreter_ms, cli_ms, cli_ms - interpreter_ms
+    ))
+    probe = "import sys; import pylips; print(','.join(m for m in %r if m in sys.modules))" % (HEAVY_MODULES,)
+    loaded = subprocess.run(
+        [sys.executable, "-c", probe], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout.strip()
+    print("optional modules imported at startup: %s" % (loaded or "none"))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark Pylips startup time")
+    parser.add_argument("--runs", type=int, default=20, help="Number of runs per measurement")
+    options = parser.parse_args()
+    bench_command_index(options.runs)
+    bench_cli(options.runs)
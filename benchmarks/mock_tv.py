@@ -0,0 +1,634 @@
+# mock_tv.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+"""
+Local stand-in for a Philips TV's JointSpace API, for benchmarks and manual testing.
+
+GET responses start from the JSON examples in docs/Chapters and change with the POST requests Pylips sends
+(keys, ambilight, settings, volume, channels, apps). notifychange long-polls like the real endpoint. Plain HTTP is
+served like port 1925, HTTPS with digest auth like port 1926 (with a self-signed certificate made by openssl,
+or plain HTTP with digest auth if openssl is missing). Latency, dropped connections and server errors can be
+injected. With --asleep the TV starts in standby and only answers once a Wake-on-LAN packet arrived on the UDP
+port in the ready line; POST /mock/sleep puts it back to sleep. With --key-time navigation keys take that long
+to answer and keys sent too soon after are dropped, like a TV whose menu is still animating. GET /mock/stats
+returns the request counters.
+
+Usage: python benchmarks/mock_tv.py [--http-port 1925] [--https-port 1926] [--latency 0.02] [--drop-rate 0.01]
+"""
+
+import argparse
+import ast
+import collections
+import hashlib
+import http.server
+import json
+import os
+import random
+import re
+import secrets
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+DOCS = os.path.join(ROOT, "docs", "Chapters")
+
+REALM = "XTV"
+MAC = "70:C9:4E:47:8D:82"
+LAYERED = ("ambilight/cached", "ambilight/measured", "ambilight/processed")
+# Keys that move through menus, dropped while the UI is still busy with the last one if --key-time is set
+NAVIGATION_KEYS = ("Cursor", "Digit", "Confirm", "Back", "Home", "Options")
+
+
+def parse_example(source):
+    """
+    Parse a JSON example of the docs, some of which are written as Python literals.
+
+    Args:
+        source (str): Example text.
+
+    Returns:
+        object: Parsed example, None if it can not be parsed.
+    """
+    try:
+        return json.loads(source)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(source)
+    except (ValueError, SyntaxError):
+        return None
+
+
+def channel_list(count):
+    """
+    Generate a channel list the size of a cable or satellite line-up.
+
+    Args:
+        count (int): Number of channels.
+
+    Returns:
+        dict: Response of channeldb/tv/channelLists/all.
+    """
+    return {
+        "id": "all", "version": 1, "listType": "MixedSources", "medium": "mixed", "operator": "None",
+        "installCountry": "Germany",
+        "Channel": [
+            {
+                "ccid": 100 + index, "preset": str(index + 1), "name": "Channel %d HD" % (index + 1), "onid": 1,
+                "tsid": 1000 + index // 8, "sid": 28000 + index, "serviceType": "audio_video", "type": "DVB_S",
+                "logoVersion": 33
+            } for index in range(count)
+        ]
+    }
+
+
+def settings_structure(menus=12, items=10):
+    """
+    Generate a settings menu structure with a few levels of nodes.
+
+    The documented example elides its children, so the tree is generated.
+
+    Args:
+        menus (int): Number of top-level menus.
+        items (int): Number of items per menu and per submenu.
+
+    Returns:
+        dict: Response of menuitems/settings/structure.
+    """
+    node_ids = iter(range(2131230748, 2131240000))
+
+    def node(context, children=(), node_type="SLIDER_NODE"):
+        return {
+            "node_id": next(node_ids), "type": node_type, "string_id": "org.droidtv.ui.strings.R.string." + context,
+            "context": context, "data": {"nodes": list(children)} if len(children) > 0 else {"min": 0, "max": 10}
+        }
+
+    return {
+        "node": node("MAIN_VB_SETUP", [
+            node("menu_%d" % menu, [
+                node("menu_%d_item_%d" % (menu, item), [
+                    node("menu_%d_item_%d_option_%d" % (menu, item, option), node_type="TOGGLE_NODE")
+                    for option in range(items)
+                ] if item % 2 == 0 else []) for item in range(items)
+            ], "PARENT_NODE") for menu in range(menus)
+        ], "PARENT_NODE")
+    }
+
+
+def load_examples(directory=DOCS):
+    """
+    Read the GET response examples and the POST endpoints documented in docs/Chapters.
+
+    Args:
+        directory (str): Directory of the API docs.
+
+    Returns:
+        tuple: GET responses by path and the set of documented POST paths.
+    """
+    responses = {}
+    post_paths = set()
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name)) as doc_file:
+            text = doc_file.read()
+        title = re.match(r"# REST API Method: (GET|POST) (\S+)", text)
+        if title is None:
+            continue
+        method, path = title.groups()
+        if method == "POST":
+            post_paths.add(path)
+            continue
+        example = re.search(r"#+ JSON example\s*(?:```(?:json)?\s*(.*?)```|`([^`]+)`)", text, re.S)
+        if example is not None:
+            value = parse_example(example.group(1) or example.group(2))
+            if value is not None:
+                responses[path] = value
+    return responses, post_paths
+
+
+class MockTV:
+    """
+    State of the simulated TV, shared by its HTTP and HTTPS servers.
+    """
+
+    def __init__(self, powerstate="On", latency=0.0, jitter=0.0, error_rate=0.0, drop_rate=0.0, user="pylips",
+                 password="pylips", notify_timeout=30.0, channels=1000, wake_delay=2.0, key_time=0.0):
+        """
+        Initialize the TV.
+
+        Args:
+            powerstate (str): Initial power state.
+            latency (float): Seconds added to every request.
+            jitter (float): Up to this many seconds are added to the latency at random.
+            error_rate (float): Share of requests answered with HTTP 500.
+            drop_rate (float): Share of requests whose connection is closed without a response.
+            user (str): Digest auth user.
+            password (str): Digest auth password.
+            notify_timeout (float): Seconds a notifychange request is held open.
+            channels (int): Number of channels in the generated channel list.
+            wake_delay (float): Seconds the network stack takes to come up after a Wake-on-LAN packet.
+            key_time (float): Seconds a navigation key takes before it is answered; the UI stays busy for as long
+                again and drops navigation keys arriving meanwhile.
+
+        Returns:
+            None
+        """
+        self.state, self.post_paths = load_examples()
+        self.state["powerstate"] = {"powerstate": powerstate}
+        self.state["channeldb/tv/channelLists/all"] = channel_list(channels)
+        self.state["menuitems/settings/structure"] = settings_structure()
+        self.state.setdefault("HueLamp/power", {"power": "Off"})
+        topology = self.state.setdefault(
+            "ambilight/topology", {"layers": 1, "left": 4, "top": 6, "right": 4, "bottom": 0}
+        )
+        for path in LAYERED:
+            self.state[path] = self.black_frame(topology)
+        self.settings = {}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.user = user
+        self.password = password
+        self.notify_timeout = notify_timeout
+        self.nonce = secrets.token_hex(16)
+        self.condition = threading.Condition()
+        self.requests = collections.Counter()
+        self.challenges = 0
+        self.frames = 0
+        self.keys = []
+        self.state["network/devices"] = [{"mac": MAC, "ip": "127.0.0.1", "type": "Wifi", "wake-on-lan": "Enabled"}]
+        self.wake_delay = wake_delay
+        self.asleep = False
+        self.wake_at = None
+        self.wol_packets = 0
+        self.key_time = key_time
+        self.key_lock = threading.Lock()
+        self.busy_until = 0.0
+        self.dropped_keys = 0
+
+    def sleep(self):
+        """
+        Switch to standby with the network stack asleep, so requests go unanswered until a Wake-on-LAN packet.
+
+        Returns:
+            None
+        """
+        with self.condition:
+            self.asleep = True
+            self.wake_at = None
+            self.state["powerstate"] = {"powerstate": "Standby"}
+
+    def is_asleep(self):
+        """
+        Return whether the network stack is asleep, waking it up once the wake delay passed.
+
+        Returns:
+            bool: True while requests go unanswered.
+        """
+        if self.asleep and self.wake_at is not None and time.monotonic() >= self.wake_at:
+            self.asleep = False
+        return self.asleep
+
+    def wake_on_lan(self, packet):
+        """
+        Handle a UDP packet sent to the Wake-on-LAN port.
+
+        Args:
+            packet (bytes): Packet.
+
+        Returns:
+            None
+        """
+        if packet == b"\xff" * 6 + bytes.fromhex(MAC.replace(":", "")) * 16:
+            self.wol_packets += 1
+            if self.asleep and self.wake_at is None:
+                self.wake_at = time.monotonic() + self.wake_delay
+
+    @staticmethod
+    def black_frame(topology):
+        """
+        Build a layered ambilight document with every pixel off.
+
+        Args:
+            topology (dict): ambilight/topology response.
+
+        Returns:
+            dict: Layered document.
+        """
+        sides = ("left", "top", "right", "bottom")
+        return {
+            "layer%d" % (layer + 1): {
+                side: {str(index): {"r": 0, "g": 0, "b": 0} for index in range(int(topology.get(side, 0)))}
+                for side in sides if int(topology.get(side, 0)) > 0
+            } for layer in range(int(topology["layers"]))
+        }
+
+    def set(self, path, value):
+        """
+        Change a GET response and wake up notifychange requests.
+
+        Args:
+            path (str): Endpoint path.
+            value (object): New response.
+
+        Returns:
+            None
+        """
+        with self.condition:
+            self.state[path] = value
+            self.condition.notify_all()
+
+    def get(self, path):
+        """
+        Answer a GET request.
+
+        Args:
+            path (str): Endpoint path.
+
+        Returns:
+            tuple: HTTP status and response object.
+        """
+        with self.condition:
+            if path in self.state:
+                return 200, self.state[path]
+        return 404, None
+
+    def post(self, path, body):
+        """
+        Answer a POST request and apply it to the state.
+
+        Args:
+            path (str): Endpoint path.
+            body (object): Decoded request body.
+
+        Returns:
+            tuple: HTTP status and response object, None for an empty response.
+        """
+        if path == "notifychange":
+            return 200, self.notifychange(body.get("notification", {}))
+        if path == "input/key":
+            return self.press(body.get("key", ""))
+        if path in LAYERED:
+            self.frames += 1
+            with self.condition:
+                frame = self.state["ambilight/cached"]
+                for layer, sides in body.items():
+                    for side, pixels in sides.items():
+                        frame.setdefault(layer, {}).setdefault(side, {}).update(pixels)
+                self.condition.notify_all()
+            return 200, None
+        if path == "menuitems/settings/update":
+            for value in body.get("values", []):
+                self.settings[value["value"]["Nodeid"]] = value["value"].get("data", {})
+            return 200, None
+        if path == "menuitems/settings/current":
+            values = [
+                {
+                    "value": {
+                        "Nodeid": node["nodeid"], "Controllable": True, "Available": True,
+                        "data": self.settings.get(node["nodeid"], {"value": 0, "selected_item": 0})
+                    }
+                } for node in body.get("nodes", [])
+            ]
+            return 200, {"values": values, "version": 0}
+        if path == "activities/launch":
+            self.set("activities/current", {"component": body.get("intent", {}).get("component", {})})
+            return 200, None
+        if path in self.state or path in self.post_paths:
+            with self.condition:
+                current = self.state.get(path)
+                self.state[path] = dict(current, **body) if isinstance(current, dict) else body
+                self.condition.notify_all()
+            return 200, None
+        return 404, None
+
+    def press(self, key):
+        """
+        Apply a key press.
+
+        Args:
+            key (str): Key name.
+
+        Returns:
+            tuple: HTTP status and response object.
+        """
+        if self.key_time > 0 and key.startswith(NAVIGATION_KEYS):
+            with self.key_lock:
+                now = time.monotonic()
+                if now < self.busy_until:
+                    self.dropped_keys += 1
+                    return 200, None
+                self.busy_until = now + 2 * self.key_time
+            time.sleep(self.key_time)
+        self.keys.append(key)
+        if key == "Standby":
+            powerstate = "Standby" if self.state["powerstate"]["powerstate"] == "On" else "On"
+            self.set("powerstate", {"powerstate": powerstate})
+        elif key in ("VolumeUp", "VolumeDown", "Mute") and isinstance(self.state.get("audio/volume"), dict):
+            volume = dict(self.state["audio/volume"])
+            if key == "Mute":
+                volume["muted"] = not volume.get("muted", False)
+            else:
+                step = 1 if key == "VolumeUp" else -1
+                volume["current"] = max(
+                    volume.get("min", 0), min(volume.get("max", 60), volume.get("current", 0) + step)
+                )
+            self.set("audio/volume", volume)
+        return 200, None
+
+    def notifychange(self, notification):
+        """
+        Hold a notifychange request until a watched endpoint differs from the supplied value.
+
+        Args:
+            notification (dict): Last known values by endpoint.
+
+        Returns:
+            dict: Endpoints whose value differs, empty when the request timed out.
+        """
+        deadline = time.monotonic() + self.notify_timeout
+        with self.condition:
+            while True:
+                changes = {
+                    path: self.state[path] for path, value in notification.items()
+                    if path in self.state and self.state[path] != value
+                }
+                remaining = deadline - time.monotonic()
+                if len(changes) > 0 or remaining <= 0:
+                    return changes
+                self.condition.wait(remaining)
+
+    def check_digest(self, method, header):
+        """
+        Verify a digest Authorization header.
+
+        Args:
+            method (str): HTTP method.
+            header (str): Authorization header.
+
+        Returns:
+            bool: True if the credentials are valid.
+        """
+        if not header.startswith("Digest "):
+            return False
+        fields = dict(re.findall(r'(\w+)="?([^",]*)"?', header[7:]))
+
+        def md5(text):
+            return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+        try:
+            expected = md5(":".join([
+                md5("%s:%s:%s" % (self.user, REALM, self.password)), fields["nonce"], fields["nc"], fields["cnonce"],
+                fields["qop"], md5("%s:%s" % (method, fields["uri"]))
+            ]))
+        except KeyError:
+            return False
+        return fields["nonce"] == self.nonce and secrets.compare_digest(expected, fields.get("response", ""))
+
+    def stats(self):
+        """
+        Return request counters.
+
+        Returns:
+            dict: Requests by method and path, digest challenges, ambilight frames, key presses and dropped keys.
+        """
+        return {
+            "requests": dict(self.requests), "challenges": self.challenges, "frames": self.frames,
+            "keys": len(self.keys), "dropped_keys": self.dropped_keys, "wol_packets": self.wol_packets
+        }
+
+
+class MockHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Request handler of the mock TV; the server carries the TV and whether digest auth is required.
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.handle_api("GET")
+
+    def do_POST(self):
+        self.handle_api("POST")
+
+    def handle_api(self, method):
+        tv = self.server.tv
+        length = int(self.headers.get("Content-Length", "0"))
+        raw = self.rfile.read(length) if length > 0 else b""
+        if tv.latency > 0 or tv.jitter > 0:
+            time.sleep(tv.latency + random.uniform(0, tv.jitter))
+        if method == "POST" and self.path.strip("/") == "mock/sleep":
+            tv.sleep()
+            self.send_body(200, b"")
+            return
+        if method == "GET" and self.path.strip("/") == "mock/stats":
+            self.send_body(200, json.dumps(tv.stats()).encode("utf-8"))
+            return
+        if tv.is_asleep() or (tv.drop_rate > 0 and random.random() < tv.drop_rate):
+            self.close_connection = True
+            return
+        # Like on real TVs, 'system' is readable before pairing
+        public = method == "GET" and re.sub(r"^/\d+/", "", self.path).strip("/") == "system"
+        if self.server.digest and not public and not tv.check_digest(method, self.headers.get("Authorization", "")):
+            tv.challenges += 1
+            self.send_body(401, b"", {
+                "WWW-Authenticate": 'Digest realm="%s", nonce="%s", algorithm=MD5, qop="auth"' % (REALM, tv.nonce)
+            })
+            return
+        if tv.error_rate > 0 and random.random() < tv.error_rate:
+            self.send_body(500, b"")
+            return
+        path = re.sub(r"^/\d+/", "", self.path.split("?")[0]).strip("/")
+        tv.requests[method + " " + path] += 1
+        if method == "GET":
+            status, response = tv.get(path)
+        else:
+            try:
+                body = json.loads(raw) if len(raw) > 0 else {}
+            except ValueError:
+                self.send_body(400, b"")
+                return
+            status, response = tv.post(path, body)
+        self.send_body(status, b"" if response is None else json.dumps(response).encode("utf-8"))
+
+    def send_body(self, status, body, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockServer(http.server.ThreadingHTTPServer):
+    """
+    Threading HTTP server that does not print clients hanging up.
+    """
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], (ConnectionError, ssl.SSLError)):
+            super().handle_error(request, client_address)
+
+
+def self_signed_context():
+    """
+    Create a TLS context with a throwaway self-signed certificate.
+
+    Returns:
+        ssl.SSLContext: Server context, None if openssl is not available.
+    """
+    directory = tempfile.mkdtemp(prefix="pylips-mock-")
+    cert_path = os.path.join(directory, "cert.pem")
+    key_path = os.path.join(directory, "key.pem")
+    try:
+        subprocess.run(
+            [
+                "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=pylips-mock",
+                "-keyout", key_path, "-out", cert_path
+            ], check=True, capture_output=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_path, key_path)
+    return context
+
+
+def start_mock_tv(tv, host="127.0.0.1", http_port=1925, https_port=1926, tls=True, wol_port=None):
+    """
+    Serve a mock TV from background threads.
+
+    Args:
+        tv (MockTV): TV to serve.
+        host (str): Address to listen on.
+        http_port (int): Plain HTTP port, 0 picks a free port, None disables it.
+        https_port (int): HTTPS + digest auth port, 0 picks a free port, None disables it.
+        tls (bool): Use TLS on the digest port.
+        wol_port (int): UDP port to receive Wake-on-LAN packets on, 0 picks a free port, None disables it.
+
+    Returns:
+        dict: Running servers keyed by "http", "https" and "wol"; their server_address holds the actual port.
+    """
+    servers = {}
+    for name, port in (("http", http_port), ("https", https_port)):
+        if port is None:
+            continue
+        server = MockServer((host, port), MockHandler)
+        server.tv = tv
+        server.digest = name == "https"
+        server.tls = False
+        if name == "https" and tls:
+            context = self_signed_context()
+            if context is not None:
+                server.socket = context.wrap_socket(server.socket, server_side=True)
+                server.tls = True
+        threading.Thread(target=server.serve_forever, name="mock-tv-" + name, daemon=True).start()
+        servers[name] = server
+    if wol_port is not None:
+        wol_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        wol_socket.bind((host, wol_port))
+
+        def receive():
+            while True:
+                tv.wake_on_lan(wol_socket.recv(1024))
+
+        threading.Thread(target=receive, name="mock-tv-wol", daemon=True).start()
+        servers["wol"] = types.SimpleNamespace(server_address=wol_socket.getsockname(), socket=wol_socket)
+    return servers
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mock Philips TV JointSpace API")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--http-port", type=int, default=1925, help="Plain HTTP port (0: any free port)")
+    parser.add_argument("--https-port", type=int, default=1926, help="HTTPS + digest auth port (0: any free port)")
+    parser.add_argument("--no-tls", action="store_true", help="Serve the digest auth port without TLS")
+    parser.add_argument("--user", default="pylips", help="Digest auth user")
+    parser.add_argument("--pass", dest="password", default="pylips", help="Digest auth password")
+    parser.add_argument("--powerstate", default="On", help="Initial power state")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra latency up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with HTTP 500")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Share of connections closed without answer")
+    parser.add_argument("--notify-timeout", type=float, default=30.0, help="Seconds notifychange is held open")
+    parser.add_argument("--channels", type=int, default=1000, help="Number of channels in the channel list")
+    parser.add_argument("--asleep", action="store_true", help="Start in standby with the network stack asleep")
+    parser.add_argument("--wake-delay", type=float, default=2.0, help="Seconds to wake up after Wake-on-LAN")
+    parser.add_argument("--wol-port", type=int, default=0, help="UDP Wake-on-LAN port (0: any free port)")
+    parser.add_argument(
+        "--key-time", type=float, default=0.0, help="Seconds a navigation key takes, keys sent faster are dropped"
+    )
+    options = parser.parse_args()
+    mock = MockTV(
+        options.powerstate, options.latency, options.jitter, options.error_rate, options.drop_rate, options.user,
+        options.password, options.notify_timeout, options.channels, options.wake_delay,
+        options.key_time
+    )
+    if options.asleep:
+        mock.sleep()
+    running = start_mock_tv(
+        mock, options.host, options.http_port, options.https_port, not options.no_tls, options.wol_port
+    )
+    print(json.dumps({
+        "http": running["http"].server_address[1], "https": running["https"].server_address[1],
+        "wol": running["wol"].server_address[1], "tls": running["https"].tls, "user": options.user,
+        "pass": options.password
+    }), flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(json.dumps(mock.stats()))
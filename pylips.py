@@ -5,65 +5,184 @@
 
 import configparser
 import json
-import argparse
 import sys
-import requests
-from requests.auth import HTTPDigestAuth
-from requests.adapters import HTTPAdapter
-from urllib3.exceptions import InsecureRequestWarning
-from urllib3 import disable_warnings
-import paho.mqtt.client as mqttc
 import os
 import logging
+import time
+from pylips_tools.tools_batch import run_batch
+from pylips_tools.tools_breaker import UNREACHABLE, CircuitBreaker
+from pylips_tools.tools_cache import create_cache
+from pylips_tools.tools_commands import encode_body, load_command_index
+from pylips_tools.tools_daemon import daemon_socket_path, forward_to_daemon, start_daemon
+from pylips_tools.tools_discovery import discover, discovery_sections, load_profile
+from pylips_tools.tools_fleet import create_fleet, fill_tv_section, start_fleet_updater
+from pylips_tools.tools_logging import configure_logging, get_logger, log_body
+from pylips_tools.tools_macro import KeyPacer, macros, run_keys, run_macro, save_macro
+from pylips_tools.tools_metrics import Metrics, start_metrics_server, tv_gauges
 from pylips_tools.tools_mqtt import (
+    OFF_STATUS,
     start_mqtt_updater,
+    mqtt_update_cycle,
+    mqtt_handle_message,
     mqtt_update_powerstate,
     mqtt_update_ambilight,
     mqtt_update_ambihue,
     mqtt_update_ambilight_brightness_state,
-    mqtt_update_display_light_sensor_state
+    mqtt_update_display_light_sensor_state,
+    mqtt_update_settings_state
 )
+from pylips_tools.tools_power import learn_mac, power_on, remember_mac
+from pylips_tools.tools_queue import create_command_queue
+from pylips_tools.tools_settings import get_settings, set_settings, settings_node_index
+from pylips_tools.tools_status import StatusStore
+from pylips_tools.tools_stream import index_records, iter_channels, iter_settings_nodes
 
 # Set up logging configuration
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Set up the requests session and disable SSL warnings
-disable_warnings(InsecureRequestWarning)
-
-session = requests.Session()
-session.verify = False
-session.mount('https://', HTTPAdapter(pool_connections=1))
-
-# Set up the argument parser
-parser = argparse.ArgumentParser(description="Control Philips TV API (versions 5 and 6)")
-parser.add_argument("--host", dest="host", help="TV's ip address")
-parser.add_argument("--user", dest="user", help="Username")
-parser.add_argument("--pass", dest="password", help="Password")
-parser.add_argument("--command", help="Command to run", default="")
-parser.add_argument("--path", dest="path", help="API's endpoint path")
-parser.add_argument("--body", dest="body", help="Body for post requests")
-parser.add_argument("--verbose", dest="verbose", help="Display feedback")
-parser.add_argument("--apiv", dest="apiv", help="Api version", default="")
-parser.add_argument(
-    "--config", dest="config", help="Path to config file",
-    default=os.path.dirname(os.path.realpath(__file__)) + os.path.sep + "settings.ini"
-)
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+http_log = get_logger("http")
+mqtt_log = get_logger("mqtt")
+
+
+def create_session(pool_maxsize=1):
+    """
+    Create a requests session with its own connection pool and SSL warnings disabled.
+
+    requests is imported here rather than at module level, so CLI calls forwarded to the daemon never load it.
+
+    Args:
+        pool_maxsize (int): Maximum number of kept-alive connections.
+
+    Returns:
+        requests.Session: New session.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3 import disable_warnings
+    from urllib3.exceptions import InsecureRequestWarning
+
+    disable_warnings(InsecureRequestWarning)
+    new_session = requests.Session()
+    new_session.verify = False
+    new_session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize))
+    new_session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize))
+    return new_session
+
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments.
+
+    Args:
+        argv (list, optional): Arguments, defaults to sys.argv.
+
+    Returns:
+        argparse.Namespace: Parsed arguments.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Control Philips TV API (versions 5 and 6)")
+    parser.add_argument("--host", dest="host", help="TV's ip address")
+    parser.add_argument("--user", dest="user", help="Username")
+    parser.add_argument("--pass", dest="password", help="Password")
+    parser.add_argument("--command", help="Command to run (or get, post, batch, keys, macro)", default="")
+    parser.add_argument("--path", dest="path", help="API's endpoint path")
+    parser.add_argument("--body", dest="body", help="Body for post requests")
+    parser.add_argument("--verbose", dest="verbose", help="Display feedback")
+    parser.add_argument("--apiv", dest="apiv", help="Api version", default="")
+    parser.add_argument("--tv", dest="tv", help="Name of a [TV:<name>] section to use", default="")
+    parser.add_argument(
+        "--discover", dest="discover", nargs="?", const="", metavar="NETWORK",
+        help="Scan a network (default: the local /24) or address for TVs and save their capabilities"
+    )
+    parser.add_argument(
+        "--daemon", dest="daemon", action="store_true", help="Keep the TV connections warm and serve CLI calls"
+    )
+    parser.add_argument(
+        "--config", dest="config", help="Path to config file",
+        default=os.path.dirname(os.path.realpath(__file__)) + os.path.sep + "settings.ini"
+    )
+    return parser.parse_args(argv)
+
+
+def run_via_daemon(cli_args):
+    """
+    Forward a one-shot CLI command to a running Pylips daemon.
+
+    Commands that override the TV's settings on the command line always run directly.
+
+    Args:
+        cli_args (argparse.Namespace): Parsed arguments.
+
+    Returns:
+        bool: True if the daemon ran the command, False to fall back to running it directly.
+    """
+    if cli_args.daemon or len(cli_args.command) == 0 or cli_args.host or cli_args.user or cli_args.password or \
+            len(cli_args.apiv) > 0:
+        return False
+    config = configparser.ConfigParser()
+    try:
+        config.read(cli_args.config)
+    except configparser.Error:
+        return False
+    response = forward_to_daemon(
+        daemon_socket_path(config),
+        {"command": cli_args.command, "path": cli_args.path, "body": cli_args.body, "tv": cli_args.tv}
+    )
+    if response is None:
+        return False
+    if "error" in response:
+        logging.error("%s", response["error"])
+    else:
+        logging.info("Response: %s", response["response"])
+    return True
 
-args = parser.parse_args()
+
+# Parsed command line arguments, set by parse_args() on first use
+args = None
 
 
 class Pylips:
-    def __init__(self, ini_file):
+    def __init__(self, ini_file, tv_section="TV", parent=None):
         """
         Initialize the Pylips class.
 
         Args:
             ini_file (str): Path to the configuration file.
+            tv_section (str): Name of the settings.ini section describing the TV.
+            parent (Pylips, optional): Instance to share config, commands and MQTT client with (fleet mode).
 
         Returns:
             None
         """
+        global args
+        if args is None:
+            args = parse_args()
+
         self.mqtt = None
+        self.scheduler = None
+        self.command_queue = None
+        self.metrics = None
+        self.fleet = {}
+        self.tv_section = tv_section
+        self.name = tv_section[3:] if tv_section.startswith("TV:") else ""
+
+        self.status_store = None
+        self.settings_nodes = None
+        self.effect_player = None
+        self.profile = None
+
+        if parent is not None:
+            self.config = parent.config
+            self.verbose = parent.verbose
+            self.available_commands = parent.available_commands
+            self.commands = parent.commands
+            self.metrics = parent.metrics
+            self.setup_tv()
+            return
+
         self.config = configparser.ConfigParser()
 
         if not os.path.isfile(ini_file):
@@ -76,7 +195,32 @@ class Pylips:
             logging.error("Config file %s found, but cannot be read", ini_file)
             return
 
-        if args.host is None and self.config["TV"]["host"] == "":
+        configure_logging(self.config)
+
+        if args.tv:
+            self.tv_section = "TV:" + args.tv
+            self.name = args.tv
+            if not self.config.has_section(self.tv_section):
+                logging.error("Section [%s] not found in settings.ini", self.tv_section)
+                return
+            fill_tv_section(self.config, self.tv_section)
+
+        if args.discover is not None:
+            try:
+                profiles = self.discover(args.discover or None)
+            except ValueError as e:
+                logging.error("%s", e)
+                return
+            if len(profiles) > 0:
+                print(discovery_sections(profiles))
+            return
+
+        service_mode = len(sys.argv) == 1 or (len(sys.argv) == 3 and sys.argv[1] == "--config")
+        fleet_mode = (service_mode or args.daemon) and self.tv_section == "TV" and any(
+            section.startswith("TV:") for section in self.config.sections()
+        )
+
+        if not fleet_mode and args.host is None and self.tv["host"] == "":
             logging.error(
                 "Please set your TV's IP-address with a --host parameter or in [TV] section in settings.ini"
             )
@@ -84,25 +228,17 @@ class Pylips:
 
         self.verbose = self.config["DEFAULT"]["verbose"].lower() == "true"
 
-        self.last_status = {
-            "powerstate": "Off",
-            "ambilight": False,
-            "ambihue": False,
-            "ambi_brightness": False,
-            "dls_state": False
-        }
-
         if len(sys.argv) > 1:
             if args.verbose is not None:
                 self.verbose = args.verbose.lower() == "true"
             if args.host:
-                self.config["TV"]["host"] = args.host
+                self.tv["host"] = args.host
             if args.user and args.password:
-                self.config["TV"]["user"] = args.user
-                self.config["TV"]["pass"] = args.password
-                self.config["TV"]["port"] = "1926"
-                self.config["TV"]["protocol"] = "https://"
-            elif (len(self.config["TV"]["user"]) == 0 or len(self.config["TV"]["pass"]) == 0) and self.config["TV"][
+                self.tv["user"] = args.user
+                self.tv["pass"] = args.password
+                self.tv["port"] = "1926"
+                self.tv["protocol"] = "https://"
+            elif (len(self.tv["user"]) == 0 or len(self.tv["pass"]) == 0) and self.tv[
                 "port"
             ] == "1926":
                 logging.error(
@@ -110,18 +246,35 @@ class Pylips:
                 )
                 return
             if len(args.apiv) != 0:
-                self.config["TV"]["apiv"] = args.apiv
+                self.tv["apiv"] = args.apiv
+
+        self.available_commands, self.commands = load_command_index(
+            os.path.dirname(os.path.realpath(__file__)) + "/available_commands.json"
+        )
 
-        with open(os.path.dirname(os.path.realpath(__file__)) + "/available_commands.json") as json_file:
-            self.available_commands = json.load(json_file)
+        self.setup_tv()
+        if fleet_mode:
+            self.fleet = create_fleet(self)
+
+        metrics_port = int(self.config["DEFAULT"].get("metrics_port", "0"))
+        if metrics_port > 0 and (service_mode or args.daemon):
+            start_metrics_server(
+                self.enable_metrics(), metrics_port, self.config["DEFAULT"].get("metrics_host", "127.0.0.1")
+            )
 
-        if (len(sys.argv) == 1 or (len(sys.argv) == 3 and sys.argv[1] == "--config")) and self.config["DEFAULT"][
-            "mqtt_listen"
-        ] == "True":
-            if len(self.config["MQTT"]["host"]) > 0:
+        if args.daemon:
+            start_daemon(self)
+        elif service_mode and self.config["DEFAULT"]["mqtt_listen"] == "True":
+            if len(self.config["MQTT"]["host"]) > 0 and self.config["DEFAULT"].get("use_asyncio", "False") == "True":
+                from pylips_tools.tools_async import start_async_bridge
+                start_async_bridge(self)
+            elif len(self.config["MQTT"]["host"]) > 0:
                 self.start_mqtt_listener()
                 if self.config["DEFAULT"]["mqtt_update"] == "True":
-                    start_mqtt_updater(self)
+                    if fleet_mode:
+                        start_fleet_updater(self)
+                    else:
+                        start_mqtt_updater(self)
             else:
                 logging.error("Please specify host in MQTT section in settings.ini to use MQTT")
         elif len(sys.argv) > 1:
@@ -131,8 +284,14 @@ class Pylips:
                 self.get(path, self.verbose)
             elif args.command == "post":
                 self.post(path, body, self.verbose)
+            elif args.command == "batch":
+                self.run_batch(body, None, self.verbose)
+            elif args.command == "keys":
+                self.run_keys(body, self.verbose)
+            elif args.command == "macro":
+                self.run_macro(body, self.verbose)
             elif len(args.command) > 0:
-                self.run_command(args.command, body, self.verbose)
+                self.run_command(args.command, body, verbose=self.verbose)
             else:
                 logging.error("Please provide a valid command with a '--command' argument")
         else:
@@ -140,6 +299,62 @@ class Pylips:
                 "Please enable mqtt_listen in settings.ini or provide a valid command with a '--command' argument"
             )
 
+    @property
+    def tv(self):
+        """
+        Settings section of the TV this instance controls.
+
+        Returns:
+            configparser.SectionProxy: TV settings.
+        """
+        return self.config[self.tv_section]
+
+    @property
+    def last_status(self):
+        """
+        Last published MQTT status of this TV.
+
+        Returns:
+            dict: Status fields.
+        """
+        return self.status_store.status
+
+    def setup_tv(self):
+        """
+        Set up the per-TV connection pool, digest-auth state and MQTT topics.
+
+        Returns:
+            None
+        """
+        from pylips_tools.tools_auth import PylipsDigestAuth
+
+        # Batches run up to batch_concurrency commands at once, each on a pooled connection
+        self.pool_maxsize = max(
+            int(self.config["DEFAULT"].get("pool_maxsize", "1")),
+            int(self.config["DEFAULT"].get("batch_concurrency", "1"))
+        )
+        self.session = create_session(self.pool_maxsize)
+        self.batch_executor = None
+        self.profile = load_profile(self)
+        if self.config.has_section(self.tv_section):
+            self.auth = PylipsDigestAuth(str(self.tv["user"]), str(self.tv["pass"]))
+        else:
+            self.auth = None
+        if self.config.has_section(self.tv_section):
+            self.base_url = (
+                str(self.tv["protocol"]) + str(self.tv["host"]) + ":" + str(self.tv["port"]) + "/" +
+                str(self.tv["apiv"]) + "/"
+            )
+        self.topic_pylips = self.config["MQTT"]["topic_pylips"]
+        self.topic_status = self.config["MQTT"]["topic_status"]
+        if self.name:
+            self.topic_pylips = self.topic_pylips.rstrip("/") + "/" + self.name
+            self.topic_status = self.topic_status.rstrip("/") + "/" + self.name
+        self.status_store = StatusStore.from_config(self.config, self.topic_status, OFF_STATUS)
+        self.cache = create_cache(self)
+        self.breaker = CircuitBreaker.from_config(self.config)
+        self.key_pacer = KeyPacer.from_config(self.config)
+
     def get(self, path, verbose=True, err_count=0, print_response=True):
         """
         Send a GET request to the specified path.
@@ -153,37 +368,61 @@ class Pylips:
         Returns:
             str: Response text or error message.
         """
-        while err_count < int(self.config["DEFAULT"]["num_retries"]):
-            if verbose:
-                logging.info(
-                    "Sending GET request to %s",
-                    str(self.config["TV"]["protocol"]) + str(self.config["TV"]["host"]) + ":" + str(
-                        self.config["TV"]["port"]
-                    ) + "/" + str(self.config["TV"]["apiv"]) + "/" + str(path)
+        if self.cache is not None:
+            cached = self.cache.get(path)
+            if cached is not None:
+                if print_response:
+                    log_body(http_log, "Response (cached): %s", cached, tv=self.name, method="GET", path=str(path))
+                return cached
+        if not self.breaker.allow():
+            if self.metrics is not None:
+                self.metrics.inc(
+                    "pylips_request_failures_total", method="GET", path=str(path), tv=self.name, reason="breaker"
                 )
+            http_log.debug("Can not reach the API, GET %s failed fast", path)
+            return UNREACHABLE
+        num_retries = int(self.config["DEFAULT"]["num_retries"])
+        deadline = time.monotonic() + self.breaker.deadline
+        while err_count < num_retries and time.monotonic() < deadline:
+            if verbose:
+                http_log.info("Sending GET request to %s%s", self.base_url, path)
+            start = time.perf_counter()
             try:
-                r = session.get(
-                    str(self.config["TV"]["protocol"]) + str(self.config["TV"]["host"]) + ":" + str(
-                        self.config["TV"]["port"]
-                    ) + "/" + str(self.config["TV"]["apiv"]) + "/" + str(path), verify=False,
-                    auth=HTTPDigestAuth(str(self.config["TV"]["user"]), str(self.config["TV"]["pass"])),
-                    timeout=2
+                r = self.session.get(
+                    self.base_url + str(path), verify=False, auth=self.auth, timeout=min(2, deadline - time.monotonic())
                 )
             except Exception as e:
-                logging.error("GET request failed: %s", e)
+                http_log.error("GET request failed: %s", e, extra={"tv": self.name, "method": "GET", "path": str(path)})
+                if self.metrics is not None:
+                    self.metrics.inc("pylips_request_retries_total", method="GET", path=str(path), tv=self.name)
                 err_count += 1
+                if err_count < num_retries:
+                    time.sleep(self.breaker.backoff(err_count, deadline))
                 continue
+            self.breaker.success()
+            if self.metrics is not None:
+                self.metrics.observe(
+                    "pylips_request_seconds", time.perf_counter() - start, method="GET", path=str(path), tv=self.name
+                )
             if verbose:
-                logging.info("Request sent!")
+                http_log.info("Request sent!")
             if len(r.text) > 0:
+                if self.cache is not None and r.status_code == 200:
+                    self.cache.put(path, r.text)
                 if print_response:
-                    logging.info("Response: %s", r.text)
+                    log_body(http_log, "Response: %s", r.text, tv=self.name, method="GET", path=str(path))
                 if path == "powerstate":
-                    logging.info("Powerstate Response: %s", r.text)
+                    log_body(http_log, "Powerstate Response: %s", r.text, tv=self.name, method="GET", path=str(path))
                 elif path == "ambilight/currentconfiguration":
-                    logging.info("Ambilight Response: %s", r.text)
+                    log_body(http_log, "Ambilight Response: %s", r.text, tv=self.name, method="GET", path=str(path))
                 return r.text
-        else:
+            err_count += 1
+        if self.metrics is not None:
+            self.metrics.inc(
+                "pylips_request_failures_total", method="GET", path=str(path), tv=self.name, reason="unreachable"
+            )
+        if self.breaker.failure():
+            http_log.error("Can not reach the API, failing requests fast until it answers again")
             if self.config["DEFAULT"]["mqtt_listen"].lower() == "true":
                 self.mqtt_update_status(
                     {
@@ -191,7 +430,9 @@ class Pylips:
                         "dls_state": False
                     }
                 )
-            return json.dumps({"error": "Can not reach the API"})
+        else:
+            http_log.debug("Can not reach the API")
+        return UNREACHABLE
 
     def post(self, path, body, verbose=True, err_count=0):
         """
@@ -199,45 +440,67 @@ class Pylips:
 
         Args:
             path (str): API endpoint path.
-            body (str): Request body.
+            body (str, dict or bytes): Request body, bytes are sent as already serialized JSON, None sends no body.
             verbose (bool): Display feedback.
             err_count (int): Number of retry attempts.
 
         Returns:
             str: Response text or error message.
         """
-        while err_count < int(self.config["DEFAULT"]["num_retries"]):
-            if type(body) is str:
-                body = json.loads(body)
-            if verbose:
-                logging.info(
-                    "Sending POST request to %s",
-                    str(self.config["TV"]["protocol"]) + str(self.config["TV"]["host"]) + ":" + str(
-                        self.config["TV"]["port"]
-                    ) + "/" + str(self.config["TV"]["apiv"]) + "/" + str(path)
+        if type(body) is str:
+            body = json.loads(body)
+        if body is not None and not isinstance(body, bytes):
+            body = encode_body(body)
+        if not self.breaker.allow():
+            if self.metrics is not None:
+                self.metrics.inc(
+                    "pylips_request_failures_total", method="POST", path=str(path), tv=self.name, reason="breaker"
                 )
+            http_log.debug("Can not reach the API, POST %s failed fast", path)
+            return UNREACHABLE
+        num_retries = int(self.config["DEFAULT"]["num_retries"])
+        deadline = time.monotonic() + self.breaker.deadline
+        while err_count < num_retries and time.monotonic() < deadline:
+            if verbose:
+                http_log.info("Sending POST request to %s%s", self.base_url, path)
+            start = time.perf_counter()
             try:
-                r = session.post(
-                    str(self.config["TV"]["protocol"]) + str(self.config["TV"]["host"]) + ":" + str(
-                        self.config["TV"]["port"]
-                    ) + "/" + str(self.config["TV"]["apiv"]) + "/" + str(path), json=body,
-                    verify=False,
-                    auth=HTTPDigestAuth(str(self.config["TV"]["user"]), str(self.config["TV"]["pass"])),
-                    timeout=2
+                r = self.session.post(
+                    self.base_url + str(path), data=body, headers=None if body is None else JSON_HEADERS, verify=False,
+                    auth=self.auth, timeout=min(2, deadline - time.monotonic())
                 )
             except Exception as e:
-                logging.error("POST request failed: %s", e)
+                http_log.error(
+                    "POST request failed: %s", e, extra={"tv": self.name, "method": "POST", "path": str(path)}
+                )
+                if self.metrics is not None:
+                    self.metrics.inc("pylips_request_retries_total", method="POST", path=str(path), tv=self.name)
                 err_count += 1
+                if err_count < num_retries:
+                    time.sleep(self.breaker.backoff(err_count, deadline))
                 continue
+            self.breaker.success()
+            if self.metrics is not None:
+                self.metrics.observe(
+                    "pylips_request_seconds", time.perf_counter() - start, method="POST", path=str(path), tv=self.name
+                )
             if verbose:
-                logging.info("Request sent!")
+                http_log.info("Request sent!")
+            if self.cache is not None and r.status_code == 200:
+                self.cache.invalidate(path)
             if len(r.text) > 0:
-                logging.info("Response: %s", r.text)
+                log_body(http_log, "Response: %s", r.text, tv=self.name, method="POST", path=str(path))
                 return r.text
             elif r.status_code == 200:
-                logging.info("Response: OK")
+                http_log.info("Response: OK")
                 return json.dumps({"response": "OK"})
-        else:
+            err_count += 1
+        if self.metrics is not None:
+            self.metrics.inc(
+                "pylips_request_failures_total", method="POST", path=str(path), tv=self.name, reason="unreachable"
+            )
+        if self.breaker.failure():
+            http_log.error("Can not reach the API, failing requests fast until it answers again")
             if self.config["DEFAULT"]["mqtt_listen"].lower() == "true" and len(sys.argv) == 1:
                 self.mqtt_update_status(
                     {
@@ -245,8 +508,9 @@ class Pylips:
                         "dls_state": False
                     }
                 )
-            logging.error("Can not reach the API")
-            return json.dumps({"error": "Can not reach the API"})
+        else:
+            http_log.debug("Can not reach the API")
+        return UNREACHABLE
 
     def run_command(self, command, body=None, new_body=None, verbose=True, callback=True, print_response=True):
         """
@@ -254,73 +518,377 @@ class Pylips:
 
         Args:
             command (str): Command to run.
-            body (str, optional): Request body.
-            new_body (str, optional): New request body.
+            body (str or dict, optional): Parameters of the command, or a body replacing its default body.
+            new_body (str, optional): Unused, kept for compatibility.
             verbose (bool): Display feedback.
-            callback (bool): Callback function.
+            callback (bool): Unused, kept for compatibility.
             print_response (bool): Print the response.
 
         Returns:
             str: Response text or error message.
         """
-        if command in self.available_commands["get"]:
-            return self.get(self.available_commands["get"][command]["path"], verbose, 0, print_response)
-        elif command in self.available_commands["post"]:
-            if "body" in self.available_commands["post"][command] and body is None:
-                if "input_" in command:
-                    body = self.available_commands["post"]["google_assistant"]["body"]
-                    path = self.available_commands["post"]["google_assistant"]["path"]
-                    body["intent"]["extras"]["query"] = self.available_commands["post"][command]["body"]["query"]
-                else:
-                    body = self.available_commands["post"][command]["body"]
-                    path = self.available_commands["post"][command]["path"]
-                return self.post(path, body, verbose, callback)
-            if "body" in self.available_commands["post"][command] and body is not None:
-                if type(body) is str:
-                    body = json.loads(body)
-                new_body = self.available_commands["post"][command]["body"]
-                if command == "ambilight_brightness":
-                    new_body["values"][0]["value"]["data"] = body
-            elif command == "ambilight_color":
-                if isinstance(body, str):
-                    body = json.loads(body)
-                if isinstance(body, dict):
-                    new_body = {}
-                    new_body["colorSettings"]["color"]["hue"] = int(float(body["hue"]) * (255 / 360))
-                    new_body["colorSettings"]["color"]["saturation"] = int(float(body["saturation"]) * (255 / 100))
-                    new_body["colorSettings"]["color"]["brightness"] = int(float(body["brightness"]))
-            elif command == "google_assistant":
-                if isinstance(body, str):
-                    body = json.loads(body)
-                if isinstance(body, dict):
-                    new_body = {}
-                    new_body["intent"]["extras"]["query"] = str(body["query"])
-                elif "input_" in command:
-                    new_body = self.available_commands["google_assistant"][command]
-                    new_body["intent"]["extras"]["query"] = self.available_commands["post"][command]["body"][
-                        "query"]
-                return self.post(self.available_commands["post"][command]["path"], new_body, verbose, callback)
+        entry = self.commands.get(command)
+        if entry is None:
+            return logging.error("Unknown command")
+        start = time.perf_counter()
+        try:
+            if entry.method == "get":
+                return self.get(entry.path, verbose, 0, print_response)
+            elif entry.method == "post":
+                try:
+                    data = entry.render(body)
+                except ValueError as e:
+                    logging.error("%s", e)
+                    return json.dumps({"error": str(e)})
+                return self.post(entry.path, data, verbose)
             else:
-                if body is None:
-                    body = "{}"  # Initialize body as an empty JSON string if it is None
-                return self.post(self.available_commands["post"][command]["path"], body, verbose, callback)
-
-        elif command in self.available_commands["power"]:
-            try:
-                return session.post(
-                    "http://" + str(self.config["TV"]["host"]) + ":8008/" +
-                    self.available_commands["power"][command][
-                        "path"], verify=False, timeout=10
-                )
-            except requests.exceptions.ReadTimeout:
-                logging.error("Request timed out. Retrying...")
-                return session.post(
-                    "http://" + str(self.config["TV"]["host"]) + ":8008/" +
-                    self.available_commands["power"][command][
-                        "path"], verify=False, timeout=10
+                # Power commands bypass the breaker, they are meant for TVs in standby
+                return json.dumps(self.power_on(chromecast_path=entry.path))
+        finally:
+            if self.metrics is not None:
+                self.metrics.observe(
+                    "pylips_command_seconds", time.perf_counter() - start, command=command, tv=self.name
                 )
-        else:
-            logging.error("Unknown command")
+
+    def power_on(self, timeout=None, chromecast_path="apps/ChromeCast"):
+        """
+        Switch the TV on with Wake-on-LAN or its Chromecast endpoint and wait until the API is ready.
+
+        Args:
+            timeout (float, optional): Seconds to wait, defaults to 'power_on_timeout'.
+            chromecast_path (str): Path of the Chromecast power-on request.
+
+        Returns:
+            dict: ready, method, time_to_ready and the number of powerstate probes.
+        """
+        return power_on(self, timeout, chromecast_path)
+
+    def learn_mac(self):
+        """
+        Ask the TV for its MAC address and remember it for Wake-on-LAN.
+
+        Returns:
+            str: MAC address, None if the TV did not report one.
+        """
+        return learn_mac(self)
+
+    def remember_mac(self, devices):
+        """
+        Remember the TV's MAC address from network/devices data.
+
+        Args:
+            devices (list): network/devices entries.
+
+        Returns:
+            str: Remembered MAC address, None if the data has none.
+        """
+        return remember_mac(self, devices)
+
+    def run_keys(self, keys, verbose=False):
+        """
+        Send a key sequence over one warm connection with adaptive pacing between the keys.
+
+        Args:
+            keys (list or str): Command names (e.g. "digit_1", "confirm") and pauses in seconds.
+            verbose (bool): Display feedback for every key.
+
+        Returns:
+            dict: Number of keys sent, elapsed time and last gap in seconds, and an error if the sequence failed.
+        """
+        return run_keys(self, keys, verbose)
+
+    def run_macro(self, name, verbose=False):
+        """
+        Run a named macro from the [MACROS] section or saved with save_macro.
+
+        Args:
+            name (str): Macro name.
+            verbose (bool): Display feedback for every key.
+
+        Returns:
+            dict: Result of run_keys, or an error.
+        """
+        return run_macro(self, name, verbose)
+
+    def save_macro(self, name, keys):
+        """
+        Save a key sequence as a named macro of this TV.
+
+        Args:
+            name (str): Macro name.
+            keys (list or str): Command names and pauses in seconds.
+
+        Returns:
+            dict: Name and number of steps of the macro, or an error.
+        """
+        return save_macro(self, name, keys)
+
+    def macros(self):
+        """
+        Return the named macros of this TV.
+
+        Returns:
+            dict: Key sequences by macro name.
+        """
+        return macros(self)
+
+    def run_batch(self, batch, concurrency=None, verbose=True):
+        """
+        Run several commands over the TV's warm connection pool.
+
+        Args:
+            batch (list or str): Commands, see tools_batch.validate_batch.
+            concurrency (int, optional): Number of commands in flight.
+            verbose (bool): Display feedback.
+
+        Returns:
+            dict: Per-command results and timings.
+        """
+        return run_batch(self, batch, concurrency, verbose)
+
+    def discover(self, network=None, workers=None, timeout=None):
+        """
+        Scan a network for TVs and save their capability profiles.
+
+        Args:
+            network (str, optional): Network ("192.168.1.0/24") or single address, defaults to the local /24.
+            workers (int, optional): Addresses probed at once, defaults to 'discovery_workers'.
+            timeout (float, optional): Connect timeout in seconds, defaults to 'discovery_timeout'.
+
+        Returns:
+            list: Capability profiles of the TVs found.
+        """
+        return discover(self, network, workers=workers, timeout=timeout)
+
+    def start_ambilight_stream(self, topology=None, manual_mode=True):
+        """
+        Start streaming frames to ambilight/cached.
+
+        Args:
+            topology (AmbilightTopology, optional): Topology, fetched from the TV if not given.
+            manual_mode (bool): Switch the Ambilight to manual mode first.
+
+        Returns:
+            AmbilightStreamer: Running streamer, push frames to it with push().
+        """
+        from pylips_tools.tools_ambilight import AmbilightStreamer
+        return AmbilightStreamer(self, topology).start(manual_mode)
+
+    def play_ambilight_effect(self, effect, params=None, duration=None, fps=None):
+        """
+        Play a rendered Ambilight effect (fade, gradient, rainbow, breathe or chase), replacing the one playing.
+
+        Args:
+            effect (str): Effect name.
+            params (dict, optional): Parameters overriding the effect's defaults, e.g. {"period": 8}.
+            duration (float, optional): Seconds to play, loops until stop_ambilight_effect() if not given.
+            fps (float, optional): Frames per second, defaults to 'ambilight_effect_fps'.
+
+        Returns:
+            EffectPlayer: Running player.
+        """
+        from pylips_tools.tools_effects import EffectPlayer
+        if self.effect_player is None or (fps is not None and fps != self.effect_player.fps):
+            self.stop_ambilight_effect()
+            self.effect_player = EffectPlayer(self, fps=fps)
+        return self.effect_player.play(effect, params, duration)
+
+    def stop_ambilight_effect(self):
+        """
+        Stop the Ambilight effect that is playing.
+
+        Returns:
+            None
+        """
+        if self.effect_player is not None:
+            self.effect_player.stop()
+            self.effect_player = None
+
+    def record_ambilight(self, endpoint="ambilight/measured", rate=None, capacity=None, spill_path=None):
+        """
+        Start sampling an Ambilight endpoint into a ring buffer.
+
+        Args:
+            endpoint (str): ambilight/measured, ambilight/processed or ambilight/cached.
+            rate (float, optional): Samples per second.
+            capacity (int, optional): Frames kept in memory.
+            spill_path (str, optional): File the full ring is appended to.
+
+        Returns:
+            AmbilightRecorder: Running recorder.
+        """
+        from pylips_tools.tools_capture import AmbilightRecorder
+        return AmbilightRecorder(self, endpoint, rate, capacity, spill_path=spill_path).start()
+
+    def iter_channels(self, list_id="all"):
+        """
+        Stream a channel list, parsed while it downloads.
+
+        Args:
+            list_id (str): Channel list id.
+
+        Returns:
+            iterator: Channel records with ccid, preset, name, onid, tsid, sid, service_type, type, logo_version.
+        """
+        return iter_channels(self, list_id)
+
+    def iter_settings_nodes(self):
+        """
+        Stream the settings menu structure, parsed while it downloads.
+
+        Returns:
+            iterator: SettingsNode records with node_id, parent_id, depth, type, string_id, context.
+        """
+        return iter_settings_nodes(self)
+
+    def settings_node_index(self, refresh=False):
+        """
+        Return the name to node id index of the TV's settings, built from menuitems/settings/structure once.
+
+        Args:
+            refresh (bool): Fetch the structure again.
+
+        Returns:
+            dict: Node ids by settings context and settings command name.
+        """
+        return settings_node_index(self, refresh)
+
+    def get_settings(self, names):
+        """
+        Read several settings in one request.
+
+        Args:
+            names (list): Node ids, settings contexts or settings command names.
+
+        Returns:
+            dict: 'data' object of every setting by name, None if the request failed.
+        """
+        return get_settings(self, names)
+
+    def set_settings(self, values):
+        """
+        Write several settings in one request.
+
+        Args:
+            values (dict): New 'data' object (or a plain value) by node id, settings context or command name.
+
+        Returns:
+            str: Response text or error message.
+        """
+        return set_settings(self, values)
+
+    def channel_index(self, field="ccid", list_id="all"):
+        """
+        Index a channel list.
+
+        Args:
+            field (str): Field to index by, e.g. "ccid", "preset" or "name" (lowercased).
+            list_id (str): Channel list id.
+
+        Returns:
+            dict: Channel records by field value.
+        """
+        return index_records(iter_channels(self, list_id), field)
+
+    def settings_index(self, field="node_id"):
+        """
+        Index the settings menu structure.
+
+        Args:
+            field (str): Field to index by, e.g. "node_id" or "context".
+
+        Returns:
+            dict: SettingsNode records by field value.
+        """
+        return index_records(iter_settings_nodes(self), field)
+
+    def auth_stats(self):
+        """
+        Return digest-auth counters for this TV.
+
+        Returns:
+            dict: Number of requests and of 401 challenge round trips.
+        """
+        if self.auth is None:
+            return {"requests": 0, "challenges": 0}
+        return self.auth.stats()
+
+    def cache_stats(self):
+        """
+        Return response cache counters for this TV.
+
+        Returns:
+            dict: Hits, misses, invalidated and evicted responses and the number of cached responses.
+        """
+        if self.cache is None:
+            return {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0, "entries": 0}
+        return self.cache.stats()
+
+    def enable_metrics(self):
+        """
+        Start recording metrics for this TV and its fleet.
+
+        Returns:
+            Metrics: Metrics shared by the fleet.
+        """
+        if self.metrics is None:
+            self.metrics = Metrics()
+            for tv in [self] + list(self.fleet.values()):
+                tv.metrics = self.metrics
+                self.metrics.add_collector(lambda tv=tv: tv_gauges(tv))
+        return self.metrics
+
+    def add_metrics_hook(self, hook):
+        """
+        Call a function with every recorded metric event, enabling metrics if needed.
+
+        Args:
+            hook (callable): Called as hook(name, labels, value).
+
+        Returns:
+            None
+        """
+        self.enable_metrics().add_hook(hook)
+
+    def breaker_stats(self):
+        """
+        Return circuit breaker counters for this TV.
+
+        Returns:
+            dict: State, failed calls in a row, times opened and calls failed without a request.
+        """
+        return self.breaker.stats()
+
+    def key_stats(self):
+        """
+        Return key pacing state for this TV.
+
+        Returns:
+            dict: Average acknowledgement latency, current gap between keys, acknowledged and failed key presses.
+        """
+        return self.key_pacer.stats()
+
+    def queue_stats(self):
+        """
+        Return command queue counters for this TV.
+
+        Returns:
+            dict: Waiting, coalesced, dropped and executed commands, None if the queue is disabled.
+        """
+        if self.command_queue is None:
+            return None
+        return self.command_queue.stats()
+
+    def scheduler_stats(self):
+        """
+        Return status polling counters of the adaptive updater.
+
+        Returns:
+            dict: Request rate, requests and current interval per probe and the backoff state, None in other modes.
+        """
+        if self.scheduler is None:
+            return None
+        return self.scheduler.stats()
 
     def start_mqtt_listener(self):
         """
@@ -343,8 +911,10 @@ class Pylips:
             Returns:
                 None
             """
-            logging.info("Connected to MQTT broker at %s", self.config["MQTT"]["host"])
-            client.subscribe(self.config["MQTT"]["topic_pylips"])
+            mqtt_log.info("Connected to MQTT broker at %s", self.config["MQTT"]["host"])
+            client.subscribe(self.topic_pylips)
+            for tv in self.fleet.values():
+                client.subscribe(tv.topic_pylips)
 
         def on_message(client, userdata, msg):
             """
@@ -358,30 +928,24 @@ class Pylips:
             Returns:
                 None
             """
-            if str(msg.topic) == self.config["MQTT"]["topic_pylips"]:
-                try:
-                    message = json.loads(msg.payload.decode('utf-8'))
-                    if "status" in message:
-                        self.mqtt_update_status(message["status"])
-                    if "command" in message:
-                        body = None
-                        path = ""
-                        if "body" in message:
-                            body = message["body"]
-                        if "path" in message:
-                            path = message["path"]
-                        if message["command"] == "get":
-                            if len(path) == 0:
-                                return logging.error("Please provide a 'path' argument")
-                            self.get(path, self.verbose, 0, False)
-                        elif message["command"] == "post":
-                            if len(path) == 0:
-                                return logging.error("Please provide a 'path' argument")
-                            self.post(path, body, self.verbose)
-                        elif message["command"] != "post" and message["command"] != "get":
-                            self.run_command(message["command"], body, self.verbose)
-                except json.JSONDecodeError:
-                    return logging.error("Invalid JSON in mqtt message: %s", msg.payload.decode('utf-8'))
+            if str(msg.topic) == self.topic_pylips:
+                target = self
+            elif str(msg.topic) in self.fleet:
+                target = self.fleet[str(msg.topic)]
+            else:
+                return
+            if self.metrics is not None:
+                self.metrics.inc("pylips_mqtt_messages_total", direction="in", tv=target.name)
+            try:
+                message = json.loads(msg.payload.decode('utf-8'))
+            except json.JSONDecodeError:
+                return mqtt_log.error("Invalid JSON in mqtt message: %s", msg.payload.decode('utf-8'))
+            if target.command_queue is not None:
+                target.command_queue.put(message)
+            else:
+                target.mqtt_handle_message(message)
+
+        import paho.mqtt.client as mqttc
 
         self.mqtt = mqttc.Client()
         self.mqtt.on_connect = on_connect
@@ -394,6 +958,10 @@ class Pylips:
                 self.mqtt.tls_set(self.config["MQTT"]["cert_path"])
             else:
                 self.mqtt.tls_set()
+        for tv in self.fleet.values():
+            tv.mqtt = self.mqtt
+            tv.command_queue = create_command_queue(tv)
+        self.command_queue = create_command_queue(self)
         self.mqtt.connect(str(self.config["MQTT"]["host"]), int(self.config["MQTT"]["port"]), 60)
         if self.config["DEFAULT"]["mqtt_listen"] == "True" and self.config["DEFAULT"]["mqtt_update"] == "False":
             self.mqtt.loop_forever()
@@ -410,10 +978,22 @@ class Pylips:
         Returns:
             None
         """
-        new_status = dict(self.last_status, **update)
-        if json.dumps(new_status) != json.dumps(self.last_status):
-            self.last_status = new_status
-            self.mqtt.publish(str(self.config["MQTT"]["topic_status"]), json.dumps(self.last_status), retain=True)
+        self.publish_status(self.status_store.update(update))
+
+    def publish_status(self, messages):
+        """
+        Publish status messages retained.
+
+        Args:
+            messages (list): (topic, payload) messages from the status store.
+
+        Returns:
+            None
+        """
+        for topic, payload in messages:
+            self.mqtt.publish(topic, payload, retain=True)
+        if self.metrics is not None and len(messages) > 0:
+            self.metrics.inc("pylips_mqtt_messages_total", len(messages), direction="out", tv=self.name)
 
     def start_mqtt_updater(self, verbose=True):
         """
@@ -427,6 +1007,27 @@ class Pylips:
         """
         return start_mqtt_updater(self, verbose)
 
+    def mqtt_handle_message(self, message):
+        """
+        Handle a decoded MQTT message addressed to this TV.
+
+        Args:
+            message (dict): Decoded MQTT message.
+
+        Returns:
+            None
+        """
+        return mqtt_handle_message(self, message)
+
+    def mqtt_update_cycle(self):
+        """
+        Run one round of MQTT status updates.
+
+        Returns:
+            None
+        """
+        return mqtt_update_cycle(self)
+
     def mqtt_update_powerstate(self):
         """
         Update the power state for MQTT status.
@@ -463,6 +1064,15 @@ class Pylips:
         """
         return mqtt_update_ambilight_brightness_state(self)
 
+    def mqtt_update_settings_state(self):
+        """
+        Update the settings based fields of the MQTT status with one request.
+
+        Returns:
+            None
+        """
+        return mqtt_update_settings_state(self)
+
     def mqtt_update_display_light_sensor_state(self):
         """
         Update the display light sensor state for MQTT status.
@@ -474,4 +1084,6 @@ class Pylips:
 
 
 if __name__ == '__main__':
-    pylips = Pylips(args.config)
+    args = parse_args()
+    if not run_via_daemon(args):
+        pylips = Pylips(args.config)
@@ -0,0 +1,331 @@
+# tools_ambilight.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import collections
+import json
+import threading
+import time
+
+from pylips_tools.tools_logging import get_logger
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+log = get_logger("ambilight")
+
+SIDES = ("left", "top", "right", "bottom")
+
+
+def require_numpy():
+    """
+    Raise a helpful error if NumPy is not installed.
+    """
+    if np is None:
+        raise ImportError("Ambilight streaming needs numpy, please install it with 'pip install numpy'")
+
+
+class AmbilightTopology:
+    """
+    Pixel layout of the TV's Ambilight as returned by ambilight/topology.
+
+    Frames are handled as arrays of shape (layers, pixels, 3) where the pixels of a layer are the sides
+    concatenated in the order left, top, right, bottom, each numbered clockwise like the API does.
+    """
+
+    def __init__(self, topology):
+        """
+        Initialize the topology.
+
+        Args:
+            topology (dict or str): Response of ambilight/topology.
+
+        Returns:
+            None
+        """
+        if isinstance(topology, str):
+            topology = json.loads(topology)
+        self.layers = int(topology["layers"])
+        self.sides = collections.OrderedDict((side, int(topology.get(side, 0))) for side in SIDES)
+        self.offsets = {}
+        offset = 0
+        for side, count in self.sides.items():
+            self.offsets[side] = offset
+            offset += count
+        self.pixels = offset
+        self.shape = (self.layers, self.pixels, 3)
+        self.pixel_sides = [(side, index) for side, count in self.sides.items() for index in range(count)]
+
+    @classmethod
+    def from_tv(cls, pylips):
+        """
+        Fetch the topology from a TV.
+
+        Args:
+            pylips (Pylips): Configured Pylips instance.
+
+        Returns:
+            AmbilightTopology: Topology of the TV.
+
+        Raises:
+            ValueError: If the TV does not report a topology.
+        """
+        response = pylips.get("ambilight/topology", False, 0, False)
+        if response is None or len(response) == 0 or response[0] != '{' or "layers" not in response:
+            raise ValueError("Can not read ambilight/topology: %s" % response)
+        return cls(response)
+
+    def as_frame(self, frame):
+        """
+        Copy a frame into a uint8 array of the topology's shape.
+
+        Args:
+            frame (numpy.ndarray or bytes): RGB values, layers x pixels x 3.
+
+        Returns:
+            numpy.ndarray: Frame.
+        """
+        require_numpy()
+        if isinstance(frame, (bytes, bytearray, memoryview)):
+            return np.frombuffer(frame, dtype=np.uint8).reshape(self.shape).copy()
+        return np.array(frame, dtype=np.uint8).reshape(self.shape)
+
+    def decode(self, data):
+        """
+        Convert a layered ambilight JSON document into a frame.
+
+        Args:
+            data (dict or str): Response of ambilight/measured, ambilight/processed or ambilight/cached.
+
+        Returns:
+            numpy.ndarray: Frame, pixels missing from the document are black.
+        """
+        require_numpy()
+        if isinstance(data, str):
+            data = json.loads(data)
+        frame = np.zeros(self.shape, dtype=np.uint8)
+        for layer in range(self.layers):
+            sides = data.get("layer%d" % (layer + 1), {})
+            for side, pixels in sides.items():
+                if side not in self.offsets:
+                    continue
+                offset = self.offsets[side]
+                for index, rgb in pixels.items():
+                    frame[layer, offset + int(index)] = (rgb["r"], rgb["g"], rgb["b"])
+        return frame
+
+    def encode(self, frame, changed=None):
+        """
+        Convert a frame into the layered ambilight JSON document.
+
+        Args:
+            frame (numpy.ndarray): Frame.
+            changed (numpy.ndarray, optional): Boolean mask (layers x pixels) of the pixels to include.
+
+        Returns:
+            bytes: JSON document, None if no pixel is included.
+        """
+        layers = []
+        for layer in range(self.layers):
+            indexes = range(self.pixels) if changed is None else np.flatnonzero(changed[layer])
+            if len(indexes) == 0:
+                continue
+            sides = collections.OrderedDict()
+            rows = frame[layer].tolist()
+            for pixel in indexes:
+                side, index = self.pixel_sides[pixel]
+                r, g, b = rows[pixel]
+                sides.setdefault(side, []).append('"%d":{"r":%d,"g":%d,"b":%d}' % (index, r, g, b))
+            layers.append(
+                '"layer%d":{%s}' % (
+                    layer + 1, ",".join('"%s":{%s}' % (side, ",".join(pixels)) for side, pixels in sides.items())
+                )
+            )
+        if len(layers) == 0:
+            return None
+        return ("{" + ",".join(layers) + "}").encode("utf-8")
+
+
+class AmbilightStreamer:
+    """
+    Stream frames to ambilight/cached over a kept-alive connection.
+
+    Frames are pushed from the producer's thread and sent by a background thread. Only pixels that changed since
+    the last frame the TV accepted are encoded. When the TV is slower than the producer, frames waiting to be sent
+    are replaced by newer ones (and counted as dropped), so the Ambilight never lags behind the source.
+    """
+
+    def __init__(self, pylips, topology=None, timeout=None):
+        """
+        Initialize the streamer.
+
+        Args:
+            pylips (Pylips): Configured Pylips instance.
+            topology (AmbilightTopology, optional): Topology, fetched from the TV if not given.
+            timeout (float, optional): Request timeout, defaults to 'ambilight_stream_timeout'.
+
+        Returns:
+            None
+        """
+        require_numpy()
+        self.pylips = pylips
+        self.topology = topology if topology is not None else AmbilightTopology.from_tv(pylips)
+        self.session = pylips.session
+        self.auth = pylips.auth
+        self.url = pylips.base_url + "ambilight/cached"
+        self.headers = {"Content-Type": "application/json"}
+        if timeout is None:
+            timeout = float(pylips.config["DEFAULT"].get("ambilight_stream_timeout", "1"))
+        self.timeout = timeout
+        self.last_frame = None
+        self.pending = None
+        self.condition = threading.Condition()
+        self.thread = None
+        self.running = False
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.frames_unchanged = 0
+        self.frames_failed = 0
+        self.sent_times = collections.deque(maxlen=256)
+
+    def start(self, manual_mode=True):
+        """
+        Start the sender thread.
+
+        Args:
+            manual_mode (bool): Switch the Ambilight to manual mode so the cached colours are shown.
+
+        Returns:
+            AmbilightStreamer: The streamer.
+        """
+        if manual_mode:
+            self.pylips.post("ambilight/mode", {"current": "manual"}, False)
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="pylips-ambilight-stream", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop the sender thread after the frame in flight.
+
+        Returns:
+            None
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def push(self, frame):
+        """
+        Queue a frame for sending, replacing a frame that is still waiting.
+
+        Args:
+            frame (numpy.ndarray or bytes): RGB values, layers x pixels x 3.
+
+        Returns:
+            None
+        """
+        frame = self.topology.as_frame(frame)
+        with self.condition:
+            if self.pending is not None:
+                self.frames_dropped += 1
+            self.pending = frame
+            self.condition.notify()
+
+    def run(self):
+        """
+        Send queued frames until stopped.
+
+        Returns:
+            None
+        """
+        while True:
+            with self.condition:
+                while self.pending is None and self.running:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                frame = self.pending
+                self.pending = None
+            self.send_frame(frame)
+
+    def send(self, frame):
+        """
+        Send the pixels of a frame that changed since the last accepted frame.
+
+        Args:
+            frame (numpy.ndarray or bytes): RGB values, layers x pixels x 3.
+
+        Returns:
+            bool: True if the TV accepted the frame or nothing changed.
+        """
+        return self.send_frame(self.topology.as_frame(frame))
+
+    def send_frame(self, frame):
+        """
+        Send a frame that is already in the topology's shape.
+
+        Args:
+            frame (numpy.ndarray): Frame.
+
+        Returns:
+            bool: True if the TV accepted the frame or nothing changed.
+        """
+        if self.last_frame is None:
+            data = self.topology.encode(frame)
+        else:
+            data = self.topology.encode(frame, np.any(frame != self.last_frame, axis=2))
+        if data is None:
+            self.frames_unchanged += 1
+            return True
+        try:
+            r = self.session.post(
+                self.url, data=data, headers=self.headers, auth=self.auth, verify=False, timeout=self.timeout
+            )
+        except Exception as e:
+            self.frames_failed += 1
+            log.error("Ambilight frame failed: %s", e)
+            return False
+        if r.status_code != 200:
+            self.frames_failed += 1
+            log.error("Ambilight frame rejected: %s", r.status_code)
+            return False
+        self.last_frame = frame
+        self.frames_sent += 1
+        self.sent_times.append(time.monotonic())
+        return True
+
+    def fps(self, window=1.0):
+        """
+        Return the achieved frame rate.
+
+        Args:
+            window (float): Seconds to average over.
+
+        Returns:
+            float: Frames per second sent within the window.
+        """
+        now = time.monotonic()
+        recent = [sent for sent in self.sent_times if now - sent <= window]
+        if len(recent) < 2:
+            return float(len(recent)) / window
+        return (len(recent) - 1) / max(recent[-1] - recent[0], 1e-6)
+
+    def stats(self):
+        """
+        Return streaming counters.
+
+        Returns:
+            dict: Sent, dropped, unchanged and failed frames and the achieved fps.
+        """
+        return {
+            "sent": self.frames_sent, "dropped": self.frames_dropped, "unchanged": self.frames_unchanged,
+            "failed": self.frames_failed, "fps": round(self.fps(), 2)
+        }
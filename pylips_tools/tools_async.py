@@ -0,0 +1,617 @@
+# tools_async.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import asyncio
+import json
+import logging
+import time
+
+from pylips_tools.tools_batch import validate_batch
+from pylips_tools.tools_breaker import UNREACHABLE
+from pylips_tools.tools_commands import encode_body
+from pylips_tools.tools_discovery import supports
+from pylips_tools.tools_fleet import fleet_members
+from pylips_tools.tools_logging import get_logger, log_body
+from pylips_tools.tools_macro import Key, compile_keys, macros, parse_keys
+from pylips_tools.tools_queue import TV_MESSAGE_KEYS, CommandQueue
+from pylips_tools.tools_status import StatusStore
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import aiomqtt
+except ImportError:
+    aiomqtt = None
+
+http_log = get_logger("http")
+mqtt_log = get_logger("mqtt")
+
+if httpx is not None:
+    class AsyncPylipsDigestAuth(httpx.DigestAuth):
+        """
+        Digest auth for httpx that counts challenge round trips.
+
+        httpx keeps the last challenge and reuses it with an incremented nonce count, so only the first request
+        and requests answered with a stale nonce take the 401 round trip.
+        """
+
+        def __init__(self, username, password):
+            super().__init__(username, password)
+            self.requests = 0
+            self.challenges = 0
+
+        def auth_flow(self, request):
+            self.requests += 1
+            flow = super().auth_flow(request)
+            response = yield next(flow)
+            while True:
+                try:
+                    request = flow.send(response)
+                except StopIteration:
+                    return
+                self.challenges += 1
+                response = yield request
+
+        def stats(self):
+            """
+            Return the number of requests and challenge round trips.
+
+            Returns:
+                dict: Counters.
+            """
+            return {"requests": self.requests, "challenges": self.challenges}
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+OFF_STATUS = {"powerstate": "Off", "ambilight": False, "ambihue": False, "ambi_brightness": False, "dls_state": False}
+
+
+class AsyncPylips:
+    def __init__(self, pylips):
+        """
+        Initialize an asyncio client for the TV of a Pylips instance.
+
+        Args:
+            pylips (Pylips): Configured Pylips instance.
+
+        Returns:
+            None
+        """
+        if httpx is None:
+            raise ImportError("AsyncPylips needs httpx, please install it with 'pip install httpx'")
+        self.pylips = pylips
+        self.config = pylips.config
+        self.tv = pylips.tv
+        self.name = pylips.name
+        self.verbose = pylips.verbose
+        self.available_commands = pylips.available_commands
+        self.commands = pylips.commands
+        self.topic_pylips = pylips.topic_pylips
+        self.topic_status = pylips.topic_status
+        self.status_store = StatusStore.from_config(self.config, self.topic_status, OFF_STATUS)
+        self.mqtt = None
+        self.base_url = pylips.base_url
+        self.cache = pylips.cache
+        self.breaker = pylips.breaker
+        self.auth = None
+        if len(self.tv["user"]) > 0 and len(self.tv["pass"]) > 0:
+            self.auth = AsyncPylipsDigestAuth(str(self.tv["user"]), str(self.tv["pass"]))
+        self.client = httpx.AsyncClient(
+            verify=False, auth=self.auth, timeout=2,
+            limits=httpx.Limits(max_connections=pylips.pool_maxsize + 1)
+        )
+
+    async def aclose(self):
+        """
+        Close the HTTP connection pool.
+
+        Returns:
+            None
+        """
+        await self.client.aclose()
+
+    def auth_stats(self):
+        """
+        Return digest-auth counters for this TV.
+
+        Returns:
+            dict: Number of requests and of 401 challenge round trips.
+        """
+        if self.auth is None:
+            return {"requests": 0, "challenges": 0}
+        return self.auth.stats()
+
+    async def get(self, path, verbose=True, err_count=0, print_response=True):
+        """
+        Send a GET request to the specified path.
+
+        Args:
+            path (str): API endpoint path.
+            verbose (bool): Display feedback.
+            err_count (int): Number of retry attempts.
+            print_response (bool): Print the response.
+
+        Returns:
+            str: Response text or error message.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(path)
+            if cached is not None:
+                return cached
+        if not self.breaker.allow():
+            http_log.debug("Can not reach the API, GET %s failed fast", path)
+            return UNREACHABLE
+        num_retries = int(self.config["DEFAULT"]["num_retries"])
+        deadline = time.monotonic() + self.breaker.deadline
+        while err_count < num_retries and time.monotonic() < deadline:
+            if verbose:
+                http_log.info("Sending GET request to %s%s", self.base_url, path)
+            try:
+                r = await self.client.get(self.base_url + str(path), timeout=min(2, deadline - time.monotonic()))
+            except Exception as e:
+                http_log.error("GET request failed: %s", e)
+                err_count += 1
+                if err_count < num_retries:
+                    await asyncio.sleep(self.breaker.backoff(err_count, deadline))
+                continue
+            self.breaker.success()
+            if len(r.text) > 0:
+                if self.cache is not None and r.status_code == 200:
+                    self.cache.put(path, r.text)
+                if print_response:
+                    log_body(http_log, "Response: %s", r.text, tv=self.name, method="GET", path=str(path))
+                return r.text
+            err_count += 1
+        if self.breaker.failure():
+            http_log.error("Can not reach the API, failing requests fast until it answers again")
+        else:
+            http_log.debug("Can not reach the API")
+        return UNREACHABLE
+
+    async def post(self, path, body, verbose=True, err_count=0):
+        """
+        Send a POST request to the specified path.
+
+        Args:
+            path (str): API endpoint path.
+            body (str, dict or bytes): Request body, bytes are sent as already serialized JSON, None sends no body.
+            verbose (bool): Display feedback.
+            err_count (int): Number of retry attempts.
+
+        Returns:
+            str: Response text or error message.
+        """
+        if type(body) is str:
+            body = json.loads(body)
+        if body is not None and not isinstance(body, bytes):
+            body = encode_body(body)
+        if not self.breaker.allow():
+            http_log.debug("Can not reach the API, POST %s failed fast", path)
+            return UNREACHABLE
+        num_retries = int(self.config["DEFAULT"]["num_retries"])
+        deadline = time.monotonic() + self.breaker.deadline
+        while err_count < num_retries and time.monotonic() < deadline:
+            if verbose:
+                http_log.info("Sending POST request to %s%s", self.base_url, path)
+            try:
+                r = await self.client.post(
+                    self.base_url + str(path), content=body, headers=None if body is None else JSON_HEADERS,
+                    timeout=min(2, deadline - time.monotonic())
+                )
+            except Exception as e:
+                http_log.error("POST request failed: %s", e)
+                err_count += 1
+                if err_count < num_retries:
+                    await asyncio.sleep(self.breaker.backoff(err_count, deadline))
+                continue
+            self.breaker.success()
+            if self.cache is not None and r.status_code == 200:
+                self.cache.invalidate(path)
+            if len(r.text) > 0:
+                log_body(http_log, "Response: %s", r.text, tv=self.name, method="POST", path=str(path))
+                return r.text
+            elif r.status_code == 200:
+                http_log.info("Response: OK")
+                return json.dumps({"response": "OK"})
+            err_count += 1
+        if self.breaker.failure():
+            http_log.error("Can not reach the API, failing requests fast until it answers again")
+        else:
+            http_log.debug("Can not reach the API")
+        return UNREACHABLE
+
+    async def run_command(self, command, body=None, verbose=True):
+        """
+        Run a specified command.
+
+        Args:
+            command (str): Command to run.
+            body (str or dict, optional): Request body.
+            verbose (bool): Display feedback.
+
+        Returns:
+            str: Response text or error message.
+        """
+        entry = self.commands.get(command)
+        if entry is None:
+            logging.error("Unknown command")
+        elif entry.method == "get":
+            return await self.get(entry.path, verbose, 0, False)
+        elif entry.method == "post":
+            try:
+                data = entry.render(body)
+            except ValueError as e:
+                logging.error("%s", e)
+                return json.dumps({"error": str(e)})
+            return await self.post(entry.path, data, verbose)
+        else:
+            # The power-on engine waits for the TV with short blocking probes, keep it off the event loop
+            result = await asyncio.get_running_loop().run_in_executor(
+                None, self.pylips.power_on, None, entry.path
+            )
+            return json.dumps(result)
+
+    async def run_keys(self, keys, verbose=False):
+        """
+        Send a key sequence, pacing the keys with the KeyPacer of the TV; see tools_macro.run_keys.
+
+        Args:
+            keys (list or str): Command names and pauses in seconds.
+            verbose (bool): Display feedback for every key.
+
+        Returns:
+            dict: Number of keys sent, elapsed time and last gap in seconds, and an error if the sequence failed.
+        """
+        try:
+            steps = compile_keys(self.commands, parse_keys(keys))
+        except ValueError as e:
+            logging.error("%s", e)
+            return {"error": str(e)}
+        pacer = self.pylips.key_pacer
+        start = time.perf_counter()
+        result = {"keys": 0, "time": 0.0, "gap": None}
+        pause = 0.0
+        for step in steps:
+            if not isinstance(step, Key):
+                pause = step
+                continue
+            wait = max(pause, pacer.delay())
+            if wait > 0:
+                await asyncio.sleep(wait)
+            pause = 0.0
+            sent = time.perf_counter()
+            if await self.post(step.path, step.body, verbose) == UNREACHABLE:
+                pacer.failed()
+                result["error"] = "%s was not acknowledged" % step.name
+                break
+            pacer.acknowledged(time.perf_counter() - sent)
+            result["keys"] += 1
+            result["gap"] = round(pacer.gap(), 4)
+        result["time"] = round(time.perf_counter() - start, 4)
+        if "error" in result:
+            http_log.error("Key sequence stopped after %d keys: %s", result["keys"], result["error"])
+        return result
+
+    async def run_batch(self, batch, concurrency=None, verbose=True):
+        """
+        Run several commands, at most 'concurrency' at a time, and collect the results.
+
+        Args:
+            batch (list or str): Commands, see tools_batch.validate_batch.
+            concurrency (int, optional): Number of commands in flight, defaults to 'batch_concurrency'.
+            verbose (bool): Display feedback.
+
+        Returns:
+            dict: Per-command results and timings, or an error.
+        """
+        try:
+            entries = validate_batch(self.commands, batch)
+        except (ValueError, json.JSONDecodeError) as e:
+            logging.error("%s", e)
+            return {"error": str(e)}
+        if concurrency is None:
+            concurrency = int(self.config["DEFAULT"].get("batch_concurrency", "1"))
+        semaphore = asyncio.Semaphore(max(1, int(concurrency)))
+
+        async def run_entry(entry):
+            async with semaphore:
+                start = time.perf_counter()
+                if entry["command"] == "get":
+                    response = await self.get(entry["path"], verbose, 0, False)
+                elif entry["command"] == "post":
+                    response = await self.post(entry["path"], entry["body"], verbose)
+                else:
+                    response = await self.run_command(entry["command"], entry["body"], verbose)
+                return {
+                    "command": entry["command"], "response": parse_json(response) or response,
+                    "time": round(time.perf_counter() - start, 4)
+                }
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*[run_entry(entry) for entry in entries])
+        response = {"results": list(results), "time": round(time.perf_counter() - start, 4)}
+        log_body(http_log, "Batch response: %s", json.dumps(response), tv=self.name)
+        return response
+
+    async def update_status(self, update):
+        """
+        Merge a status update and publish it if something changed.
+
+        Args:
+            update (dict): Status update.
+
+        Returns:
+            None
+        """
+        for topic, payload in self.status_store.update(update):
+            await self.mqtt.publish(topic, payload, retain=True)
+
+    async def update_cycle(self):
+        """
+        Poll the TV once, running all probes concurrently once the TV is on.
+
+        Returns:
+            None
+        """
+        powerstate = parse_json(await self.get("powerstate", self.verbose, 0, False))
+        if "powerstate" not in powerstate:
+            return await self.update_status(OFF_STATUS)
+        if powerstate["powerstate"].lower() != "on":
+            return await self.update_status(dict(OFF_STATUS, powerstate=powerstate["powerstate"]))
+        # Probes of features the TV's capability profile lacks are skipped
+        ambilight, ambihue, brightness, dls = await asyncio.gather(
+            self.get("ambilight/currentconfiguration", self.verbose, 0, False)
+            if supports(self.pylips, "ambilight") else skipped_probe(),
+            self.run_command("ambihue_state", None, False) if supports(self.pylips, "ambihue") else skipped_probe(),
+            self.run_command("ambilight_brightness_state", None, False)
+            if supports(self.pylips, "ambi_brightness") else skipped_probe(),
+            self.run_command("display_light_sensor_state", None, False)
+            if supports(self.pylips, "dls_state") else skipped_probe()
+        )
+        update = {"powerstate": powerstate["powerstate"]}
+        ambilight = parse_json(ambilight)
+        if "styleName" in ambilight:
+            update["ambilight"] = ambilight
+        ambihue = parse_json(ambihue)
+        if "power" in ambihue:
+            update["ambihue"] = ambihue["power"]
+        brightness = parse_json(brightness)
+        if "values" in brightness:
+            update["ambi_brightness"] = brightness["values"][0]["value"]["data"]["value"]
+        dls = parse_json(dls)
+        if "values" in dls:
+            update["dls_state"] = dls["values"][0]["value"]["data"]["selected_item"]
+        await self.update_status(update)
+
+    async def handle_message(self, message):
+        """
+        Handle a decoded MQTT message addressed to this TV.
+
+        Args:
+            message (dict): Decoded MQTT message.
+
+        Returns:
+            None
+        """
+        loop = asyncio.get_running_loop()
+        if "status" in message:
+            await self.update_status(message["status"])
+        if "settings" in message:
+            # The settings helpers are blocking, they run on the sync client like the Ambilight effects
+            try:
+                await loop.run_in_executor(None, self.pylips.set_settings, message["settings"])
+            except (KeyError, ConnectionError) as e:
+                mqtt_log.error("Can not write settings: %s", e)
+        if "ambilight_effect" in message:
+            from pylips_tools.tools_effects import play_effect_message
+            await loop.run_in_executor(None, play_effect_message, self.pylips, message["ambilight_effect"])
+        if self.pylips.effect_player is not None and "command" in message:
+            from pylips_tools.tools_effects import interrupts_effect
+            if interrupts_effect(self.commands, message):
+                await loop.run_in_executor(None, self.pylips.stop_ambilight_effect)
+        if "batch" in message:
+            await self.run_batch(message["batch"], message.get("concurrency"), self.verbose)
+        if "keys" in message and "save_macro" in message:
+            self.pylips.save_macro(message["save_macro"], message["keys"])
+        elif "keys" in message:
+            await self.run_keys(message["keys"], self.verbose)
+        if "macro" in message:
+            keys = macros(self.pylips).get(str(message["macro"]).lower())
+            if keys is None:
+                logging.error("Unknown macro: %s", message["macro"])
+            else:
+                await self.run_keys(keys, self.verbose)
+        if "command" in message:
+            body = message.get("body")
+            path = message.get("path", "")
+            if message["command"] in ("get", "post") and len(path) == 0:
+                return logging.error("Please provide a 'path' argument")
+            if message["command"] == "get":
+                await self.get(path, self.verbose, 0, False)
+            elif message["command"] == "post":
+                await self.post(path, body, self.verbose)
+            else:
+                await self.run_command(message["command"], body, self.verbose)
+
+
+def parse_json(text):
+    """
+    Decode a JSON response, returning an empty dict for errors and non-JSON answers.
+
+    Args:
+        text (str): Response text.
+
+    Returns:
+        dict: Decoded response.
+    """
+    if text is None or len(text) == 0 or text[0] != '{':
+        return {}
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return {}
+
+
+async def skipped_probe():
+    """
+    Stand in for a status probe the TV's capability profile rules out.
+
+    Returns:
+        str: Empty response.
+    """
+    return ""
+
+
+class AsyncCommandQueue(CommandQueue):
+    """
+    CommandQueue drained by a task on the event loop instead of a worker thread.
+
+    Size limit, drop policy and coalescing are the ones of CommandQueue. Messages that only update the status
+    are handled by the bridge and never queued.
+    """
+
+    def __init__(self, tv, size=64, drop="oldest"):
+        """
+        Initialize the queue.
+
+        Args:
+            tv (AsyncPylips): Target TV.
+            size (int): Maximum number of waiting commands.
+            drop (str): "oldest" or "newest".
+
+        Returns:
+            None
+        """
+        super().__init__(tv, size, drop)
+        self.ready = asyncio.Event()
+        self.task = None
+
+    def start(self):
+        """
+        Start the worker task, must be called from the event loop.
+
+        Returns:
+            AsyncCommandQueue: The queue.
+        """
+        self.task = asyncio.create_task(self.run())
+        return self
+
+    def put(self, message):
+        """
+        Queue a decoded MQTT message, replacing a waiting one to the same target.
+
+        Args:
+            message (dict): Decoded MQTT message.
+
+        Returns:
+            None
+        """
+        super().put(message)
+        self.ready.set()
+
+    async def run(self):
+        """
+        Execute queued messages in order until cancelled.
+
+        Returns:
+            None
+        """
+        while True:
+            while len(self.slots) == 0:
+                self.ready.clear()
+                await self.ready.wait()
+            with self.condition:
+                key, message = self.slots.popleft()
+                if key is not None:
+                    del self.keyed[key]
+            try:
+                await self.pylips.handle_message(message)
+            except Exception as e:
+                mqtt_log.error("Handling mqtt message for %s failed: %s", self.pylips.name or "TV", e)
+            self.executed += 1
+
+
+async def status_updater(tv):
+    """
+    Run the status poll of one TV with the configured update interval.
+
+    Args:
+        tv (AsyncPylips): Target TV.
+    """
+    while True:
+        try:
+            await tv.update_cycle()
+        except Exception as e:
+            mqtt_log.error("Status update for %s failed: %s", tv.name or "TV", e)
+        await asyncio.sleep(int(tv.config["DEFAULT"]["update_interval"]))
+
+
+async def mqtt_bridge(self):
+    """
+    Serve MQTT commands and status updates for every TV on one event loop.
+
+    Each TV gets its own ordered command queue and status poller, so a slow TV request never blocks
+    other TVs, other commands or the status updates. The queues follow 'command_queue_size' and
+    'command_queue_drop' and coalesce commands like the threaded CommandQueue; with a size of 0 commands run in
+    the message loop.
+    """
+    if aiomqtt is None:
+        raise ImportError("The asyncio MQTT bridge needs aiomqtt, please install it with 'pip install aiomqtt'")
+    tvs = {tv.topic_pylips: AsyncPylips(tv) for tv in fleet_members(self)}
+    tls_params = None
+    if self.config["MQTT"]["TLS"].lower() == "true":
+        tls_params = aiomqtt.TLSParameters(ca_certs=self.config["MQTT"]["cert_path"].strip() or None)
+    client = aiomqtt.Client(
+        str(self.config["MQTT"]["host"]), int(self.config["MQTT"]["port"]),
+        username=self.config["MQTT"]["user"] or None, password=self.config["MQTT"]["pass"] or None,
+        tls_params=tls_params, keepalive=60
+    )
+    tasks = []
+    try:
+        async with client:
+            mqtt_log.info("Connected to MQTT broker at %s", self.config["MQTT"]["host"])
+            queues = {}
+            size = int(self.config["DEFAULT"].get("command_queue_size", "64"))
+            for topic, tv in tvs.items():
+                tv.mqtt = client
+                if size > 0:
+                    queues[topic] = AsyncCommandQueue(
+                        tv, size, self.config["DEFAULT"].get("command_queue_drop", "oldest")
+                    ).start()
+                    tasks.append(queues[topic].task)
+                if self.config["DEFAULT"]["mqtt_update"] == "True":
+                    tasks.append(asyncio.create_task(status_updater(tv)))
+                await client.subscribe(topic)
+            async for msg in client.messages:
+                try:
+                    message = json.loads(msg.payload.decode('utf-8'))
+                except json.JSONDecodeError:
+                    mqtt_log.error("Invalid JSON in mqtt message: %s", msg.payload.decode('utf-8'))
+                    continue
+                tv = tvs.get(str(msg.topic))
+                if tv is None:
+                    continue
+                if str(msg.topic) in queues and any(key in message for key in TV_MESSAGE_KEYS):
+                    queues[str(msg.topic)].put(message)
+                    continue
+                try:
+                    await tv.handle_message(message)
+                except Exception as e:
+                    mqtt_log.error("Handling mqtt message for %s failed: %s", tv.name or "TV", e)
+    finally:
+        for task in tasks:
+            task.cancel()
+        for tv in tvs.values():
+            await tv.aclose()
+
+
+def start_async_bridge(self):
+    """
+    Run the asyncio MQTT bridge until interrupted.
+    """
+    print("Started asyncio MQTT bridge")
+    asyncio.run(mqtt_bridge(self))
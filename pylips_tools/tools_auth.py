@@ -0,0 +1,94 @@
+# tools_auth.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import threading
+
+from requests.auth import HTTPDigestAuth
+
+
+class PylipsDigestAuth(HTTPDigestAuth):
+    """
+    Long-lived digest auth handler for one TV.
+
+    The handler keeps the realm/nonce of the last challenge and increments the nonce count on every request, so
+    only the first request (and requests answered with a stale nonce) take the 401 challenge round trip.
+
+    HTTPDigestAuth keeps the challenge per thread. Here the challenge, the last nonce and the nonce count are
+    shared by all threads under a lock, so batch, queue, fleet and daemon threads reuse one nonce as well.
+    """
+
+    def __init__(self, username, password):
+        """
+        Initialize the digest auth handler.
+
+        Args:
+            username (str): Username.
+            password (str): Password.
+
+        Returns:
+            None
+        """
+        super().__init__(username, password)
+        # Reentrant: __call__ holds it while HTTPDigestAuth builds the header through build_digest_header
+        self.lock = threading.RLock()
+        self.chal = {}
+        self.last_nonce = ""
+        self.nonce_count = 0
+        self.requests = 0
+        self.challenges = 0
+
+    def __call__(self, r):
+        self.init_per_thread_state()
+        with self.lock:
+            self.requests += 1
+            self._thread_local.chal = self.chal
+            self._thread_local.last_nonce = self.last_nonce
+            return super().__call__(r)
+
+    def build_digest_header(self, method, url):
+        """
+        Build the Authorization header from the shared nonce state, publishing a new challenge to all threads.
+
+        Args:
+            method (str): Request method.
+            url (str): Request URL.
+
+        Returns:
+            str: Authorization header, None if the challenge's algorithm is not supported.
+        """
+        with self.lock:
+            self.chal = self._thread_local.chal
+            self._thread_local.last_nonce = self.last_nonce
+            self._thread_local.nonce_count = self.nonce_count
+            header = super().build_digest_header(method, url)
+            self.last_nonce = self._thread_local.last_nonce
+            self.nonce_count = self._thread_local.nonce_count
+            return header
+
+    def handle_401(self, r, **kwargs):
+        """
+        Count digest challenges before answering them.
+
+        Args:
+            r (requests.Response): Response to the request.
+
+        Returns:
+            requests.Response: Final response.
+        """
+        if r.status_code == 401 and "digest" in r.headers.get("www-authenticate", "").lower() and \
+                self._thread_local.num_401_calls < 2:
+            with self.lock:
+                self.challenges += 1
+        return super().handle_401(r, **kwargs)
+
+    def stats(self):
+        """
+        Return the number of requests and challenge round trips.
+
+        Returns:
+            dict: Counters.
+        """
+        with self.lock:
+            return {"requests": self.requests, "challenges": self.challenges}
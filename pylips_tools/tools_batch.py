@@ -0,0 +1,143 @@
+# tools_batch.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pylips_tools.tools_logging import get_logger, log_body
+
+log = get_logger("http")
+
+
+def validate_batch(commands, batch):
+    """
+    Normalize a batch and check every command against the command registry before anything is sent.
+
+    Batch entries are either command names ("volume_up") or objects with a "command" and optional "body" and
+    "path" keys ({"command": "ambilight_brightness", "body": {"value": 5}}).
+
+    Args:
+        commands (CommandRegistry): Compiled available_commands.json.
+        batch (list or str): Batch entries, or a JSON string of them.
+
+    Returns:
+        list: Entries as dicts with "command", "body" and "path" keys.
+
+    Raises:
+        ValueError: If the batch is malformed, contains unknown commands or command parameters that do not fit.
+    """
+    if isinstance(batch, str):
+        batch = json.loads(batch)
+    if not isinstance(batch, list):
+        raise ValueError("A batch has to be a list of commands")
+    entries = []
+    errors = []
+    for index, item in enumerate(batch):
+        if isinstance(item, str):
+            item = {"command": item}
+        if not isinstance(item, dict) or "command" not in item:
+            errors.append("#%d: missing 'command'" % index)
+            continue
+        entry = {"command": item["command"], "body": item.get("body"), "path": item.get("path", "")}
+        if entry["command"] in ("get", "post"):
+            if len(entry["path"]) == 0:
+                errors.append("#%d: '%s' needs a 'path'" % (index, entry["command"]))
+        elif entry["command"] not in commands:
+            errors.append("#%d: unknown command '%s'" % (index, entry["command"]))
+        elif commands.get(entry["command"]).method == "post":
+            # Render now, so a bad parameter rejects the batch before anything is sent
+            try:
+                commands.get(entry["command"]).render(entry["body"])
+            except ValueError as e:
+                errors.append("#%d: %s" % (index, e))
+        entries.append(entry)
+    if len(errors) > 0:
+        raise ValueError("Invalid batch: " + ", ".join(errors))
+    return entries
+
+
+def run_batch_entry(self, entry, verbose):
+    """
+    Run one validated batch entry and time it.
+
+    Args:
+        entry (dict): Validated entry.
+        verbose (bool): Display feedback.
+
+    Returns:
+        dict: Command, response and elapsed time in seconds.
+    """
+    start = time.perf_counter()
+    if entry["command"] == "get":
+        response = self.get(entry["path"], verbose, 0, False)
+    elif entry["command"] == "post":
+        response = self.post(entry["path"], entry["body"], verbose)
+    else:
+        response = self.run_command(entry["command"], entry["body"], verbose=verbose, print_response=False)
+    elapsed = time.perf_counter() - start
+    if isinstance(response, str) and len(response) > 0 and response[0] in "{[":
+        try:
+            response = json.loads(response)
+        except json.JSONDecodeError:
+            pass
+    return {"command": entry["command"], "response": response, "time": round(elapsed, 4)}
+
+
+def run_batch(self, batch, concurrency=None, verbose=True):
+    """
+    Run several commands over the TV's warm connection pool and collect the results.
+
+    With a concurrency of 1 the commands run one after another in the given order; with a higher concurrency
+    they run in parallel on the TV's batch executor, whose threads (and their digest nonce) stay warm between
+    batches. The concurrency is capped by the size of the connection pool, so every command reuses a kept-alive
+    connection. Results are always returned in batch order.
+
+    Args:
+        batch (list or str): Batch entries, see validate_batch.
+        concurrency (int, optional): Number of commands in flight, defaults to 'batch_concurrency'.
+        verbose (bool): Display feedback.
+
+    Returns:
+        dict: Per-command results and timings, or an error.
+    """
+    try:
+        entries = validate_batch(self.commands, batch)
+    except (ValueError, json.JSONDecodeError) as e:
+        log.error("%s", e)
+        return {"error": str(e)}
+    if concurrency is None:
+        concurrency = int(self.config["DEFAULT"].get("batch_concurrency", "1"))
+    if int(concurrency) > self.pool_maxsize:
+        log.warning(
+            "Batch concurrency %s is limited to the %d pooled connections, raise pool_maxsize or batch_concurrency",
+            concurrency, self.pool_maxsize
+        )
+    concurrency = max(1, min(int(concurrency), self.pool_maxsize, len(entries)))
+    start = time.perf_counter()
+    if concurrency == 1:
+        results = [run_batch_entry(self, entry, verbose) for entry in entries]
+    else:
+        if self.batch_executor is None:
+            self.batch_executor = ThreadPoolExecutor(max_workers=self.pool_maxsize, thread_name_prefix="pylips-batch")
+        # 'concurrency' workers take the next entry until none are left
+        results = [None] * len(entries)
+        pending = iter(enumerate(entries))
+        pending_lock = threading.Lock()
+
+        def run_entries():
+            while True:
+                with pending_lock:
+                    index, entry = next(pending, (None, None))
+                if index is None:
+                    return
+                results[index] = run_batch_entry(self, entry, verbose)
+
+        for future in [self.batch_executor.submit(run_entries) for _ in range(concurrency)]:
+            future.result()
+    response = {"results": results, "time": round(time.perf_counter() - start, 4)}
+    log_body(log, "Batch response: %s", json.dumps(response), tv=self.name)
+    return response
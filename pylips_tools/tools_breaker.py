@@ -0,0 +1,159 @@
+# tools_breaker.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import json
+import random
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+UNREACHABLE = json.dumps({"error": "Can not reach the API"})
+
+
+class CircuitBreaker:
+    """
+    Per-TV circuit breaker around the retry loops of get and post.
+
+    After 'breaker_threshold' calls in a row failed, the breaker opens and calls fail immediately. Once the reset
+    timeout has passed, a single call is let through (half-open): if it succeeds the breaker closes, otherwise it
+    opens again with a doubled, jittered timeout of at most 'breaker_reset_max' seconds.
+    """
+
+    def __init__(self, threshold=1, reset_timeout=5.0, reset_max=300.0, retry_delay=0.2, deadline=10.0):
+        """
+        Initialize the breaker.
+
+        Args:
+            threshold (int): Failed calls in a row that open the breaker.
+            reset_timeout (float): Seconds the breaker stays open the first time.
+            reset_max (float): Longest time the breaker stays open.
+            retry_delay (float): Base delay between the retries of a call.
+            deadline (float): Total seconds a call may take including retries.
+
+        Returns:
+            None
+        """
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.reset_max = reset_max
+        self.retry_delay = retry_delay
+        self.deadline = deadline
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.open_timeout = reset_timeout
+        self.open_until = 0
+        self.probing = False
+        self.fast_fails = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Create a breaker from settings.ini.
+
+        Args:
+            config (configparser.ConfigParser): Parsed settings.ini.
+
+        Returns:
+            CircuitBreaker: New breaker.
+        """
+        return cls(
+            int(config["DEFAULT"].get("breaker_threshold", "1")),
+            float(config["DEFAULT"].get("breaker_reset", "5")),
+            float(config["DEFAULT"].get("breaker_reset_max", "300")),
+            float(config["DEFAULT"].get("retry_delay", "0.2")),
+            float(config["DEFAULT"].get("request_deadline", "10"))
+        )
+
+    def allow(self):
+        """
+        Check whether a call may be sent.
+
+        Returns:
+            bool: False if the call has to fail immediately.
+        """
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() >= self.open_until:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+            self.fast_fails += 1
+            return False
+
+    def success(self):
+        """
+        Record a call that reached the TV.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.probing = False
+            self.open_timeout = self.reset_timeout
+
+    def failure(self):
+        """
+        Record a call that exhausted its retries or deadline.
+
+        Returns:
+            bool: True if the breaker opened because of this call.
+        """
+        with self.lock:
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                self.open_timeout = min(self.open_timeout * 2, self.reset_max)
+            elif self.state == OPEN or self.failures < self.threshold:
+                return False
+            opened = self.state == CLOSED
+            self.state = OPEN
+            self.probing = False
+            self.open_until = time.monotonic() + self.open_timeout * random.uniform(0.5, 1.0)
+            if opened:
+                self.opened += 1
+            return opened
+
+    def reset(self):
+        """
+        Close the breaker, e.g. after the TV was switched on.
+
+        Returns:
+            None
+        """
+        self.success()
+
+    def backoff(self, attempt, deadline):
+        """
+        Return the jittered delay before the next retry of a call.
+
+        Args:
+            attempt (int): Number of failed attempts of the call.
+            deadline (float): Monotonic time the call has to finish by.
+
+        Returns:
+            float: Seconds to wait, never past the deadline.
+        """
+        delay = self.retry_delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+        return max(0.0, min(delay, deadline - time.monotonic()))
+
+    def stats(self):
+        """
+        Return breaker counters.
+
+        Returns:
+            dict: State, failed calls in a row, times opened and calls failed without a request.
+        """
+        with self.lock:
+            return {
+                "state": self.state, "failures": self.failures, "opened": self.opened, "fast_fails": self.fast_fails
+            }
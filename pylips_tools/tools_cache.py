@@ -0,0 +1,266 @@
+# tools_cache.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import atexit
+import collections
+import json
+import logging
+import os
+import threading
+import time
+
+# Seconds changes are collected before the persisted cache is rewritten
+SAVE_DELAY = 5
+
+# GET paths (prefixes) whose cached responses a successful POST to a path makes stale, besides the path itself
+INVALIDATES = {
+    "activities/tv": ("activities/",),
+    "activities/launch": ("activities/", "applications"),
+    "menuitems/settings/update": ("menuitems/settings/",),
+    "ambilight/": (
+        "ambilight/currentconfiguration", "ambilight/mode", "ambilight/power", "ambilight/lounge", "ambilight/cached",
+        "ambilight/measured", "ambilight/processed"
+    ),
+    "huelamp/": ("huelamp/",),
+    "channeldb/": ("channeldb/",),
+    "input/key": ("activities/", "powerstate", "audio/"),
+}
+
+
+def cache_ttls(config):
+    """
+    Read the per-path TTLs of the [CACHE] section.
+
+    Paths are matched case-insensitively, since settings.ini keys are lowercased.
+
+    Args:
+        config (configparser.ConfigParser): Parsed settings.ini.
+
+    Returns:
+        dict: TTL in seconds by lowercased path.
+    """
+    if not config.has_section("CACHE"):
+        return {}
+    defaults = config.defaults()
+    return {
+        path.strip("/"): float(ttl) for path, ttl in config["CACHE"].items()
+        if path not in defaults and float(ttl) > 0
+    }
+
+
+class ResponseCache:
+    """
+    LRU cache of GET responses with per-path TTLs.
+
+    Only paths listed in the [CACHE] section of settings.ini are cached. Entries expire after their TTL and are
+    dropped when a POST that can change them goes through (see INVALIDATES). With a file the cache survives
+    restarts, so one-shot CLI calls benefit from it as well; changes are written SAVE_DELAY seconds after the
+    first one and when the process exits.
+    """
+
+    def __init__(self, ttls, size=64, path=None):
+        """
+        Initialize the cache.
+
+        Args:
+            ttls (dict): TTL in seconds by lowercased path.
+            size (int): Maximum number of cached responses.
+            path (str, optional): File the cache is persisted to.
+
+        Returns:
+            None
+        """
+        self.ttls = ttls
+        self.size = size
+        self.path = path
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.save_timer = None
+        if path is not None:
+            self.load()
+            atexit.register(self.flush)
+
+    def ttl(self, path):
+        """
+        Return the TTL of a path.
+
+        Args:
+            path (str): API endpoint path.
+
+        Returns:
+            float: TTL in seconds, None if the path is not cached.
+        """
+        return self.ttls.get(str(path).strip("/").lower())
+
+    def get(self, path):
+        """
+        Look up a fresh response.
+
+        Args:
+            path (str): API endpoint path.
+
+        Returns:
+            str: Cached response text, None on a miss.
+        """
+        if self.ttl(path) is None:
+            return None
+        key = str(path).strip("/").lower()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, path, text):
+        """
+        Store a response of a cached path.
+
+        Args:
+            path (str): API endpoint path.
+            text (str): Response text.
+
+        Returns:
+            None
+        """
+        ttl = self.ttl(path)
+        if ttl is None:
+            return
+        key = str(path).strip("/").lower()
+        with self.lock:
+            self.entries[key] = (time.time() + ttl, text)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        self.save()
+
+    def invalidate(self, path):
+        """
+        Drop the responses a POST to a path can change.
+
+        Args:
+            path (str): Path of the POST request.
+
+        Returns:
+            int: Number of dropped responses.
+        """
+        key = str(path).strip("/").lower()
+        prefixes = [key]
+        for posted, stale in INVALIDATES.items():
+            if key == posted or (posted.endswith("/") and key.startswith(posted)):
+                prefixes.extend(stale)
+        with self.lock:
+            stale_keys = [cached for cached in self.entries if cached.startswith(tuple(prefixes))]
+            for cached in stale_keys:
+                del self.entries[cached]
+            self.invalidations += len(stale_keys)
+        if len(stale_keys) > 0:
+            self.save()
+        return len(stale_keys)
+
+    def clear(self):
+        """
+        Drop all cached responses.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.entries.clear()
+        self.save()
+
+    def load(self):
+        """
+        Read the persisted cache, skipping expired entries.
+
+        Returns:
+            None
+        """
+        try:
+            with open(self.path) as cache_file:
+                entries = json.load(cache_file)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        with self.lock:
+            for key, (expires, text) in entries:
+                if expires >= now and self.ttls.get(key) is not None:
+                    self.entries[key] = (expires, text)
+
+    def save(self):
+        """
+        Persist the cache SAVE_DELAY seconds from now if a file is configured, unless a write is already pending.
+
+        Returns:
+            None
+        """
+        if self.path is None:
+            return
+        with self.lock:
+            if self.save_timer is not None:
+                return
+            self.save_timer = threading.Timer(SAVE_DELAY, self.flush)
+            self.save_timer.daemon = True
+            self.save_timer.start()
+
+    def flush(self):
+        """
+        Write a pending change of the cache to its file now.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            if self.save_timer is None:
+                return
+            self.save_timer.cancel()
+            self.save_timer = None
+            entries = list(self.entries.items())
+        try:
+            with open(self.path + ".tmp", "w") as cache_file:
+                json.dump(entries, cache_file)
+            os.replace(self.path + ".tmp", self.path)
+        except OSError as e:
+            logging.debug("Can not write response cache %s: %s", self.path, e)
+
+    def stats(self):
+        """
+        Return cache counters.
+
+        Returns:
+            dict: Hits, misses, invalidated and evicted responses and the number of cached responses.
+        """
+        with self.lock:
+            return {
+                "hits": self.hits, "misses": self.misses, "invalidations": self.invalidations,
+                "evictions": self.evictions, "entries": len(self.entries)
+            }
+
+
+def create_cache(self):
+    """
+    Create the response cache of a TV from settings.ini.
+
+    Every TV persists to '<cache_file>.<host>', so TVs (and --host overrides) never share responses.
+
+    Returns:
+        ResponseCache: Cache, None if no path is cached.
+    """
+    ttls = cache_ttls(self.config)
+    if len(ttls) == 0:
+        return None
+    path = self.config["DEFAULT"].get("cache_file", "") or None
+    if path is not None:
+        path += "." + self.config.get(self.tv_section, "host", fallback="")
+    return ResponseCache(ttls, int(self.config["DEFAULT"].get("cache_size", "64")), path)
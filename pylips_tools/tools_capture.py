@@ -0,0 +1,277 @@
+# tools_capture.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import json
+import threading
+import time
+
+from pylips_tools.tools_ambilight import SIDES, AmbilightTopology, require_numpy
+from pylips_tools.tools_logging import get_logger
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+log = get_logger("ambilight")
+
+CAPTURE_ENDPOINTS = ("ambilight/measured", "ambilight/processed", "ambilight/cached")
+
+
+class AmbilightRecorder:
+    """
+    Sample ambilight/measured, ambilight/processed or ambilight/cached at a fixed rate into a ring buffer.
+
+    The buffer is preallocated from the TV's topology as a (capacity, layers, pixels, 3) uint8 array with a
+    matching array of timestamps, so a long session never builds nested dicts. With a spill path every full
+    ring is appended to a raw file that load_spill() maps back into memory.
+    """
+
+    def __init__(self, pylips, endpoint="ambilight/measured", rate=None, capacity=None, topology=None,
+                 spill_path=None):
+        """
+        Initialize the recorder.
+
+        Args:
+            pylips (Pylips): Configured Pylips instance.
+            endpoint (str): One of CAPTURE_ENDPOINTS.
+            rate (float, optional): Samples per second, defaults to 'ambilight_capture_rate'.
+            capacity (int, optional): Frames kept in memory, defaults to 'ambilight_capture_capacity'.
+            topology (AmbilightTopology, optional): Topology, fetched from the TV if not given.
+            spill_path (str, optional): File the full ring is appended to.
+
+        Returns:
+            None
+        """
+        require_numpy()
+        if endpoint not in CAPTURE_ENDPOINTS:
+            raise ValueError("Can not capture %s, use one of %s" % (endpoint, ", ".join(CAPTURE_ENDPOINTS)))
+        self.pylips = pylips
+        self.endpoint = endpoint
+        if rate is None:
+            rate = float(pylips.config["DEFAULT"].get("ambilight_capture_rate", "10"))
+        if capacity is None:
+            capacity = int(pylips.config["DEFAULT"].get("ambilight_capture_capacity", "3000"))
+        self.interval = 1.0 / rate
+        self.capacity = capacity
+        self.topology = topology if topology is not None else AmbilightTopology.from_tv(pylips)
+        self.frames = np.zeros((capacity,) + self.topology.shape, dtype=np.uint8)
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.index = 0
+        self.count = 0
+        self.missed = 0
+        self.spill_path = spill_path
+        self.spill_start = 0
+        if spill_path is not None:
+            with open(spill_path + ".json", "w") as meta_file:
+                json.dump({"shape": list(self.topology.shape), "endpoint": endpoint}, meta_file)
+            open(spill_path, "wb").close()
+            open(spill_path + ".times", "wb").close()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.running = False
+
+    def start(self):
+        """
+        Start sampling in a background thread.
+
+        Returns:
+            AmbilightRecorder: The recorder.
+        """
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="pylips-ambilight-capture", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop sampling and flush the spill file.
+
+        Returns:
+            None
+        """
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.flush()
+
+    def run(self):
+        """
+        Sample on a fixed schedule; samples that can not be taken in time are skipped and counted as missed.
+
+        Returns:
+            None
+        """
+        next_sample = time.monotonic()
+        while self.running:
+            self.capture_once()
+            next_sample += self.interval
+            delay = next_sample - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                skipped = int(-delay / self.interval)
+                self.missed += skipped
+                next_sample += skipped * self.interval
+
+    def capture_once(self):
+        """
+        Take one sample.
+
+        Returns:
+            bool: True if the sample was recorded.
+        """
+        response = self.pylips.get(self.endpoint, False, 0, False)
+        if response is None or len(response) == 0 or response[0] != '{' or "layer" not in response:
+            log.error("Can not read %s: %s", self.endpoint, response)
+            return False
+        self.add(self.topology.decode(response), time.time())
+        return True
+
+    def add(self, frame, timestamp):
+        """
+        Store a frame in the ring, spilling the ring to disk when it is full.
+
+        Args:
+            frame (numpy.ndarray): Frame.
+            timestamp (float): Unix time of the sample.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.frames[self.index] = frame
+            self.times[self.index] = timestamp
+            self.index += 1
+            self.count += 1
+            if self.index == self.capacity:
+                if self.spill_path is not None:
+                    self.spill(self.spill_start, self.capacity)
+                    self.spill_start = 0
+                self.index = 0
+
+    def spill(self, start, end):
+        """
+        Append a range of the ring to the spill file.
+
+        Args:
+            start (int): First ring position.
+            end (int): Ring position after the last frame.
+
+        Returns:
+            None
+        """
+        with open(self.spill_path, "ab") as frames_file:
+            frames_file.write(self.frames[start:end].tobytes())
+        with open(self.spill_path + ".times", "ab") as times_file:
+            times_file.write(self.times[start:end].tobytes())
+
+    def flush(self):
+        """
+        Spill the frames recorded since the last spill, so the spill file holds the whole session.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            if self.spill_path is not None and self.index > self.spill_start:
+                self.spill(self.spill_start, self.index)
+                self.spill_start = self.index
+
+    def snapshot(self):
+        """
+        Return the frames in memory in recording order.
+
+        Returns:
+            tuple: Timestamps (n,) and frames (n, layers, pixels, 3).
+        """
+        with self.lock:
+            if self.count < self.capacity:
+                return self.times[:self.index].copy(), self.frames[:self.index].copy()
+            order = np.r_[self.index:self.capacity, 0:self.index]
+            return self.times[order], self.frames[order]
+
+
+def load_spill(spill_path):
+    """
+    Map a spill file into memory without reading it.
+
+    Args:
+        spill_path (str): Spill path passed to AmbilightRecorder.
+
+    Returns:
+        tuple: Timestamps (n,) and frames (n, layers, pixels, 3) as read-only memory maps.
+    """
+    require_numpy()
+    with open(spill_path + ".json") as meta_file:
+        shape = tuple(json.load(meta_file)["shape"])
+    times = np.memmap(spill_path + ".times", dtype=np.float64, mode="r")
+    frames = np.memmap(spill_path, dtype=np.uint8, mode="r", shape=(len(times),) + shape)
+    return times, frames
+
+
+def side_averages(frames, topology):
+    """
+    Average colour of every side.
+
+    Args:
+        frames (numpy.ndarray): Frames (n, layers, pixels, 3).
+        topology (AmbilightTopology): Topology of the frames.
+
+    Returns:
+        numpy.ndarray: Averages (n, layers, sides, 3) in the order left, top, right, bottom; NaN for sides
+        without pixels.
+    """
+    averages = np.full(frames.shape[:2] + (len(SIDES), 3), np.nan, dtype=np.float32)
+    for position, side in enumerate(SIDES):
+        count = topology.sides[side]
+        if count > 0:
+            offset = topology.offsets[side]
+            averages[:, :, position] = frames[:, :, offset:offset + count].mean(axis=2, dtype=np.float32)
+    return averages
+
+
+def frame_deltas(frames):
+    """
+    Mean absolute change between consecutive frames.
+
+    Args:
+        frames (numpy.ndarray): Frames (n, layers, pixels, 3).
+
+    Returns:
+        numpy.ndarray: Deltas (n - 1,), 0 for identical frames and 255 for a full swing of every channel.
+    """
+    if len(frames) < 2:
+        return np.zeros(0, dtype=np.float32)
+    deltas = np.abs(np.diff(frames.astype(np.int16), axis=0))
+    return deltas.reshape(len(deltas), -1).mean(axis=1, dtype=np.float32)
+
+
+def dominant_color(frames, bits=4):
+    """
+    Most frequent colour over all pixels of all frames.
+
+    Colours are quantized to 'bits' bits per channel before counting, so near-identical colours are grouped.
+
+    Args:
+        frames (numpy.ndarray): Frames (..., 3).
+        bits (int): Bits kept per channel.
+
+    Returns:
+        tuple: RGB of the centre of the most frequent colour bucket.
+    """
+    shift = 8 - bits
+    pixels = (np.asarray(frames, dtype=np.uint8).reshape(-1, 3) >> shift).astype(np.int32)
+    if len(pixels) == 0:
+        return None
+    buckets = (pixels[:, 0] << (2 * bits)) | (pixels[:, 1] << bits) | pixels[:, 2]
+    bucket = int(np.bincount(buckets, minlength=1 << (3 * bits)).argmax())
+    mask = (1 << bits) - 1
+    half = (1 << shift) >> 1
+    return (
+        ((bucket >> (2 * bits)) << shift) + half, (((bucket >> bits) & mask) << shift) + half,
+        ((bucket & mask) << shift) + half
+    )
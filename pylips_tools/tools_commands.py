@@ -0,0 +1,202 @@
+# tools_commands.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import collections
+import json
+import logging
+import marshal
+import os
+import types
+
+# Bump when the layout of the cached command index changes
+CACHE_VERSION = 1
+
+Slot = collections.namedtuple("Slot", ["name", "type", "keys", "convert"])
+
+# Commands that take parameters: the typed slots of their body template
+COMMAND_SLOTS = {
+    "ambilight_brightness": (
+        Slot("value", int, ("values", 0, "value", "data", "value"), None),
+    ),
+    "ambilight_color": (
+        Slot("hue", float, ("colorSettings", "color", "hue"), lambda value: int(value * (255 / 360))),
+        Slot("saturation", float, ("colorSettings", "color", "saturation"), lambda value: int(value * (255 / 100))),
+        Slot("brightness", float, ("colorSettings", "color", "brightness"), int),
+    ),
+    "google_assistant": (
+        Slot("query", str, ("intent", "extras", "query"), None),
+    ),
+}
+
+
+def load_command_index(json_path):
+    """
+    Load available_commands.json and its compiled registry through a marshalled index cached next to it.
+
+    The cache is keyed by the JSON file's modification time and size, so editing the JSON invalidates it.
+    Failing to write the cache (e.g. read-only installs) only costs the JSON parse and compilation.
+
+    Args:
+        json_path (str): Path to available_commands.json.
+
+    Returns:
+        tuple: Content of available_commands.json and its CommandRegistry.
+    """
+    cache_path = json_path + ".cache"
+    stat = os.stat(json_path)
+    key = (CACHE_VERSION, stat.st_mtime_ns, stat.st_size)
+    try:
+        with open(cache_path, "rb") as cache_file:
+            cached_key, available_commands, rows = marshal.loads(cache_file.read())
+        if cached_key == key:
+            return available_commands, CommandRegistry(available_commands, rows)
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+    with open(json_path) as json_file:
+        available_commands = json.load(json_file)
+    registry = CommandRegistry(available_commands)
+    try:
+        with open(cache_path + ".tmp", "wb") as cache_file:
+            cache_file.write(marshal.dumps((key, available_commands, registry.rows())))
+        os.replace(cache_path + ".tmp", cache_path)
+    except OSError as e:
+        logging.debug("Can not write command cache %s: %s", cache_path, e)
+    return available_commands, registry
+
+
+def encode_body(body):
+    """
+    Serialize a request body once.
+
+    Args:
+        body (dict): Request body.
+
+    Returns:
+        bytes: Compact JSON.
+    """
+    return json.dumps(body, separators=(",", ":")).encode("utf-8")
+
+
+class Command(collections.namedtuple("Command", ["name", "method", "path", "body", "template", "slots"])):
+    """
+    Frozen entry of the command registry.
+
+    'body' holds the pre-serialized default body, 'template' the JSON of the body template the typed 'slots'
+    are filled into. Neither is ever mutated, so concurrent and repeated calls can not affect each other.
+    """
+    __slots__ = ()
+
+    def render(self, params=None):
+        """
+        Build the request body for a call.
+
+        Args:
+            params (dict or str, optional): Slot values for parameterized commands, or a body replacing the
+                default body of other commands.
+
+        Returns:
+            bytes: Request body.
+
+        Raises:
+            ValueError: If a slot value is missing or has the wrong type.
+        """
+        if isinstance(params, str):
+            params = json.loads(params) if len(params) > 0 else None
+        if params is None:
+            if self.body is None:
+                return b"{}"
+            return self.body
+        if len(self.slots) == 0:
+            return encode_body(params)
+        if not isinstance(params, dict):
+            if len(self.slots) != 1:
+                raise ValueError("%s needs %s" % (self.name, ", ".join(slot.name for slot in self.slots)))
+            params = {self.slots[0].name: params}
+        body = json.loads(self.template)
+        for slot in self.slots:
+            if slot.name not in params:
+                raise ValueError("%s needs a '%s' value" % (self.name, slot.name))
+            try:
+                value = slot.type(params[slot.name])
+            except (TypeError, ValueError):
+                raise ValueError("'%s' of %s has to be %s" % (slot.name, self.name, slot.type.__name__))
+            if slot.convert is not None:
+                value = slot.convert(value)
+            target = body
+            for key in slot.keys[:-1]:
+                target = target[key]
+            target[slot.keys[-1]] = value
+        return encode_body(body)
+
+
+class CommandRegistry:
+    """
+    Commands of available_commands.json compiled once at startup.
+    """
+
+    def __init__(self, available_commands, rows=None):
+        """
+        Compile available_commands.json.
+
+        GET commands take precedence over POST and power commands of the same name, like run_command always did.
+        input_* commands are compiled into complete google_assistant requests.
+
+        Args:
+            available_commands (dict): Content of available_commands.json.
+            rows (list, optional): Output of rows() of an earlier compilation, skips compiling.
+
+        Returns:
+            None
+        """
+        if rows is not None:
+            self.commands = types.MappingProxyType(
+                {row[0]: Command(*row, COMMAND_SLOTS.get(row[0], ())) for row in rows}
+            )
+            return
+        commands = {}
+        for name, entry in available_commands["power"].items():
+            commands[name] = Command(name, "power", entry["path"], None, None, ())
+        assistant = available_commands["post"].get("google_assistant")
+        for name, entry in available_commands["post"].items():
+            if "input_" in name and assistant is not None:
+                body = json.loads(json.dumps(assistant["body"]))
+                body["intent"]["extras"]["query"] = entry["body"]["query"]
+                commands[name] = Command(name, "post", assistant["path"], encode_body(body), None, ())
+                continue
+            template = entry.get("body")
+            commands[name] = Command(
+                name, "post", entry["path"], None if template is None else encode_body(template),
+                None if template is None else json.dumps(template), COMMAND_SLOTS.get(name, ())
+            )
+        for name, entry in available_commands["get"].items():
+            commands[name] = Command(name, "get", entry["path"], None, None, ())
+        self.commands = types.MappingProxyType(commands)
+
+    def rows(self):
+        """
+        Return the compiled commands as plain tuples that marshal can store.
+
+        Returns:
+            list: (name, method, path, body, template) tuples.
+        """
+        return [tuple(command[:5]) for command in self.commands.values()]
+
+    def __contains__(self, name):
+        return name in self.commands
+
+    def __len__(self):
+        return len(self.commands)
+
+    def get(self, name):
+        """
+        Look up a command.
+
+        Args:
+            name (str): Command name.
+
+        Returns:
+            Command: Entry, None for unknown commands.
+        """
+        return self.commands.get(name)
@@ -0,0 +1,152 @@
+# tools_daemon.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import json
+import logging
+import os
+import socket
+
+DEFAULT_SOCKET = "/tmp/pylips.sock"
+
+# Seconds to connect to the daemon, and to wait for its answer unless the caller sets a timeout
+CONNECT_TIMEOUT = 1
+DAEMON_TIMEOUT = 60
+
+
+def daemon_socket_path(config):
+    """
+    Return the Unix socket path of the daemon.
+
+    Args:
+        config (configparser.ConfigParser): Parsed settings.ini.
+
+    Returns:
+        str: Socket path.
+    """
+    return config["DEFAULT"].get("daemon_socket", DEFAULT_SOCKET) or DEFAULT_SOCKET
+
+
+def handle_daemon_request(self, request):
+    """
+    Run a CLI request on the warm session of the addressed TV.
+
+    Args:
+        request (dict): "command", optional "path", "body" and "tv" (name of a [TV:<name>] section).
+
+    Returns:
+        dict: The response text, or an error.
+    """
+    tvs = {tv.name: tv for tv in self.fleet.values()}
+    tvs.setdefault("", self)
+    name = request.get("tv") or ""
+    if name not in tvs:
+        return {"error": "Unknown TV '%s'" % name}
+    tv = tvs[name]
+    command = request.get("command") or ""
+    body = request.get("body")
+    path = request.get("path")
+    if command == "get":
+        response = tv.get(path, tv.verbose)
+    elif command == "post":
+        response = tv.post(path, body, tv.verbose)
+    elif command == "batch":
+        response = json.dumps(tv.run_batch(body, None, tv.verbose))
+    elif command == "keys":
+        response = json.dumps(tv.run_keys(body, tv.verbose))
+    elif command == "macro":
+        response = json.dumps(tv.run_macro(body, tv.verbose))
+    elif len(command) > 0:
+        response = tv.run_command(command, body, verbose=tv.verbose)
+    else:
+        return {"error": "Please provide a valid command with a '--command' argument"}
+    return {"response": response}
+
+
+def start_daemon(self):
+    """
+    Serve CLI requests on a Unix domain socket, keeping the TLS connections and digest nonces warm.
+
+    Requests and responses are single lines of JSON.
+    """
+    import socketserver
+
+    path = daemon_socket_path(self.config)
+    if os.path.exists(path):
+        if forward_to_daemon(path, None) is not None:
+            return logging.error("A Pylips daemon is already listening on %s", path)
+        os.unlink(path)
+
+    pylips = self
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                try:
+                    request = json.loads(line.decode("utf-8"))
+                except (UnicodeDecodeError, json.JSONDecodeError):
+                    response = {"error": "Invalid request"}
+                else:
+                    if not isinstance(request, dict):
+                        response = {"error": "Invalid request"}
+                    elif len(request) == 0:
+                        response = {"response": "pong"}
+                    else:
+                        try:
+                            response = handle_daemon_request(pylips, request)
+                        except Exception as e:
+                            logging.error("Daemon request failed: %s", e)
+                            response = {"error": str(e)}
+                self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+    server = socketserver.ThreadingUnixStreamServer(path, Handler)
+    server.daemon_threads = True
+    os.chmod(path, 0o600)
+    print("Pylips daemon listening on %s" % path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(path)
+
+
+def forward_to_daemon(path, request, timeout=None):
+    """
+    Send a request to a running daemon.
+
+    Args:
+        path (str): Socket path.
+        request (dict): Request, None to only check that the daemon answers.
+        timeout (float, optional): Seconds to wait for the answer, defaults to DAEMON_TIMEOUT.
+
+    Returns:
+        dict: Daemon response, None if no daemon can be reached (missing socket, refused, or owned by another
+        user). Once the request is sent, failures are returned as an error response, so the caller never runs a
+        command twice.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(CONNECT_TIMEOUT)
+    try:
+        client.connect(path)
+    except OSError:
+        client.close()
+        return None
+    client.settimeout(DAEMON_TIMEOUT if timeout is None else timeout)
+    try:
+        client.sendall(json.dumps(request or {}).encode("utf-8") + b"\n")
+        response = b""
+        while not response.endswith(b"\n"):
+            chunk = client.recv(65536)
+            if len(chunk) == 0:
+                break
+            response += chunk
+    except OSError as e:
+        return {"error": "Pylips daemon did not answer: %s" % e}
+    finally:
+        client.close()
+    if len(response) == 0:
+        return {"error": "Pylips daemon closed the connection"}
+    return json.loads(response.decode("utf-8"))
@@ -0,0 +1,292 @@
+# tools_discovery.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import ipaddress
+import json
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pylips_tools.tools_logging import get_logger
+from pylips_tools.tools_state import open_state
+
+log = get_logger("http")
+
+# Ports of the JointSpace API: Android TVs answer on 1926 with digest auth, other TVs on 1925
+DISCOVERY_PORTS = ((1926, "https://"), (1925, "http://"))
+# API versions tried in order until 'system' answers
+API_VERSIONS = ("6", "5", "1")
+
+# Status probes of the updater and the feature of the capability profile they need
+PROBE_FEATURES = {
+    "ambilight": "ambilight", "ambi_brightness": "ambilight", "ambihue": "huelamp", "dls_state": "light_sensor"
+}
+# Path and body the dls_state probe reads, as display_light_sensor_state in available_commands.json
+LIGHT_SENSOR_PROBE = ("menuitems/settings/current", {"nodes": [{"nodeid": 2130968625}]})
+
+
+def local_network():
+    """
+    Guess the /24 network of the interface with the default route, without sending anything.
+
+    Returns:
+        ipaddress.IPv4Network: Network to scan.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        try:
+            probe.connect(("10.255.255.255", 1))
+            address = probe.getsockname()[0]
+        except OSError:
+            address = "127.0.0.1"
+    return ipaddress.ip_network(address + "/24", strict=False)
+
+
+def port_open(host, port, timeout):
+    """
+    Check whether a TCP port accepts connections.
+
+    Args:
+        host (str): Address.
+        port (int): Port.
+        timeout (float): Connect timeout.
+
+    Returns:
+        bool: True if the connection was accepted.
+    """
+    try:
+        with socket.create_connection((host, port), timeout):
+            return True
+    except OSError:
+        return False
+
+
+def get_json(session, url, auth=None, timeout=2):
+    """
+    GET a JSON object, returning None for errors, non-200 answers and other content.
+    """
+    try:
+        r = session.get(url, auth=auth, verify=False, timeout=timeout)
+        data = json.loads(r.text) if r.status_code == 200 else None
+    except Exception:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def post_json(session, url, body, auth=None, timeout=2):
+    """
+    POST a JSON body, returning the status code and the JSON object answered, None for errors and other content.
+    """
+    try:
+        r = session.post(url, json=body, auth=auth, verify=False, timeout=timeout)
+        data = json.loads(r.text) if r.status_code == 200 else None
+    except Exception:
+        return None, None
+    return r.status_code, data if isinstance(data, dict) else None
+
+
+def light_sensor(session, base_url, auth=None, timeout=2):
+    """
+    Read the display light sensor setting the dls_state probe polls.
+
+    Returns:
+        bool: False if the TV has no settings API or reports the setting as not available, True otherwise.
+    """
+    status, settings = post_json(session, base_url + LIGHT_SENSOR_PROBE[0], LIGHT_SENSOR_PROBE[1], auth, timeout)
+    if status == 404:
+        return False
+    values = (settings or {}).get("values") or [{}]
+    return bool(values[0].get("value", {}).get("Available", True))
+
+
+def capability_profile(session, host, port, protocol, auth=None, timeout=2):
+    """
+    Detect the API version, platform and features of the TV answering on a port.
+
+    The API version comes from 'system', which TVs answer without auth. Ambilight and Hue support are read
+    from ambilight/topology and HueLamp/power, the display light sensor from its setting; where those need
+    credentials that were not given, the feature list in 'system' is used instead, and features that can not be told
+    are assumed to be supported.
+
+    Args:
+        session (requests.Session): Session to use.
+        host (str): Address of the TV.
+        port (int): API port.
+        protocol (str): "https://" or "http://".
+        auth (requests.auth.AuthBase, optional): Digest auth of a paired TV.
+        timeout (float): Request timeout.
+
+    Returns:
+        dict: Profile with host, port, protocol, apiv, android, name, api_version, features (ambilight, huelamp,
+        light_sensor, lounge, notifychange), topology and the detection time, None if no JointSpace API answered.
+    """
+    base_url = protocol + host + ":" + str(port) + "/"
+    for apiv in API_VERSIONS:
+        system = get_json(session, base_url + apiv + "/system", auth, timeout)
+        if system is not None and ("api_version" in system or "name" in system):
+            break
+    else:
+        return None
+    version = system.get("api_version", {})
+    if "Major" in version:
+        apiv = str(version["Major"])
+    base_url += apiv + "/"
+    listed = system.get("featuring", {}).get("jsonfeatures", {}).get("ambilight")
+    topology = get_json(session, base_url + "ambilight/topology", auth, timeout)
+    huelamp = get_json(session, base_url + "HueLamp/power", auth, timeout)
+    if topology is not None and "layers" not in topology:
+        topology = None
+    features = {
+        "ambilight": topology is not None or listed is None or "Ambilight" in listed,
+        "huelamp": huelamp is not None or listed is None or "Hue" in listed,
+        "light_sensor": light_sensor(session, base_url, auth, timeout),
+        "lounge": listed is None or "LoungeLight" in listed,
+        "notifychange": "notifyChange" in system
+    }
+    system_features = system.get("featuring", {}).get("systemfeatures", {})
+    return {
+        "host": host, "port": str(port), "protocol": protocol, "apiv": apiv,
+        "android": port == 1926 or system_features.get("pairing_type") == "digest_auth_pairing",
+        "name": system.get("name"),
+        "api_version": ".".join(str(version[part]) for part in ("Major", "Minor", "Patch") if part in version),
+        "features": features, "topology": topology, "detected": int(time.time())
+    }
+
+
+def probe_host(self, host, ports=DISCOVERY_PORTS, timeout=0.5):
+    """
+    Look for a JointSpace API on a host and detect its capabilities.
+
+    The configured TV is queried with its credentials, so its Ambilight topology can be read on Android TVs too.
+
+    Args:
+        host (str): Address.
+        ports (tuple): (port, protocol) pairs to try in order.
+        timeout (float): Connect timeout; requests may take four times as long.
+
+    Returns:
+        dict: Capability profile, None if no TV answered.
+    """
+    import requests
+    from urllib3 import disable_warnings
+    from urllib3.exceptions import InsecureRequestWarning
+    from pylips_tools.tools_auth import PylipsDigestAuth
+
+    disable_warnings(InsecureRequestWarning)
+
+    auth = None
+    if self.config.has_section(self.tv_section) and str(self.tv["host"]) == host and len(self.tv["user"]) > 0:
+        auth = PylipsDigestAuth(str(self.tv["user"]), str(self.tv["pass"]))
+    for port, protocol in ports:
+        if not port_open(host, port, timeout):
+            continue
+        with requests.Session() as session:
+            profile = capability_profile(session, host, port, protocol, auth, timeout * 4)
+        if profile is not None:
+            return profile
+    return None
+
+
+def discover(self, network=None, ports=DISCOVERY_PORTS, workers=None, timeout=None):
+    """
+    Scan a network for TVs concurrently and save their capability profiles in 'state_file', warning if it is not set.
+
+    Args:
+        network (str, optional): Network ("192.168.1.0/24") or single address, defaults to the local /24.
+        ports (tuple): (port, protocol) pairs to try on every address.
+        workers (int, optional): Addresses probed at once, defaults to 'discovery_workers'.
+        timeout (float, optional): Connect timeout in seconds, defaults to 'discovery_timeout'.
+
+    Returns:
+        list: Profiles of the TVs found, ordered by address.
+
+    Raises:
+        ValueError: If the network can not be parsed.
+    """
+    config = self.config["DEFAULT"]
+    if workers is None:
+        workers = int(config.get("discovery_workers", "64"))
+    if timeout is None:
+        timeout = float(config.get("discovery_timeout", "0.5"))
+    network = local_network() if network is None else ipaddress.ip_network(network, strict=False)
+    hosts = [str(host) for host in network.hosts()] if network.num_addresses > 1 else [str(network.network_address)]
+    start = time.perf_counter()
+    log.info("Scanning %d addresses of %s", len(hosts), network)
+    workers = max(1, min(workers, len(hosts)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pylips-discovery") as executor:
+        profiles = [
+            profile for profile in executor.map(lambda host: probe_host(self, host, ports, timeout), hosts)
+            if profile is not None
+        ]
+    if len(config.get("state_file", "")) == 0:
+        log.warning("state_file is not set in settings.ini, the profiles of the TVs found are not saved")
+    state = open_state(self.config)
+    for profile in profiles:
+        state.set(profile["host"], "profile", profile)
+        log.info(
+            "Found %s at %s%s:%s (API %s, %s)", profile["name"], profile["protocol"], profile["host"], profile["port"],
+            profile["api_version"] or profile["apiv"], "Android" if profile["android"] else "non-Android"
+        )
+    log.info("Found %d TVs in %.1f s", len(profiles), time.perf_counter() - start)
+    return profiles
+
+
+def discovery_sections(profiles):
+    """
+    Format discovered TVs as settings.ini sections.
+
+    Args:
+        profiles (list): Capability profiles.
+
+    Returns:
+        str: A [TV] section for a single TV, [TV:<name>] sections for several.
+    """
+    sections = []
+    for index, profile in enumerate(profiles):
+        name = "TV" if len(profiles) == 1 else "TV:tv%d" % (index + 1)
+        lines = ["[%s]" % name, "# %s" % profile["name"]] + [
+            "%s = %s" % (key, profile[key]) for key in ("host", "port", "apiv", "protocol")
+        ]
+        if profile["android"]:
+            lines += ["user =", "pass ="]
+        sections.append("\n".join(lines))
+    return "\n\n".join(sections)
+
+
+def load_profile(self):
+    """
+    Load the saved capability profile of the TV and fill in 'port', 'protocol' and 'apiv' left empty in its
+    settings.ini section.
+
+    Returns:
+        dict: Profile, None if the TV was not discovered yet.
+    """
+    if not self.config.has_section(self.tv_section) or len(str(self.tv.get("host", ""))) == 0:
+        return None
+    profile = open_state(self.config).get(str(self.tv["host"]), "profile")
+    if not isinstance(profile, dict):
+        return None
+    for key in ("port", "protocol", "apiv"):
+        if len(str(self.tv.get(key, ""))) == 0:
+            self.tv[key] = str(profile[key])
+        elif key == "apiv" and str(self.tv[key]) != str(profile[key]):
+            log.warning(
+                "%s reports API version %s but apiv is %s in settings.ini", self.tv["host"], profile[key], self.tv[key]
+            )
+    return profile
+
+
+def supports(self, probe):
+    """
+    Check the capability profile before a status probe.
+
+    Args:
+        probe (str): Probe name (ambilight, ambi_brightness, ambihue, ...).
+
+    Returns:
+        bool: False if the profile says the TV lacks the feature the probe reads, True otherwise.
+    """
+    if self.profile is None or probe not in PROBE_FEATURES:
+        return True
+    return bool(self.profile.get("features", {}).get(PROBE_FEATURES[probe], True))
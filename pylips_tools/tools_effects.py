@@ -0,0 +1,450 @@
+# tools_effects.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import collections
+import json
+import threading
+import time
+
+from pylips_tools.tools_ambilight import AmbilightStreamer, AmbilightTopology, require_numpy
+from pylips_tools.tools_logging import get_logger
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+log = get_logger("ambilight")
+
+# Rendered effects by settings.ini 'ambilight_effect_cache' size, shared by the TVs of a fleet
+effect_caches = {}
+effect_caches_lock = threading.Lock()
+
+
+def parse_color(value):
+    """
+    Convert a colour parameter into RGB values.
+
+    Args:
+        value (list or str): [r, g, b] with values from 0 to 255, or a hex string like "#ff8000".
+
+    Returns:
+        numpy.ndarray: Float RGB values.
+
+    Raises:
+        ValueError: If the colour can not be read.
+    """
+    if isinstance(value, str):
+        digits = value.lstrip("#")
+        if len(digits) != 6:
+            raise ValueError("Invalid colour: %s" % value)
+        value = [int(digits[index:index + 2], 16) for index in (0, 2, 4)]
+    if not isinstance(value, (list, tuple)) or len(value) != 3:
+        raise ValueError("Invalid colour: %s" % (value,))
+    return np.clip(np.array(value, dtype=np.float64), 0, 255)
+
+
+def hsv_to_rgb(hue, saturation, value):
+    """
+    Convert HSV arrays into RGB, element-wise.
+
+    Args:
+        hue (numpy.ndarray): Hue from 0 to 1.
+        saturation (float or numpy.ndarray): Saturation from 0 to 1.
+        value (float or numpy.ndarray): Brightness from 0 to 1.
+
+    Returns:
+        numpy.ndarray: RGB values from 0 to 255 with an extra last axis of 3.
+    """
+    # Each channel is a triangle wave over the hue circle, offset by a third of the circle
+    channels = np.stack([hue + 1 / 3.0, hue, hue - 1 / 3.0], axis=-1) % 1.0
+    rgb = np.clip(np.abs(channels * 6 - 3) - 1, 0, 1)
+    saturation = np.asarray(saturation)[..., None]
+    value = np.asarray(value)[..., None]
+    return (1 - saturation + saturation * rgb) * value * 255
+
+
+def render_fade(positions, times, colors, period):
+    """
+    Crossfade all pixels through a list of colours, one colour per 'period' / number of colours.
+    """
+    colors = np.array([parse_color(color) for color in colors])
+    phase = (times / period * len(colors)) % len(colors)
+    index = phase.astype(int)
+    weight = (1 - np.cos((phase - index) * np.pi)) / 2
+    frame = colors[index] * (1 - weight)[:, None] + colors[(index + 1) % len(colors)] * weight[:, None]
+    return np.broadcast_to(frame[:, None, :], (len(times), len(positions), 3))
+
+
+def render_gradient(positions, times, colors, period):
+    """
+    Spread a list of colours around the TV, turning once per 'period' (a still gradient with a period of 0).
+    """
+    colors = np.array([parse_color(color) for color in colors])
+    turn = times / period if period > 0 else np.zeros(len(times))
+    place = ((positions[None, :] - turn[:, None]) % 1.0) * len(colors)
+    index = place.astype(int) % len(colors)
+    weight = np.clip(place - index, 0, 1)[..., None]
+    return colors[index] * (1 - weight) + colors[(index + 1) % len(colors)] * weight
+
+
+def render_rainbow(positions, times, period, spread, saturation, brightness):
+    """
+    Run the colour wheel around the TV 'spread' times, shifting it once per 'period'.
+    """
+    hue = (positions[None, :] * spread + times[:, None] / period) % 1.0
+    return hsv_to_rgb(hue, saturation, brightness)
+
+
+def render_breathe(positions, times, color, period, low):
+    """
+    Pulse a colour between 'low' and full brightness once per 'period'.
+    """
+    level = low + (1 - low) * (1 - np.cos(2 * np.pi * times / period)) / 2
+    frame = level[:, None] * parse_color(color)[None, :]
+    return np.broadcast_to(frame[:, None, :], (len(times), len(positions), 3))
+
+
+def render_chase(positions, times, color, background, width, period):
+    """
+    Run a light with a fading tail of 'width' (share of the frame) clockwise around the TV once per 'period'.
+    """
+    distance = (times[:, None] / period - positions[None, :]) % 1.0
+    level = np.clip(1 - distance / width, 0, 1)[..., None]
+    return parse_color(background) * (1 - level) + parse_color(color) * level
+
+
+# Effect renderers and their default parameters. Every effect loops after 'period' seconds.
+EFFECTS = {
+    "fade": (render_fade, {"colors": [[255, 0, 0], [0, 255, 0], [0, 0, 255]], "period": 6}),
+    "gradient": (render_gradient, {"colors": [[255, 80, 0], [0, 80, 255]], "period": 0}),
+    "rainbow": (render_rainbow, {"period": 10, "spread": 1, "saturation": 1, "brightness": 1}),
+    "breathe": (render_breathe, {"color": [255, 255, 255], "period": 4, "low": 0.1}),
+    "chase": (render_chase, {"color": [255, 255, 255], "background": [0, 0, 0], "width": 0.2, "period": 3}),
+}
+
+
+def effect_params(effect, params=None):
+    """
+    Merge effect parameters with the effect's defaults.
+
+    Args:
+        effect (str): Effect name, one of EFFECTS.
+        params (dict, optional): Parameters overriding the defaults.
+
+    Returns:
+        dict: Complete parameters.
+
+    Raises:
+        ValueError: If the effect or a parameter is unknown.
+    """
+    if effect not in EFFECTS:
+        raise ValueError("Unknown effect '%s', use one of %s" % (effect, ", ".join(EFFECTS)))
+    defaults = EFFECTS[effect][1]
+    params = params or {}
+    unknown = [name for name in params if name not in defaults]
+    if len(unknown) > 0:
+        raise ValueError("Unknown parameters of %s: %s" % (effect, ", ".join(unknown)))
+    params = dict(defaults, **params)
+    if float(params["period"]) < 0 or (float(params["period"]) == 0 and effect != "gradient"):
+        raise ValueError("The period of %s has to be positive" % effect)
+    if "colors" in params and (not isinstance(params["colors"], (list, tuple)) or len(params["colors"]) == 0):
+        raise ValueError("%s needs a list of colors" % effect)
+    return params
+
+
+def render_effect(topology, effect, params=None, fps=20):
+    """
+    Render one loop of an effect for all layers and pixels at once.
+
+    Pixels are placed clockwise around the TV from the bottom of the left side, so positions follow the
+    topology's pixel order.
+
+    Args:
+        topology (AmbilightTopology): Topology of the TV.
+        effect (str): Effect name, one of EFFECTS.
+        params (dict, optional): Parameters overriding the effect's defaults.
+        fps (float): Frames per second.
+
+    Returns:
+        numpy.ndarray: Read-only uint8 frames of shape (frames, layers, pixels, 3).
+
+    Raises:
+        ValueError: If the effect or its parameters are invalid.
+    """
+    require_numpy()
+    params = effect_params(effect, params)
+    period = float(params["period"])
+    count = max(1, int(round(period * fps)))
+    times = np.arange(count, dtype=np.float64) / fps
+    positions = (np.arange(topology.pixels, dtype=np.float64) + 0.5) / max(1, topology.pixels)
+    try:
+        frames = EFFECTS[effect][0](positions, times, **params)
+    except (TypeError, IndexError, ZeroDivisionError) as e:
+        raise ValueError("Invalid parameters of %s: %s" % (effect, e))
+    frames = np.rint(np.clip(frames, 0, 255)).astype(np.uint8)
+    frames = np.ascontiguousarray(np.broadcast_to(frames[:, None], (count,) + topology.shape))
+    frames.flags.writeable = False
+    return frames
+
+
+class EffectCache:
+    """
+    LRU cache of rendered effect loops keyed by effect, parameters, frame rate and topology.
+
+    A loop is rendered once and replayed from memory, so switching back to an effect costs no computation.
+    """
+
+    def __init__(self, size=16):
+        """
+        Initialize the cache.
+
+        Args:
+            size (int): Maximum number of cached loops.
+
+        Returns:
+            None
+        """
+        self.size = size
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def frames(self, topology, effect, params=None, fps=20):
+        """
+        Return the frames of an effect loop, rendering them on a miss.
+
+        Args:
+            topology (AmbilightTopology): Topology of the TV.
+            effect (str): Effect name.
+            params (dict, optional): Parameters overriding the effect's defaults.
+            fps (float): Frames per second.
+
+        Returns:
+            numpy.ndarray: Read-only frames, see render_effect.
+        """
+        key = (effect, json.dumps(effect_params(effect, params), sort_keys=True), float(fps), topology.shape)
+        with self.lock:
+            frames = self.entries.get(key)
+            if frames is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return frames
+            self.misses += 1
+        frames = render_effect(topology, effect, params, fps)
+        with self.lock:
+            self.entries[key] = frames
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return frames
+
+    def stats(self):
+        """
+        Return cache counters.
+
+        Returns:
+            dict: Cached loops, their size in bytes, hits, misses and evictions.
+        """
+        with self.lock:
+            return {
+                "entries": len(self.entries), "bytes": sum(frames.nbytes for frames in self.entries.values()),
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions
+            }
+
+
+def effect_cache(config):
+    """
+    Return the effect cache of the process, sized by 'ambilight_effect_cache'.
+
+    Args:
+        config (configparser.ConfigParser): Parsed settings.ini.
+
+    Returns:
+        EffectCache: Shared cache.
+    """
+    size = int(config["DEFAULT"].get("ambilight_effect_cache", "16"))
+    with effect_caches_lock:
+        if size not in effect_caches:
+            effect_caches[size] = EffectCache(size)
+        return effect_caches[size]
+
+
+class EffectPlayer:
+    """
+    Play effect loops on a TV's Ambilight through ambilight/cached at a fixed frame rate.
+
+    Frames are handed to an AmbilightStreamer on the player's clock, so a slow TV drops frames instead of
+    slowing the animation down, and only pixels that changed are sent.
+    """
+
+    def __init__(self, pylips, topology=None, fps=None):
+        """
+        Initialize the player.
+
+        Args:
+            pylips (Pylips): Configured Pylips instance.
+            topology (AmbilightTopology, optional): Topology, fetched from the TV if not given.
+            fps (float, optional): Frames per second, defaults to 'ambilight_effect_fps'.
+
+        Returns:
+            None
+        """
+        require_numpy()
+        self.pylips = pylips
+        self.topology = topology if topology is not None else AmbilightTopology.from_tv(pylips)
+        if fps is None:
+            fps = float(pylips.config["DEFAULT"].get("ambilight_effect_fps", "20"))
+        self.fps = fps
+        self.cache = effect_cache(pylips.config)
+        self.streamer = None
+        self.effect = None
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.frames_played = 0
+        self.frames_skipped = 0
+
+    def play(self, effect, params=None, duration=None):
+        """
+        Start playing an effect, replacing the one playing.
+
+        Args:
+            effect (str): Effect name, one of EFFECTS.
+            params (dict, optional): Parameters overriding the effect's defaults.
+            duration (float, optional): Seconds to play, loops until stop() if not given.
+
+        Returns:
+            EffectPlayer: The player.
+
+        Raises:
+            ValueError: If the effect or its parameters are invalid.
+        """
+        frames = self.cache.frames(self.topology, effect, params, self.fps)
+        self.stop_playing()
+        if self.streamer is None:
+            self.streamer = AmbilightStreamer(self.pylips, self.topology).start()
+        self.effect = effect
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, args=(frames, duration, self.stop_event), name="pylips-ambilight-effect", daemon=True
+        )
+        self.thread.start()
+        log.info("Playing %s effect, %d frames at %g fps", effect, len(frames), self.fps)
+        return self
+
+    def run(self, frames, duration, stop_event):
+        """
+        Hand frames to the streamer on schedule until stopped or 'duration' has passed.
+
+        Frames that are due while the player is late are skipped, so the animation keeps its speed.
+
+        Args:
+            frames (numpy.ndarray): Effect loop.
+            duration (float): Seconds to play, None to loop until stopped.
+            stop_event (threading.Event): Set to stop.
+
+        Returns:
+            None
+        """
+        start = time.monotonic()
+        index = 0
+        while not stop_event.is_set():
+            due = start + index / self.fps
+            if duration is not None and due - start >= duration:
+                break
+            now = time.monotonic()
+            if now < due:
+                if stop_event.wait(due - now):
+                    break
+            elif now - due >= 1 / self.fps:
+                late = int((now - start) * self.fps)
+                self.frames_skipped += late - index
+                index = late
+                continue
+            self.streamer.push(frames[index % len(frames)])
+            self.frames_played += 1
+            index += 1
+            if len(frames) == 1 and duration is None:
+                stop_event.wait()
+
+    def stop_playing(self):
+        """
+        Stop the effect that is playing, leaving the last frame on the TV.
+
+        Returns:
+            None
+        """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.effect = None
+
+    def stop(self):
+        """
+        Stop playing and stop the streamer.
+
+        Returns:
+            None
+        """
+        self.stop_playing()
+        if self.streamer is not None:
+            self.streamer.stop()
+            self.streamer = None
+
+    def stats(self):
+        """
+        Return playback counters.
+
+        Returns:
+            dict: Effect playing, frames played and skipped, streamer and cache counters.
+        """
+        return {
+            "effect": self.effect, "fps": self.fps, "played": self.frames_played, "skipped": self.frames_skipped,
+            "streamer": None if self.streamer is None else self.streamer.stats(), "cache": self.cache.stats()
+        }
+
+
+def interrupts_effect(commands, message):
+    """
+    Check whether a command message changes the Ambilight, so a playing effect has to stop first.
+
+    Args:
+        commands (CommandRegistry): Compiled available_commands.json.
+        message (dict): Decoded MQTT message.
+
+    Returns:
+        bool: True for POST requests to ambilight/ paths.
+    """
+    if message.get("command") == "post":
+        path = message.get("path", "")
+    else:
+        entry = commands.get(message.get("command"))
+        path = entry.path if entry is not None and entry.method == "post" else ""
+    return str(path).lower().startswith("ambilight/")
+
+
+def play_effect_message(self, message):
+    """
+    Start or stop an effect from an {"ambilight_effect": ...} MQTT message.
+
+    Args:
+        message (dict or str): Effect name and its parameters plus an optional "duration"
+            ({"name": "rainbow", "period": 8}), an effect name, or "stop".
+
+    Returns:
+        None
+    """
+    if isinstance(message, str):
+        message = {"name": message}
+    if not isinstance(message, dict) or message.get("name", "stop") == "stop":
+        return self.stop_ambilight_effect()
+    params = {name: value for name, value in message.items() if name not in ("name", "duration")}
+    try:
+        self.play_ambilight_effect(message["name"], params, message.get("duration"))
+    except (ValueError, ImportError) as e:
+        log.error("Can not play effect: %s", e)
@@ -0,0 +1,121 @@
+# tools_fleet.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+FLEET_PREFIX = "TV:"
+TV_KEYS = ("host", "port", "apiv", "user", "pass", "protocol")
+
+
+def fleet_sections(config):
+    """
+    List the [TV:<name>] sections of a config.
+
+    Args:
+        config (configparser.ConfigParser): Parsed settings.ini.
+
+    Returns:
+        list: Section names.
+    """
+    return [section for section in config.sections() if section.startswith(FLEET_PREFIX)]
+
+
+def fill_tv_section(config, section):
+    """
+    Take keys missing in a [TV:<name>] section from the [TV] section, so [TV] can be used as a template.
+
+    Args:
+        config (configparser.ConfigParser): Parsed settings.ini.
+        section (str): Section name.
+    """
+    for key in TV_KEYS:
+        if not config.has_option(section, key) and config.has_option("TV", key):
+            config[section][key] = config["TV"][key]
+
+
+def create_fleet(self):
+    """
+    Create one Pylips instance per [TV:<name>] section.
+
+    Returns:
+        dict: Fleet instances keyed by their MQTT command topic.
+    """
+    fleet = {}
+    for section in fleet_sections(self.config):
+        fill_tv_section(self.config, section)
+        if len(self.config[section].get("host", "")) == 0:
+            logging.error("Please set host in [%s] section in settings.ini", section)
+            continue
+        tv = self.__class__(None, section, self)
+        fleet[tv.topic_pylips] = tv
+        logging.info("Added TV %s (%s) to fleet", tv.name, tv.tv["host"])
+    return fleet
+
+
+def fleet_members(self):
+    """
+    List every TV driven by this process.
+
+    Returns:
+        list: Pylips instances.
+    """
+    members = list(self.fleet.values())
+    if self.config.has_section(self.tv_section) and len(self.tv["host"]) > 0:
+        members.insert(0, self)
+    return members
+
+
+def start_fleet_updater(self):
+    """
+    Run MQTT status updates for the whole fleet with bounded parallelism.
+
+    The number of TVs polled at the same time is limited by 'fleet_workers' in settings.ini.
+    """
+    members = fleet_members(self)
+    if self.config["DEFAULT"].get("mqtt_update_mode", "poll") in ("notify", "adaptive"):
+        return start_fleet_threads(members)
+    workers = max(1, min(len(members), int(self.config["DEFAULT"].get("fleet_workers", "8"))))
+    print("Started MQTT status updater for %d TVs" % len(members))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pylips-fleet") as executor:
+        while True:
+            for tv, future in [(tv, executor.submit(tv.mqtt_update_cycle)) for tv in members]:
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.error("Status update for %s failed: %s", tv.name or tv.tv_section, e)
+            time.sleep(int(self.config["DEFAULT"]["update_interval"]))
+
+
+def start_fleet_threads(members):
+    """
+    Run the status updater of every TV in its own thread.
+
+    Used for notifychange long-polls, which block until the TV reports a change, and for adaptive schedulers,
+    which sleep until their next probe is due, so neither can share a pool.
+
+    Args:
+        members (list): Pylips instances.
+    """
+    threads = [
+        threading.Thread(target=tv.start_mqtt_updater, name="pylips-update-" + (tv.name or "TV"), daemon=True)
+        for tv in members
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def fleet_request_rate(self):
+    """
+    Return the status polling load of the whole fleet in adaptive mode.
+
+    Returns:
+        float: Requests per second over all TVs.
+    """
+    return sum(tv.scheduler.request_rate() for tv in fleet_members(self) if tv.scheduler is not None)
@@ -0,0 +1,153 @@
+# tools_logging.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+
+# Subsystem loggers, their levels are set in the [LOGGING] section of settings.ini
+SUBSYSTEMS = ("http", "mqtt", "ambilight", "scheduler", "queue")
+
+# Attributes every LogRecord has, anything else was passed with extra= and is written to the JSON sink
+RECORD_FIELDS = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "asctime"}
+
+body_limit = 0
+body_every = 1
+body_counter = itertools.count()
+listener = None
+
+
+def get_logger(subsystem):
+    """
+    Return the logger of a subsystem.
+
+    Args:
+        subsystem (str): One of SUBSYSTEMS.
+
+    Returns:
+        logging.Logger: Logger named 'pylips.<subsystem>'.
+    """
+    return logging.getLogger("pylips." + subsystem)
+
+
+class LogBody:
+    """
+    Response body that is only truncated and converted when a handler formats the record.
+    """
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+    def __str__(self):
+        if body_limit > 0 and len(self.text) > body_limit:
+            return "%s... (%d chars)" % (self.text[:body_limit], len(self.text))
+        return self.text
+
+
+def log_body(logger, message, text, **fields):
+    """
+    Log a response body at INFO, truncated to 'log_body_limit' and sampled every 'log_body_every' responses.
+
+    Args:
+        logger (logging.Logger): Subsystem logger.
+        message (str): Format string with one %s for the body.
+        text (str): Response body.
+        **fields: Structured fields for the JSON sink, e.g. tv, method and path.
+
+    Returns:
+        None
+    """
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    if body_every > 1 and next(body_counter) % body_every != 0:
+        return
+    logger.info(message, LogBody(text), extra=fields)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that leaves formatting to the listener thread; log arguments must not be changed after logging.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as JSON lines with the fields passed through extra=.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": round(record.created, 3), "level": record.levelname, "logger": record.name,
+            "message": record.getMessage()
+        }
+        for field, value in record.__dict__.items():
+            if field not in RECORD_FIELDS:
+                entry[field] = value if isinstance(value, (str, int, float, bool)) or value is None else str(value)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+def configure_logging(config):
+    """
+    Apply the [LOGGING] section and the body settings of settings.ini.
+
+    With 'json_file' set, records are also written to that file as JSON lines, and all handlers run on a
+    background thread behind a queue, so request threads never wait for log I/O.
+
+    Args:
+        config (configparser.ConfigParser): Parsed settings.ini.
+
+    Returns:
+        None
+    """
+    global body_limit, body_every, listener
+    body_limit = int(config["DEFAULT"].get("log_body_limit", "0"))
+    body_every = max(1, int(config["DEFAULT"].get("log_body_every", "1")))
+    if not config.has_section("LOGGING"):
+        return
+    section = config["LOGGING"]
+    root = logging.getLogger()
+    if len(section.get("level", "")) > 0:
+        root.setLevel(section["level"].upper())
+    for subsystem in SUBSYSTEMS:
+        if len(section.get(subsystem, "")) > 0:
+            get_logger(subsystem).setLevel(section[subsystem].upper())
+    json_file = section.get("json_file", "")
+    if len(json_file) == 0 or listener is not None:
+        return
+    handlers = list(root.handlers)
+    if section.get("console", "True").lower() != "true":
+        handlers = []
+    file_handler = logging.FileHandler(json_file)
+    file_handler.setFormatter(JsonFormatter())
+    handlers.append(file_handler)
+    log_queue = queue.SimpleQueue()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(DeferredQueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """
+    Write the queued records and stop the background thread of the JSON sink.
+
+    Returns:
+        None
+    """
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
@@ -0,0 +1,310 @@
+# tools_macro.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import collections
+import functools
+import json
+import threading
+import time
+
+from pylips_tools.tools_breaker import UNREACHABLE
+from pylips_tools.tools_logging import get_logger
+from pylips_tools.tools_state import open_state
+
+log = get_logger("http")
+
+Key = collections.namedtuple("Key", ["name", "path", "body"])
+
+# Weight of the latest key press in the latency average, and the largest factor failed presses stretch gaps by
+LATENCY_WEIGHT = 0.2
+PENALTY_MAX = 8.0
+
+
+@functools.lru_cache(maxsize=256)
+def compile_keys(commands, keys):
+    """
+    Resolve a key sequence against the command registry once.
+
+    Args:
+        commands (CommandRegistry): Compiled available_commands.json.
+        keys (tuple): Command names (e.g. "digit_1", "confirm") and pauses in seconds.
+
+    Returns:
+        tuple: Key rows with the path and the pre-serialized body of every key, and pauses as floats.
+
+    Raises:
+        ValueError: If an entry is not a POST command without parameters or a pause.
+    """
+    steps = []
+    errors = []
+    for index, key in enumerate(keys):
+        if isinstance(key, (int, float)) and not isinstance(key, bool):
+            steps.append(max(0.0, float(key)))
+            continue
+        entry = commands.get(key) if isinstance(key, str) else None
+        if entry is None or entry.method != "post" or len(entry.slots) > 0:
+            errors.append("#%d: '%s' is not a key command" % (index, key))
+            continue
+        steps.append(Key(entry.name, entry.path, entry.body if entry.body is not None else b"{}"))
+    if len(errors) > 0:
+        raise ValueError("Invalid key sequence: " + ", ".join(errors))
+    return tuple(steps)
+
+
+def parse_keys(keys):
+    """
+    Normalize a key sequence from MQTT, the command line or the [MACROS] section.
+
+    Args:
+        keys (list or str): Command names and pauses, a JSON list of them, or a comma separated string of them
+            (e.g. "digit_1, digit_2, 0.5, confirm").
+
+    Returns:
+        tuple: Command names and pauses.
+
+    Raises:
+        ValueError: If the sequence is neither a list nor a string, or not valid JSON.
+    """
+    if isinstance(keys, str) and keys.lstrip().startswith("["):
+        keys = json.loads(keys)
+    elif isinstance(keys, str):
+        keys = [key.strip() for key in keys.split(",") if len(key.strip()) > 0]
+        keys = [float(key) if key.replace(".", "", 1).isdigit() else key for key in keys]
+    if not isinstance(keys, (list, tuple)):
+        raise ValueError("A key sequence has to be a list of commands")
+    if not all(isinstance(key, (str, int, float)) for key in keys):
+        raise ValueError("A key sequence can only hold command names and pauses")
+    return tuple(keys)
+
+
+class KeyPacer:
+    """
+    Per-TV gap between key presses, tuned from how long the TV takes to acknowledge them.
+
+    A TV that answers key presses slowly is still busy with the last one and drops keys that arrive right after
+    the answer, so the gap is 'key_gap_factor' times the average acknowledgement latency, kept between
+    'key_gap_min' and 'key_gap_max' seconds. Every failed press doubles the gap for the next ones, every
+    acknowledged press halves that penalty again. The gap also applies between two sequences sent back to back.
+    """
+
+    def __init__(self, gap_min=0.05, gap_max=1.0, factor=1.0):
+        """
+        Initialize the pacer.
+
+        Args:
+            gap_min (float): Shortest gap between two key presses in seconds.
+            gap_max (float): Longest gap between two key presses in seconds.
+            factor (float): Gap per second of acknowledgement latency.
+
+        Returns:
+            None
+        """
+        self.gap_min = gap_min
+        self.gap_max = gap_max
+        self.factor = factor
+        self.lock = threading.Lock()
+        self.latency = None
+        self.penalty = 1.0
+        self.next_key = 0.0
+        self.keys = 0
+        self.failures = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Create a pacer from settings.ini.
+
+        Args:
+            config (configparser.ConfigParser): Parsed settings.ini.
+
+        Returns:
+            KeyPacer: New pacer.
+        """
+        return cls(
+            float(config["DEFAULT"].get("key_gap_min", "0.05")),
+            float(config["DEFAULT"].get("key_gap_max", "1")),
+            float(config["DEFAULT"].get("key_gap_factor", "1"))
+        )
+
+    def acknowledged(self, latency):
+        """
+        Record the acknowledgement latency of a key press.
+
+        Args:
+            latency (float): Seconds from sending the key until the TV answered.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += LATENCY_WEIGHT * (latency - self.latency)
+            self.penalty = max(1.0, self.penalty / 2)
+            self.keys += 1
+            self.next_key = time.monotonic() + self.current_gap()
+
+    def failed(self):
+        """
+        Record a key press the TV did not acknowledge.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.penalty = min(PENALTY_MAX, self.penalty * 2)
+            self.failures += 1
+            self.next_key = time.monotonic() + self.current_gap()
+
+    def current_gap(self):
+        """
+        Gap for the current latency and penalty, called with the lock held.
+        """
+        latency = self.latency if self.latency is not None else 0.0
+        return min(self.gap_max, max(self.gap_min, self.factor * latency) * self.penalty)
+
+    def gap(self):
+        """
+        Return the current gap between key presses.
+
+        Returns:
+            float: Seconds to wait after an acknowledged key press.
+        """
+        with self.lock:
+            return self.current_gap()
+
+    def delay(self):
+        """
+        Return how long the next key press has to wait for the gap after the last acknowledged one.
+
+        Returns:
+            float: Seconds, 0 if the next key can be sent right away.
+        """
+        with self.lock:
+            return max(0.0, self.next_key - time.monotonic())
+
+    def stats(self):
+        """
+        Return pacing state and counters.
+
+        Returns:
+            dict: Average latency and current gap in seconds, acknowledged and failed key presses.
+        """
+        gap = self.gap()
+        with self.lock:
+            return {
+                "latency": None if self.latency is None else round(self.latency, 4), "gap": round(gap, 4),
+                "keys": self.keys, "failures": self.failures
+            }
+
+
+def run_keys(self, keys, verbose=False):
+    """
+    Send a key sequence over the TV's warm connection, pacing the keys with the TV's KeyPacer.
+
+    All keys are resolved before the first one is sent. The sequence stops at the first key the TV does not
+    acknowledge, since the following keys would act on the wrong screen.
+
+    Args:
+        keys (list or str): Command names and pauses in seconds, see parse_keys.
+        verbose (bool): Display feedback for every key.
+
+    Returns:
+        dict: Number of keys sent, elapsed time and last gap in seconds, and an error if the sequence failed.
+    """
+    try:
+        steps = compile_keys(self.commands, parse_keys(keys))
+    except ValueError as e:
+        log.error("%s", e)
+        return {"error": str(e)}
+    start = time.perf_counter()
+    result = {"keys": 0, "time": 0.0, "gap": None}
+    pause = 0.0
+    for step in steps:
+        if not isinstance(step, Key):
+            pause = step
+            continue
+        wait = max(pause, self.key_pacer.delay())
+        if wait > 0:
+            time.sleep(wait)
+        pause = 0.0
+        sent = time.perf_counter()
+        response = self.post(step.path, step.body, verbose)
+        if response == UNREACHABLE:
+            self.key_pacer.failed()
+            result["error"] = "%s was not acknowledged" % step.name
+            break
+        self.key_pacer.acknowledged(time.perf_counter() - sent)
+        result["keys"] += 1
+        result["gap"] = round(self.key_pacer.gap(), 4)
+    result["time"] = round(time.perf_counter() - start, 4)
+    if self.metrics is not None:
+        self.metrics.observe("pylips_macro_seconds", result["time"], tv=self.name)
+    if "error" in result:
+        log.error("Key sequence stopped after %d keys: %s", result["keys"], result["error"])
+    else:
+        log.info("Sent %d keys in %.2f s", result["keys"], result["time"])
+    return result
+
+
+def macros(self):
+    """
+    Return the named macros of a TV: the [MACROS] section of settings.ini and macros saved with save_macro.
+
+    Returns:
+        dict: Key sequences by macro name; saved macros win over settings.ini.
+    """
+    named = {}
+    if self.config.has_section("MACROS"):
+        defaults = self.config.defaults()
+        named.update(
+            (name, parse_keys(keys)) for name, keys in self.config["MACROS"].items() if name not in defaults
+        )
+    saved = open_state(self.config).get(str(self.tv["host"]), "macros", {})
+    named.update((name, tuple(keys)) for name, keys in saved.items())
+    return named
+
+
+def save_macro(self, name, keys):
+    """
+    Check a key sequence and save it as a named macro of the TV in 'state_file'.
+
+    Args:
+        name (str): Macro name.
+        keys (list or str): Command names and pauses, see parse_keys.
+
+    Returns:
+        dict: Name and number of steps of the macro, or an error.
+    """
+    try:
+        keys = parse_keys(keys)
+        compile_keys(self.commands, keys)
+    except ValueError as e:
+        log.error("%s", e)
+        return {"error": str(e)}
+    state = open_state(self.config)
+    saved = dict(state.get(str(self.tv["host"]), "macros", {}))
+    saved[name.lower()] = list(keys)
+    state.set(str(self.tv["host"]), "macros", saved)
+    return {"macro": name.lower(), "steps": len(keys)}
+
+
+def run_macro(self, name, verbose=False):
+    """
+    Run a named macro.
+
+    Args:
+        name (str): Macro name, case-insensitive like all settings.ini keys.
+        verbose (bool): Display feedback for every key.
+
+    Returns:
+        dict: Result of run_keys, or an error.
+    """
+    keys = macros(self).get(name.lower())
+    if keys is None:
+        log.error("Unknown macro: %s", name)
+        return {"error": "Unknown macro: %s" % name}
+    return run_keys(self, keys, verbose)
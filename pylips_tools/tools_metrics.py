@@ -0,0 +1,270 @@
+# tools_metrics.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import bisect
+import logging
+import threading
+
+# Upper bounds of the latency histogram buckets in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+METRICS = {
+    "pylips_request_seconds": ("histogram", "Latency of API requests that got a response"),
+    "pylips_request_retries_total": ("counter", "API request attempts that failed"),
+    "pylips_request_failures_total": ("counter", "API calls that failed after all retries or were failed fast"),
+    "pylips_command_seconds": ("histogram", "Duration of commands including retries"),
+    "pylips_power_on_seconds": ("histogram", "Time from power-on until the TV's API reports On"),
+    "pylips_macro_seconds": ("histogram", "Duration of key sequences and macros"),
+    "pylips_mqtt_messages_total": ("counter", "MQTT messages received and published"),
+    "pylips_update_cycle_seconds": ("histogram", "Duration of status update cycles and probes"),
+    "pylips_digest_requests": ("gauge", "Requests sent with digest auth"),
+    "pylips_digest_challenges": ("gauge", "401 digest challenge round trips"),
+    "pylips_breaker_open": ("gauge", "1 while the TV's circuit breaker is open"),
+    "pylips_queue_depth": ("gauge", "Commands waiting in the TV's command queue"),
+    "pylips_queue_coalesced": ("gauge", "Commands replaced by a newer command to the same target"),
+    "pylips_cache_hits": ("gauge", "GET responses served from the response cache"),
+    "pylips_cache_misses": ("gauge", "Cacheable GET requests sent to the TV"),
+}
+
+
+class Histogram:
+    """
+    Histogram over BUCKETS, the last count is for values above the largest bound.
+    """
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """
+    Counters and histograms of a Pylips process, shared by all TVs of a fleet.
+
+    Events are recorded with inc() and observe(); hooks added with add_hook() are called with every event, so
+    they can forward metrics to other systems. Gauges such as digest challenges or queue depth are read from
+    collectors only when the metrics are rendered. Pylips only creates a Metrics object when 'metrics_port' is
+    set or a hook is added, otherwise every instrumentation point is skipped with a single None check.
+    """
+
+    def __init__(self):
+        """
+        Initialize empty metrics.
+
+        Returns:
+            None
+        """
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.hooks = []
+        self.collectors = []
+
+    def inc(self, name, value=1, **labels):
+        """
+        Increase a counter.
+
+        Args:
+            name (str): Metric name.
+            value (float): Increment.
+            **labels: Label values.
+
+        Returns:
+            None
+        """
+        key = (name, tuple(labels.items()))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        if len(self.hooks) > 0:
+            self.call_hooks(name, labels, value)
+
+    def observe(self, name, value, **labels):
+        """
+        Record a value in a histogram.
+
+        Args:
+            name (str): Metric name.
+            value (float): Observed value, e.g. seconds.
+            **labels: Label values.
+
+        Returns:
+            None
+        """
+        key = (name, tuple(labels.items()))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+        if len(self.hooks) > 0:
+            self.call_hooks(name, labels, value)
+
+    def add_hook(self, hook):
+        """
+        Call a function with every recorded event.
+
+        Args:
+            hook (callable): Called as hook(name, labels, value).
+
+        Returns:
+            None
+        """
+        self.hooks.append(hook)
+
+    def add_collector(self, collector):
+        """
+        Add a function that reports gauges when the metrics are rendered.
+
+        Args:
+            collector (callable): Returns a list of (name, labels, value) tuples.
+
+        Returns:
+            None
+        """
+        self.collectors.append(collector)
+
+    def call_hooks(self, name, labels, value):
+        for hook in self.hooks:
+            try:
+                hook(name, labels, value)
+            except Exception as e:
+                logging.error("Metrics hook failed: %s", e)
+
+    def snapshot(self):
+        """
+        Return a copy of all metrics.
+
+        Returns:
+            dict: Counters, histograms (count, sum and bucket counts) and gauges keyed by (name, labels).
+        """
+        gauges = {}
+        for collector in self.collectors:
+            for name, labels, value in collector():
+                gauges[(name, tuple(labels.items()))] = value
+        with self.lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": {
+                    key: {"count": histogram.count, "sum": histogram.sum, "buckets": list(histogram.counts)}
+                    for key, histogram in self.histograms.items()
+                },
+                "gauges": gauges
+            }
+
+    def render(self):
+        """
+        Render all metrics in the Prometheus text format.
+
+        Returns:
+            str: Metrics page.
+        """
+        snapshot = self.snapshot()
+        series = {}
+        for kind in ("counters", "gauges"):
+            for (name, labels), value in snapshot[kind].items():
+                series.setdefault(name, []).append("%s%s %s" % (name, format_labels(labels), value))
+        for (name, labels), histogram in snapshot["histograms"].items():
+            lines = series.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), histogram["buckets"]):
+                cumulative += count
+                lines.append("%s_bucket%s %d" % (name, format_labels(labels + (("le", str(bound)),)), cumulative))
+            lines.append("%s_sum%s %s" % (name, format_labels(labels), histogram["sum"]))
+            lines.append("%s_count%s %d" % (name, format_labels(labels), histogram["count"]))
+        output = []
+        for name in sorted(series):
+            kind, description = METRICS.get(name, ("untyped", ""))
+            output.append("# HELP %s %s" % (name, description))
+            output.append("# TYPE %s %s" % (name, kind))
+            output.extend(series[name])
+        return "\n".join(output) + "\n"
+
+
+def format_labels(labels):
+    """
+    Format labels for the Prometheus text format.
+
+    Args:
+        labels (tuple): (name, value) pairs.
+
+    Returns:
+        str: Label set, empty without labels.
+    """
+    if len(labels) == 0:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"')) for name, value in labels
+    )
+
+
+def tv_gauges(tv):
+    """
+    Read the gauges of a TV from its auth handler, breaker, queue and cache.
+
+    Args:
+        tv (Pylips): Pylips instance.
+
+    Returns:
+        list: (name, labels, value) tuples.
+    """
+    labels = {"tv": tv.name}
+    auth = tv.auth_stats()
+    gauges = [
+        ("pylips_digest_requests", labels, auth["requests"]),
+        ("pylips_digest_challenges", labels, auth["challenges"]),
+        ("pylips_breaker_open", labels, 1 if tv.breaker_stats()["state"] == "open" else 0),
+    ]
+    queue = tv.queue_stats()
+    if queue is not None:
+        gauges.append(("pylips_queue_depth", labels, queue["depth"]))
+        gauges.append(("pylips_queue_coalesced", labels, queue["coalesced"]))
+    if tv.cache is not None:
+        cache = tv.cache_stats()
+        gauges.append(("pylips_cache_hits", labels, cache["hits"]))
+        gauges.append(("pylips_cache_misses", labels, cache["misses"]))
+    return gauges
+
+
+def start_metrics_server(metrics, port, host="127.0.0.1"):
+    """
+    Serve the metrics on http://<host>:<port>/metrics from a background thread.
+
+    Args:
+        metrics (Metrics): Metrics to serve.
+        port (int): TCP port.
+        host (str): Address to listen on.
+
+    Returns:
+        http.server.ThreadingHTTPServer: Running server.
+    """
+    import http.server
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="pylips-metrics", daemon=True).start()
+    logging.info("Serving metrics on http://%s:%d/metrics", host, port)
+    return server
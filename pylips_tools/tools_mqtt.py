@@ -6,6 +6,24 @@
 import json
 import time
 
+from pylips_tools.tools_discovery import supports
+from pylips_tools.tools_logging import get_logger
+from pylips_tools.tools_queue import TV_MESSAGE_KEYS
+
+log = get_logger("mqtt")
+
+OFF_STATUS = {"powerstate": "Off", "ambilight": False, "ambihue": False, "ambi_brightness": False, "dls_state": False}
+
+# Settings read by the status poll: status field and the key of the setting's data object it is published from
+SETTINGS_STATUS = {
+    "ambilight_brightness_state": ("ambi_brightness", "value"),
+    "display_light_sensor_state": ("dls_state", "selected_item"),
+}
+
+# Endpoints watched through notifychange and the status fields they are published as
+NOTIFY_FIELDS = ("powerstate", "activities/tv", "activities/current", "context", "network/devices")
+NOTIFY_STATUS_FIELDS = {"activities/tv": "channel", "activities/current": "app"}
+
 
 def mqtt_update_powerstate(self):
     """
@@ -18,28 +36,14 @@ def mqtt_update_powerstate(self):
     if powerstate_status is not None and powerstate_status[0] == '{':
         powerstate_status = json.loads(powerstate_status)
         if "powerstate" in powerstate_status:
-            if "powerstate" in self.last_status and self.last_status["powerstate"] != powerstate_status['powerstate']:
-                self.mqtt.publish(
-                    str(self.config["MQTT"]["topic_pylips"]),
-                    json.dumps({"status": {"powerstate": powerstate_status['powerstate']}}),
-                    retain=False
-                )
             if powerstate_status['powerstate'].lower() == "on":
+                self.mqtt_update_status({"powerstate": powerstate_status['powerstate']})
                 return True
+            self.mqtt_update_status(dict(OFF_STATUS, powerstate=powerstate_status['powerstate']))
         else:
-            self.mqtt_update_status(
-                {
-                    "powerstate": "Off", "ambilight": False, "ambihue": False, "ambi_brightness": False,
-                    "dls_state": False
-                }
-            )
+            self.mqtt_update_status(dict(OFF_STATUS))
     else:
-        self.mqtt_update_status(
-            {
-                "powerstate": "Off", "ambilight": False, "ambihue": False, "ambi_brightness": False,
-                "dls_state": False
-            }
-        )
+        self.mqtt_update_status(dict(OFF_STATUS))
     return False
 
 
@@ -51,71 +55,237 @@ def mqtt_update_ambilight(self):
     if ambilight_status is not None and ambilight_status[0] == '{':
         ambilight_status = json.loads(ambilight_status)
         if "styleName" in ambilight_status:
-            ambilight = ambilight_status
-            if json.dumps(self.last_status["ambilight"]) != json.dumps(ambilight):
-                self.mqtt.publish(
-                    str(self.config["MQTT"]["topic_pylips"]), json.dumps(
-                        {
-                            "status": {
-                                "ambilight": ambilight
-                            }
-                        }
-                    ), retain=False
-                )
+            self.mqtt_update_status({"ambilight": ambilight_status})
 
 
 def mqtt_update_ambihue(self):
     """
     Update ambihue for MQTT status.
     """
-    ambihue_state = self.run_command("ambihue_state", None, self.verbose, False, False)
+    ambihue_state = self.run_command("ambihue_state", verbose=self.verbose, print_response=False)
     if ambihue_state is not None and ambihue_state[0] == '{':
         ambihue_state = json.loads(ambihue_state)
         if "power" in ambihue_state:
-            ambihue = ambihue_state["power"]
-            if self.last_status["ambihue"] != ambihue:
-                self.mqtt.publish(
-                    str(self.config["MQTT"]["topic_pylips"]), json.dumps(
-                        {
-                            "status": {
-                                "ambihue": ambihue
-                            }
-                        }
-                    ), retain=False
-                )
+            self.mqtt_update_status({"ambihue": ambihue_state["power"]})
 
 
 def mqtt_update_ambilight_brightness_state(self):
     """
     Update ambilight brightness for MQTT status.
     """
-    brightness_status = self.run_command("ambilight_brightness_state", None, self.verbose, False)
+    brightness_status = self.run_command("ambilight_brightness_state", verbose=self.verbose)
     if brightness_status is not None and brightness_status[0] == '{':
         brightness_status = json.loads(brightness_status)
         if "values" in brightness_status:
-            ambi_brightness = brightness_status["values"][0]["value"]["data"]["value"]
-            if self.last_status["ambi_brightness"] != ambi_brightness:
-                self.mqtt.publish(
-                    str(self.config["MQTT"]["topic_pylips"]),
-                    json.dumps({"status": {"ambi_brightness": ambi_brightness}}), retain=False
-                )
+            self.mqtt_update_status(
+                {"ambi_brightness": brightness_status["values"][0]["value"]["data"]["value"]}
+            )
 
 
 def mqtt_update_display_light_sensor_state(self):
     """
     Update display light sensor status for MQTT status.
     """
-    dls_state = self.run_command("display_light_sensor_state", None, self.verbose, False)
+    dls_state = self.run_command("display_light_sensor_state", verbose=self.verbose)
     if dls_state is not None and dls_state[0] == '{':
         dls_state = json.loads(dls_state)
         if "values" in dls_state:
-            dls = dls_state["values"][0]["value"]["data"]["selected_item"]
-            print(dls)
-            if self.last_status["dls_state"] != dls:
-                self.mqtt.publish(
-                    str(self.config["MQTT"]["topic_pylips"]),
-                    json.dumps({"status": {"dls_state": dls}}), retain=False
-                )
+            self.mqtt_update_status({"dls_state": dls_state["values"][0]["value"]["data"]["selected_item"]})
+
+
+def mqtt_update_settings_state(self):
+    """
+    Update ambilight brightness and display light sensor for MQTT status with a single settings request.
+    """
+    names = [name for name, (field, key) in SETTINGS_STATUS.items() if supports(self, field)]
+    settings = self.get_settings(names)
+    if settings is None:
+        return
+    update = {}
+    for name in names:
+        field, key = SETTINGS_STATUS[name]
+        if isinstance(settings[name], dict) and key in settings[name]:
+            update[field] = settings[name][key]
+    self.mqtt_update_status(update)
+
+
+def mqtt_handle_message(self, message):
+    """
+    Handle a decoded MQTT message addressed to this TV.
+
+    Args:
+        message (dict): Decoded MQTT message.
+    """
+    if "status" in message:
+        self.mqtt_update_status(message["status"])
+    if "settings" in message:
+        try:
+            self.set_settings(message["settings"])
+        except (KeyError, ConnectionError) as e:
+            log.error("Can not write settings: %s", e)
+    if "ambilight_effect" in message:
+        from pylips_tools.tools_effects import play_effect_message
+        play_effect_message(self, message["ambilight_effect"])
+    if self.effect_player is not None and "command" in message:
+        from pylips_tools.tools_effects import interrupts_effect
+        if interrupts_effect(self.commands, message):
+            self.stop_ambilight_effect()
+    if "batch" in message:
+        self.run_batch(message["batch"], message.get("concurrency"), self.verbose)
+    if "keys" in message and "save_macro" in message:
+        self.save_macro(message["save_macro"], message["keys"])
+    elif "keys" in message:
+        self.run_keys(message["keys"], self.verbose)
+    if "macro" in message:
+        self.run_macro(message["macro"], self.verbose)
+    if "command" in message:
+        body = None
+        path = ""
+        if "body" in message:
+            body = message["body"]
+        if "path" in message:
+            path = message["path"]
+        if message["command"] == "get":
+            if len(path) == 0:
+                return log.error("Please provide a 'path' argument")
+            self.get(path, self.verbose, 0, False)
+        elif message["command"] == "post":
+            if len(path) == 0:
+                return log.error("Please provide a 'path' argument")
+            self.post(path, body, self.verbose)
+        elif message["command"] != "post" and message["command"] != "get":
+            self.run_command(message["command"], body, verbose=self.verbose)
+    if self.scheduler is not None and any(key in message for key in TV_MESSAGE_KEYS):
+        self.scheduler.boost()
+
+
+def mqtt_update_cycle(self):
+    """
+    Run one round of MQTT status updates, published at once when the round is done.
+    """
+    start = time.perf_counter()
+    self.status_store.begin()
+    try:
+        if self.mqtt_update_powerstate():
+            if supports(self, "ambilight"):
+                self.mqtt_update_ambilight()
+            if supports(self, "ambihue"):
+                self.mqtt_update_ambihue()
+            self.mqtt_update_settings_state()
+    finally:
+        self.publish_status(self.status_store.commit())
+        if self.metrics is not None:
+            self.metrics.observe(
+                "pylips_update_cycle_seconds", time.perf_counter() - start, probe="cycle", tv=self.name
+            )
+
+
+def notifychange(self, notification, timeout):
+    """
+    Long-poll the notifychange endpoint until one of the supplied fields changes.
+
+    Args:
+        notification (dict): Last known values of the watched endpoints.
+        timeout (int): Seconds to keep the request open.
+
+    Returns:
+        dict: Fields that differ from the supplied values, empty if none changed before the timeout, None if the
+        TV can not be reached.
+
+    Raises:
+        ValueError: If the TV answers with an error status or a body that is not a JSON object.
+    """
+    import requests
+
+    try:
+        r = self.session.post(
+            self.base_url + "notifychange", json={"notification": notification}, verify=False, auth=self.auth,
+            timeout=timeout
+        )
+    except requests.exceptions.ReadTimeout:
+        return {}
+    except requests.exceptions.RequestException as e:
+        log.error("notifychange request failed: %s", e)
+        return None
+    if r.status_code != 200:
+        raise ValueError("notifychange answered with status %d" % r.status_code)
+    if len(r.text) == 0 or r.text[0] != '{':
+        raise ValueError("notifychange answered without a JSON object")
+    return json.loads(r.text)
+
+
+def notify_status(changes):
+    """
+    Map notifychange fields to MQTT status fields.
+
+    Args:
+        changes (dict): Fields returned by notifychange.
+
+    Returns:
+        dict: Status update.
+    """
+    update = {}
+    if "powerstate" in changes and "powerstate" in changes["powerstate"]:
+        update["powerstate"] = changes["powerstate"]["powerstate"]
+    for field, status_field in NOTIFY_STATUS_FIELDS.items():
+        if field in changes:
+            update[status_field] = changes[field]
+    return update
+
+
+def start_mqtt_notifier(self, verbose=True):
+    """
+    Publish MQTT status changes pushed by the TV's notifychange long-poll.
+
+    Only fields that differ from the last known status are published. Fields the TV does not report through
+    notifychange (ambilight, ambihue, brightness, light sensor) are refreshed with a full update cycle when the
+    TV is switched on and every 'notify_refresh_interval' seconds. After 'notify_max_failures' error replies in
+    a row the updater falls back to polling.
+
+    Args:
+        verbose (bool): Display feedback.
+    """
+    print("Started MQTT notifychange updater")
+    timeout = int(self.config["DEFAULT"].get("notify_timeout", "30"))
+    refresh_interval = int(self.config["DEFAULT"].get("notify_refresh_interval", "60"))
+    max_failures = int(self.config["DEFAULT"].get("notify_max_failures", "3"))
+    failures = 0
+    notification = {field: {} for field in NOTIFY_FIELDS}
+    next_refresh = 0
+    while True:
+        if time.monotonic() >= next_refresh:
+            self.mqtt_update_cycle()
+            next_refresh = time.monotonic() + refresh_interval
+        try:
+            changes = notifychange(self, notification, timeout)
+        except ValueError as e:
+            failures += 1
+            if failures >= max_failures:
+                log.warning("%s, falling back to polling", e)
+                return start_mqtt_poller(self)
+            log.warning("%s", e)
+            time.sleep(int(self.config["DEFAULT"]["update_interval"]))
+            continue
+        failures = 0
+        if changes is None:
+            self.mqtt_update_status(dict(OFF_STATUS))
+            notification = {field: {} for field in NOTIFY_FIELDS}
+            time.sleep(int(self.config["DEFAULT"]["update_interval"]))
+            continue
+        notification.update({field: value for field, value in changes.items() if field in notification})
+        if isinstance(changes.get("network/devices"), list):
+            self.remember_mac(changes["network/devices"])
+        delta = {
+            field: value for field, value in notify_status(changes).items()
+            if self.last_status.get(field) != value
+        }
+        if len(delta) == 0:
+            continue
+        if verbose:
+            log.info("notifychange: %s", delta)
+        self.mqtt_update_status(delta)
+        if delta.get("powerstate", "").lower() == "on":
+            next_refresh = 0
 
 
 def start_mqtt_updater(self, verbose=True):
@@ -125,21 +295,22 @@ def start_mqtt_updater(self, verbose=True):
     Args:
         verbose (bool): Display feedback.
     """
+    if self.config["DEFAULT"].get("mqtt_update_mode", "poll") == "notify":
+        return start_mqtt_notifier(self, verbose)
+    if self.config["DEFAULT"].get("mqtt_update_mode", "poll") == "adaptive":
+        from pylips_tools.tools_scheduler import StatusScheduler
+
+        print("Started adaptive MQTT status updater")
+        self.scheduler = StatusScheduler(self)
+        return self.scheduler.run()
+    return start_mqtt_poller(self)
+
+
+def start_mqtt_poller(self):
+    """
+    Run a full MQTT update cycle every 'update_interval' seconds.
+    """
     print("Started MQTT status updater")
     while True:
-        if self.mqtt_update_powerstate():
-            self.mqtt_update_ambilight()
-            self.mqtt_update_ambihue()
-            self.mqtt_update_ambilight_brightness_state()
-            self.mqtt_update_display_light_sensor_state()
-        else:
-            self.mqtt.publish(
-                str(self.config["MQTT"]["topic_status"]),
-                json.dumps(
-                    {
-                        "powerstate": "Off", "ambilight": False, "ambihue": False,
-                        "ambi_brightness": False, "dls_state": False
-                    }
-                ), retain=False
-            )
+        self.mqtt_update_cycle()
         time.sleep(int(self.config["DEFAULT"]["update_interval"]))
@@ -0,0 +1,256 @@
+# tools_power.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import json
+import re
+import socket
+import threading
+import time
+
+from pylips_tools.tools_breaker import UNREACHABLE
+from pylips_tools.tools_logging import get_logger
+from pylips_tools.tools_mqtt import notifychange
+from pylips_tools.tools_state import open_state
+
+log = get_logger("http")
+
+# Readiness probing: first interval, growth per attempt and longest interval in seconds, and request timeout
+PROBE_INTERVAL = 0.1
+PROBE_GROWTH = 1.5
+PROBE_INTERVAL_MAX = 1.0
+PROBE_TIMEOUT = 0.5
+
+
+def magic_packet(mac):
+    """
+    Build a Wake-on-LAN magic packet.
+
+    Args:
+        mac (str): MAC address, e.g. "70:C9:4E:47:8D:82".
+
+    Returns:
+        bytes: 6 x 0xFF followed by the MAC repeated 16 times.
+
+    Raises:
+        ValueError: If the MAC address is not valid.
+    """
+    digits = re.sub(r"[^0-9A-Fa-f]", "", mac)
+    if len(digits) != 12:
+        raise ValueError("Invalid MAC address: %s" % mac)
+    return b"\xff" * 6 + bytes.fromhex(digits) * 16
+
+
+def send_magic_packet(mac, broadcast="255.255.255.255", host=None, port=9, count=3):
+    """
+    Send Wake-on-LAN magic packets to the broadcast address and, if given, to the TV's address.
+
+    Args:
+        mac (str): MAC address of the TV.
+        broadcast (str): Broadcast address of the TV's network.
+        host (str, optional): TV's address, reaches TVs whose address is still in the ARP cache of routers.
+        port (int): UDP port.
+        count (int): Packets per address, some network stacks drop the first one.
+
+    Returns:
+        None
+    """
+    packet = magic_packet(mac)
+    targets = [broadcast] if not host else [broadcast, host]
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as wol_socket:
+        wol_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        for attempt in range(count):
+            for target in targets:
+                try:
+                    wol_socket.sendto(packet, (target, port))
+                except OSError as e:
+                    log.warning("Wake-on-LAN packet to %s failed: %s", target, e)
+            if attempt < count - 1:
+                time.sleep(0.05)
+
+
+def tv_mac(self):
+    """
+    Return the TV's MAC address from the 'mac' setting or from what was learned from the TV.
+
+    Returns:
+        str: MAC address, None if it is not known yet.
+    """
+    mac = self.tv.get("mac", "")
+    if len(mac) > 0:
+        return mac
+    return open_state(self.config).get(str(self.tv["host"]), "mac")
+
+
+def remember_mac(self, devices):
+    """
+    Remember the MAC address of the TV's network interface from network/devices data.
+
+    The interface with the TV's address is preferred, then the first one with Wake-on-LAN enabled.
+
+    Args:
+        devices (list): network/devices entries with mac, ip, type and wake-on-lan.
+
+    Returns:
+        str: Remembered MAC address, None if the data has none.
+    """
+    devices = [device for device in devices if isinstance(device, dict) and device.get("mac")]
+    if len(devices) == 0:
+        return None
+    host = str(self.tv["host"])
+    devices.sort(key=lambda device: (device.get("ip") != host, device.get("wake-on-lan", "").lower() != "enabled"))
+    mac = devices[0]["mac"]
+    open_state(self.config).set(host, "mac", mac)
+    return mac
+
+
+def learn_mac(self):
+    """
+    Ask the TV for its network interfaces through notifychange and remember its MAC address.
+
+    Returns:
+        str: MAC address, None if the TV did not report one.
+    """
+    try:
+        changes = notifychange(self, {"network/devices": []}, 3)
+    except ValueError:
+        return None
+    if not changes or not isinstance(changes.get("network/devices"), list):
+        return None
+    return remember_mac(self, changes["network/devices"])
+
+
+def read_powerstate(self, timeout=PROBE_TIMEOUT):
+    """
+    Read the power state with a single short request, bypassing retries and the circuit breaker.
+
+    Args:
+        timeout (float): Request timeout.
+
+    Returns:
+        str: Power state, None if the API does not answer.
+    """
+    try:
+        r = self.session.get(self.base_url + "powerstate", verify=False, auth=self.auth, timeout=timeout)
+        return json.loads(r.text)["powerstate"]
+    except Exception:
+        return None
+
+
+def chromecast_power_on(self, path, deadline):
+    """
+    Wake the TV through its Chromecast endpoint on port 8008.
+
+    Args:
+        path (str): Endpoint path, 'apps/ChromeCast'.
+        deadline (float): Monotonic time to give up at.
+
+    Returns:
+        bool: True if the endpoint answered.
+    """
+    import requests
+
+    for attempt in (1, 2):
+        try:
+            self.session.post(
+                "http://" + str(self.tv["host"]) + ":8008/" + path, verify=False,
+                timeout=min(10, max(0.1, deadline - time.monotonic()))
+            )
+            return True
+        except requests.exceptions.ReadTimeout:
+            if attempt == 2 or time.monotonic() >= deadline:
+                log.error("Request timed out")
+                return False
+            log.error("Request timed out. Retrying...")
+            time.sleep(self.breaker.backoff(attempt, deadline))
+        except requests.exceptions.RequestException as e:
+            log.error("Power request failed: %s", e)
+            return False
+    return False
+
+
+def power_on(self, timeout=None, chromecast_path="apps/ChromeCast"):
+    """
+    Switch the TV on and wait until its API is ready.
+
+    With a known MAC address Wake-on-LAN packets are sent first and the Chromecast endpoint is only tried if the
+    API is not up after 'wol_fallback' seconds; without one the Chromecast endpoint is tried right away (from a
+    background thread, so probing starts at once). powerstate is probed every 0.1 s, growing to 1 s, and a TV
+    whose API answers in standby is switched on through powerstate. The MAC address is learned from a background
+    thread once the TV is on.
+
+    Args:
+        timeout (float, optional): Seconds to wait for the TV, defaults to 'power_on_timeout'.
+        chromecast_path (str): Path of the Chromecast power-on request.
+
+    Returns:
+        dict: ready, method (already_on, powerstate, wol, chromecast or wol+chromecast), time_to_ready in
+        seconds, the number of probes, and an error if the TV did not become ready.
+    """
+    config = self.config["DEFAULT"]
+    start = time.monotonic()
+    if timeout is None:
+        timeout = float(config.get("power_on_timeout", "20"))
+    deadline = start + timeout
+    result = {"ready": False, "method": "already_on", "time_to_ready": None, "probes": 1}
+    powerstate = read_powerstate(self)
+    if powerstate is None or powerstate.lower() != "on":
+        mac = tv_mac(self)
+        if powerstate is not None:
+            # The API is up while the TV is in standby, it is switched on through powerstate below
+            result["method"] = "powerstate"
+            fallback = None
+        elif mac is not None:
+            send_magic_packet(
+                mac, config.get("wol_broadcast", "255.255.255.255"), str(self.tv["host"]),
+                int(config.get("wol_port", "9"))
+            )
+            result["method"] = "wol"
+            fallback = start + float(config.get("wol_fallback", "5"))
+        else:
+            result["method"] = "chromecast"
+            fallback = start
+        interval = PROBE_INTERVAL
+        powered = False
+        while True:
+            if fallback is not None and time.monotonic() >= fallback:
+                threading.Thread(
+                    target=chromecast_power_on, args=(self, chromecast_path, deadline), daemon=True
+                ).start()
+                result["method"] = "wol+chromecast" if result["method"] == "wol" else result["method"]
+                fallback = None
+            if powerstate is not None and powerstate.lower() == "on":
+                break
+            if powerstate is not None and not powered:
+                # The probe got an answer, so a breaker opened while the TV was off must not fail the request
+                self.breaker.reset()
+                if self.post("powerstate", {"powerstate": "On"}, False) != UNREACHABLE:
+                    powered = True
+                    fallback = None
+                    interval = PROBE_INTERVAL
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(interval, remaining))
+            interval = min(interval * PROBE_GROWTH, PROBE_INTERVAL_MAX)
+            powerstate = read_powerstate(self, min(PROBE_TIMEOUT, max(0.05, deadline - time.monotonic())))
+            result["probes"] += 1
+    if powerstate is None or powerstate.lower() != "on":
+        result["error"] = "TV did not become ready within %g seconds" % timeout
+        log.error("%s", result["error"])
+        return result
+    result["ready"] = True
+    result["time_to_ready"] = round(time.monotonic() - start, 3)
+    self.breaker.reset()
+    if self.mqtt is not None:
+        self.mqtt_update_status({"powerstate": powerstate})
+    if self.metrics is not None:
+        self.metrics.observe(
+            "pylips_power_on_seconds", result["time_to_ready"], method=result["method"], tv=self.name
+        )
+    open_state(self.config).set(str(self.tv["host"]), "time_to_ready", result["time_to_ready"])
+    if tv_mac(self) is None:
+        threading.Thread(target=learn_mac, args=(self,), name="pylips-learn-mac", daemon=True).start()
+    log.info("TV ready after %.2f s (%s)", result["time_to_ready"], result["method"])
+    return result
@@ -0,0 +1,210 @@
+# tools_queue.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import collections
+import json
+import threading
+
+from pylips_tools.tools_logging import get_logger
+
+log = get_logger("queue")
+
+# Paths whose requests set an absolute state, so a newer request to the same target supersedes a waiting one
+STATE_PATHS = (
+    "ambilight/power", "ambilight/currentconfiguration", "ambilight/lounge", "huelamp/power", "audio/volume",
+    "activities/tv", "menuitems/settings/update"
+)
+
+# Paths that only read, so identical waiting requests are sent once
+READ_PATHS = ("menuitems/settings/current",)
+
+# Message keys that send requests to the TV, all other messages are handled right away
+TV_MESSAGE_KEYS = ("command", "batch", "settings", "keys", "macro", "ambilight_effect")
+
+
+def settings_nodes(body):
+    """
+    List the setting nodes a menuitems/settings/update body writes.
+
+    Args:
+        body (str, dict or bytes): Request body.
+
+    Returns:
+        tuple: Sorted node ids, None if the body can not be read.
+    """
+    try:
+        if isinstance(body, (str, bytes)):
+            body = json.loads(body)
+        return tuple(sorted(str(value["value"]["Nodeid"]) for value in body["values"]))
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def coalesce_key(commands, message):
+    """
+    Return the target a command message writes or reads, for coalescing.
+
+    Args:
+        commands (CommandRegistry): Compiled available_commands.json.
+        message (dict): Decoded MQTT message.
+
+    Returns:
+        tuple: Key shared by messages that supersede each other, None for messages that have to run in order
+        (key presses, key sequences, app launches, batches).
+    """
+    if "ambilight_effect" in message and "command" not in message:
+        return ("ambilight_effect",)
+    if any(key in message for key in ("batch", "settings", "keys", "macro")) or "command" not in message:
+        return None
+    command = message["command"]
+    body = message.get("body")
+    if command == "get":
+        return ("get", message.get("path", ""))
+    if command == "post":
+        path = message.get("path", "")
+    else:
+        entry = commands.get(command)
+        if entry is None or entry.method == "power":
+            return None
+        if entry.method == "get":
+            return ("get", entry.path)
+        path = entry.path
+        if body is None or len(entry.slots) > 0:
+            body = entry.body if body is None else entry.template
+    if path.lower() in READ_PATHS:
+        return ("read", path, body if isinstance(body, (str, bytes)) else json.dumps(body, sort_keys=True))
+    if path.lower() not in STATE_PATHS:
+        return None
+    if path.lower() == "menuitems/settings/update":
+        nodes = settings_nodes(body)
+        return None if nodes is None else ("post", path) + nodes
+    return ("post", path)
+
+
+class CommandQueue:
+    """
+    Per-TV queue between the MQTT listener and the TV.
+
+    Commands run one after another on a worker thread, so the MQTT client never blocks on the TV. A command that
+    sets the same state as one still waiting (brightness, colour, ambilight style, channel, volume) replaces it
+    in place, so a slider only sends its last value. Key presses and other commands keep their order. When
+    'command_queue_size' commands are waiting, 'command_queue_drop' decides whether the oldest waiting or the new
+    command is dropped.
+    """
+
+    def __init__(self, pylips, size=64, drop="oldest"):
+        """
+        Initialize the queue.
+
+        Args:
+            pylips (Pylips): Configured Pylips instance.
+            size (int): Maximum number of waiting commands.
+            drop (str): "oldest" or "newest".
+
+        Returns:
+            None
+        """
+        self.pylips = pylips
+        self.size = size
+        self.drop = drop
+        self.slots = collections.deque()
+        self.keyed = {}
+        self.condition = threading.Condition()
+        self.thread = None
+        self.coalesced = 0
+        self.dropped = 0
+        self.executed = 0
+
+    def start(self):
+        """
+        Start the worker thread.
+
+        Returns:
+            CommandQueue: The queue.
+        """
+        self.thread = threading.Thread(
+            target=self.run, name="pylips-queue-" + (self.pylips.name or "TV"), daemon=True
+        )
+        self.thread.start()
+        return self
+
+    def put(self, message):
+        """
+        Queue a decoded MQTT message.
+
+        Messages that only update the status do not reach the TV and are handled right away.
+
+        Args:
+            message (dict): Decoded MQTT message.
+
+        Returns:
+            None
+        """
+        if not any(key in message for key in TV_MESSAGE_KEYS):
+            return self.pylips.mqtt_handle_message(message)
+        key = coalesce_key(self.pylips.commands, message)
+        with self.condition:
+            if key is not None and key in self.keyed:
+                self.keyed[key][1] = message
+                self.coalesced += 1
+                return
+            if len(self.slots) >= self.size:
+                self.dropped += 1
+                if self.drop == "newest":
+                    return log.warning("Command queue full, dropped %s", message.get("command", "batch"))
+                old_key, old_message = self.slots.popleft()
+                self.keyed.pop(old_key, None)
+                log.warning("Command queue full, dropped %s", old_message.get("command", "batch"))
+            slot = [key, message]
+            self.slots.append(slot)
+            if key is not None:
+                self.keyed[key] = slot
+            self.condition.notify()
+
+    def run(self):
+        """
+        Run queued commands until the process exits.
+
+        Returns:
+            None
+        """
+        while True:
+            with self.condition:
+                while len(self.slots) == 0:
+                    self.condition.wait()
+                key, message = self.slots.popleft()
+                if key is not None:
+                    del self.keyed[key]
+            try:
+                self.pylips.mqtt_handle_message(message)
+            except Exception as e:
+                log.error("Command %s failed: %s", message.get("command", "batch"), e)
+            self.executed += 1
+
+    def stats(self):
+        """
+        Return queue counters.
+
+        Returns:
+            dict: Waiting, coalesced, dropped and executed commands.
+        """
+        with self.condition:
+            return {
+                "depth": len(self.slots), "coalesced": self.coalesced, "dropped": self.dropped,
+                "executed": self.executed
+            }
+
+
+def create_command_queue(self):
+    """
+    Create and start the command queue of a TV from settings.ini.
+
+    Returns:
+        CommandQueue: Running queue, None if 'command_queue_size' is 0.
+    """
+    size = int(self.config["DEFAULT"].get("command_queue_size", "64"))
+    if size <= 0:
+        return None
+    return CommandQueue(self, size, self.config["DEFAULT"].get("command_queue_drop", "oldest")).start()
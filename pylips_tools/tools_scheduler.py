@@ -0,0 +1,244 @@
+# tools_scheduler.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import collections
+import heapq
+import json
+import threading
+import time
+
+from pylips_tools.tools_discovery import supports
+from pylips_tools.tools_logging import get_logger
+from pylips_tools.tools_mqtt import OFF_STATUS
+
+log = get_logger("scheduler")
+
+# Status probes: name, Pylips method publishing the field, default interval in seconds, priority (lower first)
+PROBES = (
+    ("powerstate", None, 5, 0),
+    ("ambilight", "mqtt_update_ambilight", 5, 1),
+    ("ambi_brightness", "mqtt_update_ambilight_brightness_state", 15, 2),
+    ("ambihue", "mqtt_update_ambihue", 15, 2),
+    ("dls_state", "mqtt_update_display_light_sensor_state", 60, 3),
+)
+
+# Seconds the effective request rate is averaged over
+RATE_WINDOW = 60
+
+
+def probe_powerstate(self, err_count=0):
+    """
+    Read the power state and publish it if it changed.
+
+    Args:
+        err_count (int): Retry attempts to skip, num_retries - 1 makes a single attempt.
+
+    Returns:
+        str: Power state reported by the TV, None if it can not be reached.
+    """
+    response = self.get("powerstate", self.verbose, err_count, False)
+    if response is None or len(response) == 0 or response[0] != '{' or '"powerstate"' not in response:
+        return None
+    powerstate = json.loads(response)["powerstate"]
+    if powerstate.lower() == "on":
+        self.mqtt_update_status({"powerstate": powerstate})
+    else:
+        self.mqtt_update_status(dict(OFF_STATUS, powerstate=powerstate))
+    return powerstate
+
+
+class StatusScheduler:
+    """
+    Poll every status field on its own interval instead of all fields every 'update_interval'.
+
+    Intervals are read from the [SCHEDULE] section of settings.ini. Probes that are due at the same time run in
+    priority order. While the TV is unreachable only powerstate is probed, with a single attempt and an interval
+    that doubles after every failure up to 'backoff_max'. After a command every interval is shortened to
+    'boost_interval' for 'boost_duration' seconds, so the status follows the command quickly.
+    """
+
+    def __init__(self, pylips):
+        """
+        Initialize the scheduler.
+
+        Args:
+            pylips (Pylips): Configured Pylips instance.
+
+        Returns:
+            None
+        """
+        config = pylips.config
+        self.pylips = pylips
+        self.intervals = {}
+        self.methods = {}
+        self.priorities = {}
+        for name, method, interval, priority in PROBES:
+            if not supports(pylips, name):
+                log.info("Not polling %s, the TV does not support it", name)
+                continue
+            if config.has_section("SCHEDULE"):
+                interval = float(config["SCHEDULE"].get(name, str(interval)))
+            self.intervals[name] = interval
+            self.methods[name] = method
+            self.priorities[name] = priority
+        self.num_retries = int(config["DEFAULT"]["num_retries"])
+        self.backoff_max = float(config["DEFAULT"].get("backoff_max", "300"))
+        self.boost_interval = float(config["DEFAULT"].get("boost_interval", "1"))
+        self.boost_duration = float(config["DEFAULT"].get("boost_duration", "10"))
+        self.boost_until = 0
+        self.failures = 0
+        self.powered = False
+        self.heap = [(0, priority, name) for name, priority in self.priorities.items()]
+        heapq.heapify(self.heap)
+        self.condition = threading.Condition()
+        self.requests = collections.Counter()
+        self.request_times = collections.deque()
+        self.last_rate_log = time.monotonic()
+
+    def interval(self, name):
+        """
+        Return the current interval of a probe.
+
+        Args:
+            name (str): Probe name.
+
+        Returns:
+            float: Seconds until the probe runs again.
+        """
+        interval = self.intervals[name]
+        if name == "powerstate" and self.failures > 0:
+            return min(interval * 2 ** self.failures, self.backoff_max)
+        if time.monotonic() < self.boost_until:
+            return min(interval, self.boost_interval)
+        return interval
+
+    def reschedule(self, due):
+        """
+        Move every probe that is due later than 'due' forward.
+
+        Args:
+            due (float): Monotonic time.
+
+        Returns:
+            None
+        """
+        with self.condition:
+            self.heap = [(min(entry[0], due),) + entry[1:] for entry in self.heap]
+            heapq.heapify(self.heap)
+            self.condition.notify()
+
+    def boost(self):
+        """
+        Poll closely for a while, called after a command was sent to the TV.
+
+        Returns:
+            None
+        """
+        self.boost_until = time.monotonic() + self.boost_duration
+        self.reschedule(time.monotonic() + self.boost_interval)
+
+    def count(self, name, requests=1):
+        """
+        Record requests made by a probe.
+
+        Args:
+            name (str): Probe name.
+            requests (int): Number of requests.
+
+        Returns:
+            None
+        """
+        now = time.monotonic()
+        self.requests[name] += requests
+        self.request_times.extend([now] * requests)
+        while len(self.request_times) > 0 and self.request_times[0] < now - RATE_WINDOW:
+            self.request_times.popleft()
+
+    def run_probe(self, name):
+        """
+        Run a probe.
+
+        Args:
+            name (str): Probe name.
+
+        Returns:
+            None
+        """
+        # Calls the circuit breaker failed fast never reached the network and are not counted
+        fast_fails = self.pylips.breaker.fast_fails
+        if name != "powerstate":
+            if self.powered:
+                getattr(self.pylips, self.methods[name])()
+                if self.pylips.breaker.fast_fails == fast_fails:
+                    self.count(name)
+            return
+        err_count = self.num_retries - 1 if self.failures > 0 else 0
+        powerstate = probe_powerstate(self.pylips, err_count)
+        if powerstate is None:
+            if self.pylips.breaker.fast_fails == fast_fails:
+                self.count(name, self.num_retries - err_count)
+            self.failures += 1
+            self.powered = False
+            return
+        self.count(name)
+        self.failures = 0
+        powered = powerstate.lower() == "on"
+        if powered and not self.powered:
+            self.reschedule(time.monotonic())
+        self.powered = powered
+
+    def run(self):
+        """
+        Run due probes until the process exits.
+
+        Returns:
+            None
+        """
+        while True:
+            with self.condition:
+                while self.heap[0][0] > time.monotonic():
+                    self.condition.wait(self.heap[0][0] - time.monotonic())
+                due, priority, name = heapq.heappop(self.heap)
+            start = time.perf_counter()
+            try:
+                self.run_probe(name)
+            except Exception as e:
+                log.error("Status probe %s failed: %s", name, e)
+            if self.pylips.metrics is not None:
+                self.pylips.metrics.observe(
+                    "pylips_update_cycle_seconds", time.perf_counter() - start, probe=name, tv=self.pylips.name
+                )
+            with self.condition:
+                heapq.heappush(self.heap, (time.monotonic() + self.interval(name), priority, name))
+            if self.pylips.verbose and time.monotonic() - self.last_rate_log >= RATE_WINDOW:
+                self.last_rate_log = time.monotonic()
+                log.info("Status polling of %s: %.2f requests/s", self.pylips.name or "TV", self.request_rate())
+
+    def request_rate(self):
+        """
+        Return the effective request rate.
+
+        Returns:
+            float: Requests per second over the last RATE_WINDOW seconds.
+        """
+        now = time.monotonic()
+        return len([sent for sent in list(self.request_times) if sent >= now - RATE_WINDOW]) / float(RATE_WINDOW)
+
+    def stats(self):
+        """
+        Return polling counters.
+
+        Returns:
+            dict: Request rate, requests and current interval per probe, and the backoff state.
+        """
+        return {
+            "rate": round(self.request_rate(), 3),
+            "requests": sum(self.requests.values()),
+            "probes": {
+                name: {"interval": self.interval(name), "requests": self.requests[name]} for name in self.intervals
+            },
+            "powered": self.powered,
+            "failures": self.failures
+        }
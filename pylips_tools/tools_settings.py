@@ -0,0 +1,136 @@
+# tools_settings.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import functools
+import json
+import threading
+
+from pylips_tools.tools_stream import iter_settings_nodes
+
+SETTINGS_CURRENT_PATH = "menuitems/settings/current"
+SETTINGS_UPDATE_PATH = "menuitems/settings/update"
+
+# Locks around the settings structure fetch of every TV host, so one slow TV does not hold up the others
+index_locks = {}
+index_locks_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def command_node_ids(commands):
+    """
+    Map the names of the settings commands in available_commands.json to the node they read or write.
+
+    Args:
+        commands (CommandRegistry): Compiled available_commands.json.
+
+    Returns:
+        dict: Node ids by command name, also without a '_state' suffix (e.g. 'display_light_sensor').
+    """
+    node_ids = {}
+    for name, command in commands.commands.items():
+        if command.path not in (SETTINGS_CURRENT_PATH, SETTINGS_UPDATE_PATH) or command.template is None:
+            continue
+        body = json.loads(command.template)
+        nodes = [node["nodeid"] for node in body.get("nodes", [])]
+        nodes += [value["value"]["Nodeid"] for value in body.get("values", [])]
+        if len(nodes) != 1:
+            continue
+        node_ids[name] = nodes[0]
+        if name.endswith("_state"):
+            node_ids[name[:-len("_state")]] = nodes[0]
+    return node_ids
+
+
+def settings_node_index(self, refresh=False):
+    """
+    Return the name to node id index of a TV's settings, fetching menuitems/settings/structure once.
+
+    Args:
+        refresh (bool): Fetch the structure again.
+
+    Returns:
+        dict: Node ids by settings context (e.g. 'ambilight_hue_off') and settings command name.
+    """
+    with index_locks_lock:
+        index_lock = index_locks.setdefault(str(self.tv["host"]), threading.Lock())
+    with index_lock:
+        if self.settings_nodes is None or refresh:
+            node_ids = {node.context: node.node_id for node in iter_settings_nodes(self) if node.context}
+            node_ids.update(command_node_ids(self.commands))
+            self.settings_nodes = node_ids
+        return self.settings_nodes
+
+
+def resolve_node(self, name):
+    """
+    Resolve a settings name or node id.
+
+    Names of settings commands resolve without a request; other names fetch the settings structure once.
+
+    Args:
+        name (str or int): Node id, settings context or settings command name.
+
+    Returns:
+        int: Node id.
+
+    Raises:
+        KeyError: If the TV has no such setting.
+        ConnectionError: If the settings structure is needed and can not be read.
+    """
+    if isinstance(name, int) or (isinstance(name, str) and name.isdigit()):
+        return int(name)
+    node_ids = command_node_ids(self.commands)
+    if name in node_ids:
+        return node_ids[name]
+    node_ids = settings_node_index(self)
+    if name not in node_ids:
+        raise KeyError("Unknown setting: %s" % name)
+    return node_ids[name]
+
+
+def get_settings(self, names):
+    """
+    Read several settings with one menuitems/settings/current request.
+
+    Args:
+        names (list): Node ids, settings contexts or settings command names.
+
+    Returns:
+        dict: 'data' object of every setting by the name it was asked for (None if the TV did not return it),
+        None if the request failed.
+    """
+    node_ids = {name: resolve_node(self, name) for name in names}
+    body = {"nodes": [{"nodeid": node_id} for node_id in dict.fromkeys(node_ids.values())]}
+    response = self.post(SETTINGS_CURRENT_PATH, body, self.verbose)
+    try:
+        values = json.loads(response)["values"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    data = {value["value"]["Nodeid"]: value["value"].get("data") for value in values if "value" in value}
+    return {name: data.get(node_id) for name, node_id in node_ids.items()}
+
+
+def set_settings(self, values):
+    """
+    Write several settings with one menuitems/settings/update request.
+
+    Args:
+        values (dict): New 'data' object by node id, settings context or settings command name. Values that are
+            not dicts are sent as {"value": value}.
+
+    Returns:
+        str: Response text or error message.
+    """
+    body = {
+        "values": [
+            {
+                "value": {
+                    "Nodeid": resolve_node(self, name), "Controllable": "true", "Available": "true",
+                    "data": data if isinstance(data, dict) else {"value": data}
+                }
+            } for name, data in values.items()
+        ]
+    }
+    return self.post(SETTINGS_UPDATE_PATH, body, self.verbose)
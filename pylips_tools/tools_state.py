@@ -0,0 +1,98 @@
+# tools_state.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import json
+import logging
+import os
+import threading
+
+# Open state files by path, shared by the TVs of a fleet
+state_files = {}
+state_files_lock = threading.Lock()
+
+
+class StateFile:
+    """
+    Small JSON file with what Pylips learned about its TVs (e.g. MAC addresses), one object per TV host.
+
+    Without a path the state is kept in memory for the lifetime of the process.
+    """
+
+    def __init__(self, path=None):
+        """
+        Load the state file.
+
+        Args:
+            path (str, optional): File path.
+
+        Returns:
+            None
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = {}
+        if path and os.path.isfile(path):
+            try:
+                with open(path) as state_file:
+                    self.data = json.load(state_file)
+            except (OSError, ValueError) as e:
+                logging.warning("Can not read state file %s: %s", path, e)
+
+    def get(self, tv, key, default=None):
+        """
+        Read a value.
+
+        Args:
+            tv (str): TV host.
+            key (str): Key.
+            default (object): Returned if the key is not set.
+
+        Returns:
+            object: Value.
+        """
+        with self.lock:
+            return self.data.get(tv, {}).get(key, default)
+
+    def set(self, tv, key, value):
+        """
+        Store a value and write the file if it changed.
+
+        Args:
+            tv (str): TV host.
+            key (str): Key.
+            value (object): JSON serializable value.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            if self.data.get(tv, {}).get(key) == value:
+                return
+            self.data.setdefault(tv, {})[key] = value
+            if not self.path:
+                return
+            try:
+                with open(self.path + ".tmp", "w") as state_file:
+                    json.dump(self.data, state_file, indent=2)
+                os.replace(self.path + ".tmp", self.path)
+            except OSError as e:
+                logging.warning("Can not write state file %s: %s", self.path, e)
+
+
+def open_state(config):
+    """
+    Return the state file configured with 'state_file', opened once per process.
+
+    Args:
+        config (configparser.ConfigParser): Parsed settings.ini.
+
+    Returns:
+        StateFile: Shared state.
+    """
+    path = config["DEFAULT"].get("state_file", "")
+    with state_files_lock:
+        if path not in state_files:
+            state_files[path] = StateFile(path)
+        return state_files[path]
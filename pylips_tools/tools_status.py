@@ -0,0 +1,121 @@
+# tools_status.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import json
+import threading
+
+
+class StatusStore:
+    """
+    Last published MQTT status of a TV.
+
+    Updates are compared field by field against the stored status (a plain structural comparison, nothing is
+    serialized), and only changed fields produce messages: one retained message per changed field on
+    '<topic_status>/<field>' if 'status_subtopics' is enabled (strings as is, other values as JSON), plus the
+    full status retained on 'topic_status' if 'status_snapshot' is enabled. Between begin() and commit() changes
+    are collected, so a poll cycle is published at once.
+    """
+
+    def __init__(self, topic_status, status, subtopics=False, snapshot=True):
+        """
+        Initialize the store.
+
+        Args:
+            topic_status (str): MQTT status topic.
+            status (dict): Initial status.
+            subtopics (bool): Publish every changed field on its own topic.
+            snapshot (bool): Publish the full status on the status topic.
+
+        Returns:
+            None
+        """
+        self.topic_status = str(topic_status)
+        self.status = dict(status)
+        self.subtopics = subtopics
+        self.snapshot = snapshot
+        self.pending = {}
+        self.depth = 0
+        self.lock = threading.RLock()
+
+    @classmethod
+    def from_config(cls, config, topic_status, status):
+        """
+        Create a store from settings.ini.
+
+        Args:
+            config (configparser.ConfigParser): Parsed settings.ini.
+            topic_status (str): MQTT status topic.
+            status (dict): Initial status.
+
+        Returns:
+            StatusStore: New store.
+        """
+        return cls(
+            topic_status, status, config["DEFAULT"].get("status_subtopics", "False").lower() == "true",
+            config["DEFAULT"].get("status_snapshot", "True").lower() == "true"
+        )
+
+    def update(self, update):
+        """
+        Merge a status update.
+
+        Args:
+            update (dict): Status fields.
+
+        Returns:
+            list: (topic, payload) messages to publish retained, empty while a cycle is open.
+        """
+        with self.lock:
+            for field, value in update.items():
+                if field not in self.status or self.status[field] != value:
+                    self.status[field] = value
+                    self.pending[field] = value
+            if self.depth > 0:
+                return []
+            return self.flush()
+
+    def begin(self):
+        """
+        Start collecting changes of a poll cycle.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.depth += 1
+
+    def commit(self):
+        """
+        End a poll cycle.
+
+        Returns:
+            list: (topic, payload) messages for every change of the cycle.
+        """
+        with self.lock:
+            self.depth = max(0, self.depth - 1)
+            if self.depth > 0:
+                return []
+            return self.flush()
+
+    def flush(self):
+        """
+        Turn the collected changes into messages.
+
+        Returns:
+            list: (topic, payload) messages.
+        """
+        if len(self.pending) == 0:
+            return []
+        messages = []
+        if self.subtopics:
+            base = self.topic_status.rstrip("/") + "/"
+            messages.extend(
+                (base + field, value if isinstance(value, str) else json.dumps(value))
+                for field, value in self.pending.items()
+            )
+        if self.snapshot:
+            messages.append((self.topic_status, json.dumps(self.status)))
+        self.pending = {}
+        return messages
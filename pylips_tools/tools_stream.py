@@ -0,0 +1,227 @@
+# tools_stream.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import codecs
+import collections
+import json
+import re
+
+# Bytes read from the socket at a time
+CHUNK_SIZE = 16384
+
+CHANNELS_PATH = "channeldb/tv/channelLists/"
+SETTINGS_STRUCTURE_PATH = "menuitems/settings/structure"
+
+Channel = collections.namedtuple(
+    "Channel", ["ccid", "preset", "name", "onid", "tsid", "sid", "service_type", "type", "logo_version"]
+)
+SettingsNode = collections.namedtuple(
+    "SettingsNode", ["node_id", "parent_id", "depth", "type", "string_id", "context"]
+)
+
+decoder = json.JSONDecoder()
+whitespace = re.compile(r"[\s,]*")
+# Characters that can follow a complete array item
+DELIMITERS = frozenset(",] \t\r\n")
+
+
+def iter_array(chunks, key):
+    """
+    Decode the items of the first JSON array stored under 'key' while the document is still arriving.
+
+    Only the item being decoded is kept in memory, everything before it is dropped as soon as it was yielded.
+
+    Args:
+        chunks (iterable): bytes or str chunks of the document.
+        key (str): Key of the array, e.g. "Channel".
+
+    Yields:
+        object: Decoded array items.
+
+    Raises:
+        ValueError: If the document ends before the array does or an item is not valid JSON.
+    """
+    chunks = iter(chunks)
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    start = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    header = re.compile(r'"%s"\s*(?::\s*)?' % re.escape(key))
+    buffer = ""
+    done = False
+
+    def read():
+        chunk = next(chunks, None)
+        if chunk is None:
+            return utf8.decode(b"", final=True), True
+        return (utf8.decode(chunk) if isinstance(chunk, bytes) else chunk), False
+
+    while True:
+        match = start.search(buffer)
+        if match is not None:
+            buffer = buffer[match.end():]
+            break
+        if done:
+            return
+        # Keep a key header that may continue in the next chunk, however much whitespace it has
+        tail = buffer.rfind('"%s"' % key)
+        if tail >= 0 and header.fullmatch(buffer, tail) is not None:
+            buffer = buffer[tail:]
+        else:
+            buffer = buffer[-len(key) - 1:]
+        text, done = read()
+        buffer += text
+    position = 0
+    while True:
+        position = whitespace.match(buffer, position).end()
+        if position < len(buffer):
+            if buffer[position] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if done:
+                    raise
+            else:
+                # A number is only complete once a delimiter follows, "1" of "1.5" may end the buffer or be
+                # followed by the "." of the next chunk
+                if done or (end < len(buffer) and buffer[end] in DELIMITERS):
+                    position = end
+                    yield item
+                    continue
+        elif done:
+            raise ValueError("Document ended inside the '%s' array" % key)
+        text, done = read()
+        buffer = buffer[position:] + text
+        position = 0
+
+
+def channel_record(channel):
+    """
+    Convert a channel object of a channel list into a Channel row.
+
+    Args:
+        channel (dict): Channel object.
+
+    Returns:
+        Channel: Compact record.
+    """
+    return Channel(
+        channel.get("ccid"), channel.get("preset"), channel.get("name"), channel.get("onid"), channel.get("tsid"),
+        channel.get("sid"), channel.get("serviceType"), channel.get("type"), channel.get("logoVersion")
+    )
+
+
+def settings_records(node, parent_id=None, depth=1):
+    """
+    Flatten a node of the settings structure and its children into SettingsNode rows, depth first.
+
+    Args:
+        node (dict): Node object.
+        parent_id (int): node_id of the parent.
+        depth (int): Depth below the root node.
+
+    Yields:
+        SettingsNode: Compact records.
+    """
+    yield SettingsNode(
+        node.get("node_id"), parent_id, depth, node.get("type"), node.get("string_id"), node.get("context")
+    )
+    data = node.get("data")
+    if isinstance(data, dict):
+        for child in data.get("nodes", []):
+            if isinstance(child, dict):
+                yield from settings_records(child, node.get("node_id"), depth + 1)
+
+
+def stream_chunks(self, path):
+    """
+    Send a GET request and return its body as an iterator of chunks as they arrive.
+
+    A response held by the response cache is returned as a single chunk. The request is made once, without
+    retries, and counts towards the circuit breaker like other requests.
+
+    Args:
+        path (str): API endpoint path.
+
+    Returns:
+        iterable: bytes or str chunks.
+
+    Raises:
+        ConnectionError: If the TV can not be reached or does not answer with HTTP 200.
+    """
+    if self.cache is not None:
+        cached = self.cache.get(path)
+        if cached is not None:
+            return [cached]
+    if not self.breaker.allow():
+        raise ConnectionError("Can not reach the API")
+    try:
+        r = self.session.get(
+            self.base_url + path, verify=False, auth=self.auth, stream=True, timeout=self.breaker.deadline
+        )
+    except Exception as e:
+        self.breaker.failure()
+        raise ConnectionError("GET %s failed: %s" % (path, e))
+    self.breaker.success()
+    if r.status_code != 200:
+        r.close()
+        raise ConnectionError("GET %s returned %d" % (path, r.status_code))
+    return read_response(r)
+
+
+def read_response(r):
+    """
+    Yield the chunks of a streamed response, and release the connection when the caller stops early.
+    """
+    try:
+        yield from r.iter_content(CHUNK_SIZE)
+    finally:
+        r.close()
+
+
+def iter_channels(self, list_id="all"):
+    """
+    Stream the channels of a channel list.
+
+    Args:
+        list_id (str): Channel list id, e.g. "all" or "allsat".
+
+    Yields:
+        Channel: Channels in list order, the first ones before the download is complete.
+    """
+    for channel in iter_array(stream_chunks(self, CHANNELS_PATH + list_id), "Channel"):
+        yield channel_record(channel)
+
+
+def iter_settings_nodes(self):
+    """
+    Stream the nodes of the settings menu structure.
+
+    Every top-level menu (picture, sound, ambilight, ...) is decoded and flattened on its own, so memory holds
+    one menu subtree at a time.
+
+    Yields:
+        SettingsNode: Nodes depth first; the top-level menus have depth 1 and no parent_id.
+    """
+    for node in iter_array(stream_chunks(self, SETTINGS_STRUCTURE_PATH), "nodes"):
+        if isinstance(node, dict):
+            yield from settings_records(node)
+
+
+def index_records(records, field):
+    """
+    Index records by one of their fields; later records win on duplicate values.
+
+    Args:
+        records (iterable): Channel or SettingsNode rows.
+        field (str): Field name, e.g. "ccid", "name" or "node_id". Names are indexed lowercased.
+
+    Returns:
+        dict: Records by field value.
+    """
+    index = {}
+    for record in records:
+        value = getattr(record, field)
+        index[value.lower() if field == "name" and isinstance(value, str) else value] = record
+    return index
@@ -0,0 +1,114 @@
+# conftest.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import configparser
+import os
+import sys
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import pylips  # noqa: E402
+from mock_tv import MockTV, start_mock_tv  # noqa: E402
+from pylips_tools.tools_commands import load_command_index  # noqa: E402
+
+SETTINGS = """[DEFAULT]
+verbose = False
+mqtt_listen = False
+mqtt_update = False
+num_retries = 2
+update_interval = 5
+request_deadline = 2
+retry_delay = 0.01
+power_on_timeout = 5
+wol_broadcast = 127.0.0.1
+wol_port = 9
+state_file = %(state_file)s
+
+[TV]
+host = 127.0.0.1
+port = %(port)d
+apiv = 6
+user = %(user)s
+pass = %(pass)s
+protocol = http://
+
+[MQTT]
+host =
+port =
+user =
+pass =
+tls = False
+cert_path =
+topic_pylips = pylips/cmd
+topic_status = pylips/status
+"""
+
+
+class RecordingMQTT:
+    """
+    Stand-in MQTT client that keeps the published messages.
+    """
+
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload, retain=False):
+        self.published.append((topic, payload))
+
+
+@pytest.fixture(scope="session")
+def commands():
+    return load_command_index(os.path.join(ROOT, "available_commands.json"))[1]
+
+
+@pytest.fixture
+def mock_tv():
+    """
+    Mock TV serving plain HTTP and HTTP with digest auth on free ports.
+    """
+    tv = MockTV(channels=20, notify_timeout=1.0)
+    servers = start_mock_tv(tv, http_port=0, https_port=0, tls=False, wol_port=None)
+    tv.ports = {name: server.server_address[1] for name, server in servers.items()}
+    yield tv
+    # shutdown() waits for the next poll of serve_forever, so both servers are stopped at once
+    stopping = [threading.Thread(target=server.shutdown) for server in servers.values()]
+    for thread in stopping:
+        thread.start()
+    for thread in stopping:
+        thread.join()
+    for server in servers.values():
+        server.server_close()
+
+
+@pytest.fixture
+def make_client(mock_tv, tmp_path):
+    """
+    Create Pylips instances for the mock TV without running the CLI.
+    """
+
+    def make(digest=False, **defaults):
+        config = configparser.ConfigParser()
+        config.read_string(SETTINGS % {
+            "port": mock_tv.ports["https" if digest else "http"], "user": "pylips" if digest else "",
+            "pass": "pylips" if digest else "", "state_file": tmp_path / "state.json"
+        })
+        for key, value in defaults.items():
+            config["DEFAULT"][key] = str(value)
+        available_commands, commands = load_command_index(os.path.join(ROOT, "available_commands.json"))
+        pylips.args = pylips.parse_args([])
+        parent = SimpleNamespace(
+            config=config, verbose=False, available_commands=available_commands, commands=commands, metrics=None
+        )
+        client = pylips.Pylips(None, "TV", parent)
+        client.mqtt = RecordingMQTT()
+        return client
+
+    return make
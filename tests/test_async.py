@@ -0,0 +1,65 @@
+# test_async.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import asyncio
+import gc
+import json
+import warnings
+from types import SimpleNamespace
+
+from pylips_tools.tools_async import AsyncPylips
+
+
+def update_cycle(profile=None):
+    """
+    Run AsyncPylips.update_cycle against canned responses.
+
+    Returns:
+        tuple: Paths and commands requested, and the published status update.
+    """
+    requested = []
+    published = {}
+
+    async def get(path, *args):
+        requested.append(path)
+        return json.dumps({"powerstate": "On"}) if path == "powerstate" else "{}"
+
+    async def run_command(command, *args):
+        requested.append(command)
+        return "{}"
+
+    async def update_status(update):
+        published.update(update)
+
+    tv = SimpleNamespace(
+        get=get, run_command=run_command, update_status=update_status, verbose=False,
+        pylips=SimpleNamespace(profile=profile)
+    )
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        asyncio.run(AsyncPylips.update_cycle(tv))
+        gc.collect()
+    assert [str(warning.message) for warning in caught] == []
+    return requested, published
+
+
+def test_every_probe_runs_without_a_profile():
+    requested, published = update_cycle()
+    assert requested == [
+        "powerstate", "ambilight/currentconfiguration", "ambihue_state", "ambilight_brightness_state",
+        "display_light_sensor_state"
+    ]
+    assert published == {"powerstate": "On"}
+
+
+def test_probes_of_missing_features_are_skipped():
+    requested, published = update_cycle({"features": {"ambilight": False, "huelamp": False}})
+    assert requested == ["powerstate", "display_light_sensor_state"]
+    assert published == {"powerstate": "On"}
+
+
+def test_light_sensor_probe_follows_the_profile():
+    requested, published = update_cycle({"features": {"light_sensor": False}})
+    assert requested == ["powerstate", "ambilight/currentconfiguration", "ambihue_state", "ambilight_brightness_state"]
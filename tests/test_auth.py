@@ -0,0 +1,32 @@
+# test_auth.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import threading
+
+
+def test_nonce_is_reused(make_client, mock_tv):
+    client = make_client(digest=True)
+    for _ in range(5):
+        assert '"powerstate"' in client.get("powerstate", False, 0, False)
+    assert client.auth_stats() == {"requests": 5, "challenges": 1}
+    assert mock_tv.challenges == 1
+
+
+def test_nonce_is_shared_by_threads(make_client, mock_tv):
+    client = make_client(digest=True, pool_maxsize=4)
+    client.get("powerstate", False, 0, False)
+    responses = []
+
+    def poll():
+        for _ in range(5):
+            responses.append(client.get("powerstate", False, 0, False))
+
+    threads = [threading.Thread(target=poll) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all('"powerstate"' in response for response in responses)
+    assert client.auth_stats() == {"requests": 21, "challenges": 1}
@@ -0,0 +1,65 @@
+# test_batch.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import logging
+
+import pytest
+
+from pylips_tools.tools_batch import validate_batch
+
+
+def test_validate_normalizes_entries(commands):
+    entries = validate_batch(commands, '["volume_up", {"command": "get", "path": "powerstate"}]')
+    assert entries == [
+        {"command": "volume_up", "body": None, "path": ""}, {"command": "get", "body": None, "path": "powerstate"}
+    ]
+
+
+def test_validate_reports_every_invalid_entry(commands):
+    with pytest.raises(ValueError) as error:
+        validate_batch(commands, ["volume_up", "no_such_command", {"command": "post"}, 5])
+    assert "#1" in str(error.value) and "#2" in str(error.value) and "#3" in str(error.value)
+
+
+def test_results_keep_batch_order(make_client, mock_tv):
+    client = make_client(batch_concurrency=3)
+    batch = ["powerstate", "volume_up", {"command": "get", "path": "system"}, "volume_down", "powerstate"]
+    response = client.run_batch(batch, verbose=False)
+    assert [result["command"] for result in response["results"]] == [
+        entry if isinstance(entry, str) else entry["command"] for entry in batch
+    ]
+    assert response["results"][0]["response"] == {"powerstate": "On"}
+    assert response["results"][1]["response"] == {"response": "OK"}
+
+
+def test_batch_concurrency_sizes_the_pool(make_client):
+    client = make_client(batch_concurrency=4)
+    assert client.pool_maxsize == 4
+    assert client.session.get_adapter("http://127.0.0.1/")._pool_maxsize == 4
+
+
+def test_executor_and_nonce_are_reused_between_batches(make_client, mock_tv):
+    client = make_client(digest=True, batch_concurrency=2)
+    client.run_batch(["powerstate"] * 4, verbose=False)
+    executor = client.batch_executor
+    challenges = client.auth_stats()["challenges"]
+    client.run_batch(["powerstate"] * 4, verbose=False)
+    assert client.batch_executor is executor
+    assert client.auth_stats()["challenges"] == challenges
+
+
+def test_concurrency_above_the_pool_is_clamped(make_client, mock_tv, caplog):
+    client = make_client(batch_concurrency=2)
+    with caplog.at_level(logging.WARNING):
+        response = client.run_batch(["powerstate"] * 3, concurrency=8, verbose=False)
+    assert len(response["results"]) == 3
+    assert any("limited to the 2 pooled connections" in record.getMessage() for record in caplog.records)
+
+
+def test_validate_rejects_bad_parameters_before_sending(make_client, mock_tv):
+    client = make_client()
+    response = client.run_batch(["volume_up", {"command": "ambilight_brightness", "body": {"value": "bright"}}])
+    assert "#1" in response["error"] and "'value'" in response["error"]
+    assert mock_tv.requests["POST input/key"] == 0
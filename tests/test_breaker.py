@@ -0,0 +1,61 @@
+# test_breaker.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import logging
+import time
+
+from pylips_tools.tools_breaker import CLOSED, HALF_OPEN, OPEN, UNREACHABLE, CircuitBreaker
+
+
+def test_opens_after_threshold():
+    breaker = CircuitBreaker(threshold=2, reset_timeout=60)
+    assert breaker.allow()
+    assert not breaker.failure()
+    assert breaker.state == CLOSED
+    assert breaker.failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.stats()["fast_fails"] == 1
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=60)
+    breaker.failure()
+    breaker.open_until = time.monotonic() - 1
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_with_longer_timeout():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=10, reset_max=15)
+    assert breaker.failure()
+    breaker.open_until = time.monotonic() - 1
+    assert breaker.allow()
+    assert not breaker.failure()
+    assert breaker.state == OPEN
+    assert breaker.open_timeout == 15
+    assert breaker.stats()["opened"] == 1
+
+
+def test_backoff_stays_before_deadline():
+    breaker = CircuitBreaker(retry_delay=10)
+    deadline = time.monotonic() + 0.5
+    assert 0 <= breaker.backoff(3, deadline) <= 0.5
+
+
+def test_unreachable_tv_logs_one_error(make_client, mock_tv, caplog):
+    client = make_client(request_deadline=0.5, num_retries=1)
+    client.base_url = "http://127.0.0.1:9/6/"
+    with caplog.at_level(logging.DEBUG):
+        for _ in range(5):
+            assert client.post("input/key", {"key": "VolumeUp"}, False) == UNREACHABLE
+            assert client.get("powerstate", False, 0, False) == UNREACHABLE
+    errors = [record for record in caplog.records if "Can not reach the API" in record.getMessage()]
+    assert len([record for record in errors if record.levelno == logging.ERROR]) == 1
+    assert client.breaker.stats()["fast_fails"] == 9
@@ -0,0 +1,76 @@
+# test_cache.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import json
+import os
+
+from pylips_tools import tools_cache
+from pylips_tools.tools_cache import ResponseCache
+
+
+def test_only_configured_paths_are_cached():
+    cache = ResponseCache({"system": 60})
+    cache.put("applications", "[]")
+    assert cache.get("applications") is None
+    cache.put("/system/", "{}")
+    assert cache.get("System") == "{}"
+
+
+def test_entries_expire_after_their_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(tools_cache.time, "time", lambda: now[0])
+    cache = ResponseCache({"system": 60})
+    cache.put("system", "{}")
+    now[0] += 59
+    assert cache.get("system") == "{}"
+    now[0] += 2
+    assert cache.get("system") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_post_invalidates_related_paths():
+    cache = ResponseCache({"ambilight/currentconfiguration": 60, "ambilight/topology": 60, "system": 60})
+    for path in ("ambilight/currentconfiguration", "ambilight/topology", "system"):
+        cache.put(path, "{}")
+    assert cache.invalidate("ambilight/power") == 1
+    assert cache.get("ambilight/currentconfiguration") is None
+    assert cache.get("ambilight/topology") == "{}"
+    assert cache.get("system") == "{}"
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache({"a": 60, "b": 60, "c": 60}, size=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_writes_are_debounced(tmp_path, monkeypatch):
+    monkeypatch.setattr(tools_cache, "SAVE_DELAY", 60)
+    path = str(tmp_path / "cache")
+    cache = ResponseCache({"system": 60}, path=path)
+    for index in range(10):
+        cache.put("system", str(index))
+    assert not os.path.exists(path)
+    cache.flush()
+    with open(path) as cache_file:
+        assert json.load(cache_file)[0][1][1] == "9"
+    assert ResponseCache({"system": 60}, path=path).get("system") == "9"
+
+
+def test_cache_file_is_kept_per_host(make_client, tmp_path):
+    client = make_client(cache_file=tmp_path / "cache")
+    assert client.cache is None
+    client.config.add_section("CACHE")
+    client.config["CACHE"]["system"] = "60"
+    client.setup_tv()
+    assert client.cache.path == str(tmp_path / "cache") + ".127.0.0.1"
+    client.tv["host"] = "192.168.0.2"
+    client.setup_tv()
+    assert client.cache.path == str(tmp_path / "cache") + ".192.168.0.2"
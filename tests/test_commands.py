@@ -0,0 +1,55 @@
+# test_commands.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import json
+
+import pytest
+
+
+def test_render_default_body(commands):
+    entry = commands.get("volume_up")
+    assert entry.method == "post"
+    assert entry.render() is entry.body
+    assert json.loads(entry.render()) == {"key": "VolumeUp"}
+
+
+def test_render_slot_value(commands):
+    body = json.loads(commands.get("ambilight_brightness").render({"value": "7"}))
+    assert body["values"][0]["value"]["data"]["value"] == 7
+
+
+def test_render_single_slot_shorthand(commands):
+    body = json.loads(commands.get("ambilight_brightness").render("4"))
+    assert body["values"][0]["value"]["data"]["value"] == 4
+
+
+def test_render_converts_slots(commands):
+    body = json.loads(commands.get("ambilight_color").render({"hue": 180, "saturation": 40, "brightness": 200}))
+    assert body["colorSettings"]["color"] == {"hue": 127, "saturation": 102, "brightness": 200}
+
+
+def test_render_does_not_change_the_template(commands):
+    entry = commands.get("ambilight_brightness")
+    template = entry.template
+    entry.render({"value": 1})
+    entry.render({"value": 9})
+    assert entry.template == template
+
+
+def test_render_rejects_missing_and_invalid_slots(commands):
+    with pytest.raises(ValueError):
+        commands.get("ambilight_color").render({"hue": 10})
+    with pytest.raises(ValueError):
+        commands.get("ambilight_brightness").render({"value": "bright"})
+
+
+def test_render_replaces_body_of_commands_without_slots(commands):
+    assert json.loads(commands.get("volume_up").render({"key": "Mute"})) == {"key": "Mute"}
+
+
+def test_post_without_body_sends_no_body(make_client, mock_tv):
+    client = make_client()
+    assert json.loads(client.post("input/key", None, False)) == {"response": "OK"}
+    assert client.breaker.stats()["state"] == "closed"
@@ -0,0 +1,45 @@
+# test_daemon.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import json
+import socket
+
+from pylips_tools import tools_daemon
+from pylips_tools.tools_daemon import forward_to_daemon, handle_daemon_request
+
+
+def test_missing_daemon_falls_back(tmp_path):
+    assert forward_to_daemon(str(tmp_path / "pylips.sock"), {"command": "powerstate"}) is None
+
+
+def test_socket_of_another_user_falls_back(tmp_path, monkeypatch):
+    class ForeignSocket(socket.socket):
+        def connect(self, address):
+            raise PermissionError(13, "Permission denied")
+
+    monkeypatch.setattr(tools_daemon.socket, "socket", ForeignSocket)
+    assert forward_to_daemon(str(tmp_path / "pylips.sock"), {"command": "powerstate"}) is None
+
+
+def test_hung_daemon_times_out(tmp_path, monkeypatch):
+    monkeypatch.setattr(tools_daemon, "DAEMON_TIMEOUT", 0.2)
+    path = str(tmp_path / "pylips.sock")
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+    try:
+        response = forward_to_daemon(path, {"command": "powerstate"})
+    finally:
+        server.close()
+    assert "did not answer" in response["error"]
+
+
+def test_requests_run_on_the_addressed_tv(make_client, mock_tv):
+    client = make_client()
+    assert json.loads(handle_daemon_request(client, {"command": "powerstate"})["response"]) == {"powerstate": "On"}
+    assert json.loads(handle_daemon_request(client, {"command": "get", "path": "powerstate"})["response"]) == {
+        "powerstate": "On"
+    }
+    assert "error" in handle_daemon_request(client, {"command": "powerstate", "tv": "bedroom"})
@@ -0,0 +1,32 @@
+# test_discovery.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import logging
+
+import requests
+
+from pylips_tools.tools_discovery import capability_profile, discover
+from pylips_tools.tools_state import open_state
+
+
+def test_profile_detects_the_light_sensor(mock_tv):
+    with requests.Session() as session:
+        profile = capability_profile(session, "127.0.0.1", mock_tv.ports["http"], "http://")
+    assert profile["features"]["light_sensor"] is True
+    assert profile["features"]["ambilight"] is True
+
+
+def test_discovered_profiles_are_saved(make_client, mock_tv):
+    client = make_client()
+    profiles = discover(client, "127.0.0.1", ports=((mock_tv.ports["http"], "http://"),), workers=1, timeout=0.5)
+    assert len(profiles) == 1
+    assert open_state(client.config).get("127.0.0.1", "profile")["features"] == profiles[0]["features"]
+
+
+def test_discovery_warns_without_state_file(make_client, caplog):
+    client = make_client(state_file="")
+    with caplog.at_level(logging.WARNING):
+        client.discover("127.0.0.2/32", workers=1, timeout=0.05)
+    assert "state_file is not set" in caplog.text
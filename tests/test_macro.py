@@ -0,0 +1,44 @@
+# test_macro.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import json
+
+import pytest
+
+from pylips_tools.tools_macro import Key, compile_keys, parse_keys
+
+
+def test_parse_comma_separated_keys_and_pauses():
+    assert parse_keys("digit_1, digit_2, 0.5, confirm") == ("digit_1", "digit_2", 0.5, "confirm")
+
+
+def test_parse_json_list():
+    assert parse_keys('["home", 1, "confirm"]') == ("home", 1, "confirm")
+
+
+def test_parse_rejects_other_types():
+    with pytest.raises(ValueError):
+        parse_keys({"keys": "home"})
+    with pytest.raises(ValueError):
+        parse_keys(["home", None])
+
+
+def test_compile_resolves_paths_and_bodies(commands):
+    steps = compile_keys(commands, ("digit_1", 0.25, "confirm"))
+    assert steps[1] == 0.25
+    assert isinstance(steps[0], Key) and steps[0].path == "input/key"
+    assert json.loads(steps[0].body) == {"key": "Digit1"}
+    assert json.loads(steps[2].body) == {"key": "Confirm"}
+
+
+def test_compile_rejects_commands_that_are_not_keys(commands):
+    with pytest.raises(ValueError) as error:
+        compile_keys(commands, ("digit_1", "powerstate", "ambilight_brightness", "no_such_key"))
+    assert "#0" not in str(error.value)
+    assert "#1" in str(error.value) and "#2" in str(error.value) and "#3" in str(error.value)
+
+
+def test_negative_pauses_are_clamped(commands):
+    assert compile_keys(commands, (-1,)) == (0.0,)
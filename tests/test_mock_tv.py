@@ -0,0 +1,49 @@
+# test_mock_tv.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import json
+
+from mock_tv import MockTV
+
+
+def test_examples_are_loaded():
+    tv = MockTV(channels=3)
+    assert tv.get("powerstate") == (200, {"powerstate": "On"})
+    assert len(tv.get("channeldb/tv/channelLists/all")[1]["Channel"]) == 3
+    assert tv.get("no/such/path") == (404, None)
+
+
+def test_posts_change_the_state():
+    tv = MockTV()
+    assert tv.post("input/key", {"key": "Standby"}) == (200, None)
+    assert tv.get("powerstate")[1] == {"powerstate": "Standby"}
+
+
+def test_notifychange_returns_changed_endpoints():
+    tv = MockTV(notify_timeout=0.1)
+    assert tv.notifychange({"powerstate": {"powerstate": "On"}}) == {}
+    assert tv.notifychange({"powerstate": {}}) == {"powerstate": {"powerstate": "On"}}
+
+
+def test_wake_on_lan_wakes_a_sleeping_tv():
+    tv = MockTV(wake_delay=0)
+    tv.sleep()
+    assert tv.is_asleep()
+    tv.wake_on_lan(b"\xff" * 6 + bytes.fromhex("70C94E478D82") * 16)
+    assert not tv.is_asleep()
+
+
+def test_plain_port_answers_without_auth(make_client, mock_tv):
+    client = make_client()
+    assert json.loads(client.get("powerstate", False, 0, False)) == {"powerstate": "On"}
+    assert mock_tv.challenges == 0
+
+
+def test_digest_port_challenges_once(make_client, mock_tv):
+    client = make_client(digest=True)
+    client.get("powerstate", False, 0, False)
+    client.get("system", False, 0, False)
+    assert mock_tv.challenges == 1
+    assert mock_tv.stats()["requests"]["GET powerstate"] == 1
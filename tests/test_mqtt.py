@@ -0,0 +1,56 @@
+# test_mqtt.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+from types import SimpleNamespace
+
+import pytest
+
+from pylips_tools import tools_mqtt
+from pylips_tools.tools_mqtt import notifychange
+
+
+@pytest.fixture
+def answer(make_client, monkeypatch):
+    def make(status, text):
+        client = make_client()
+        monkeypatch.setattr(
+            client.session, "post", lambda *args, **kwargs: SimpleNamespace(status_code=status, text=text)
+        )
+        return client
+
+    return make
+
+
+@pytest.mark.parametrize("status, text", [(404, ""), (401, ""), (200, ""), (200, "<html>")])
+def test_error_replies_raise(answer, status, text):
+    with pytest.raises(ValueError):
+        notifychange(answer(status, text), {"powerstate": {}}, 1)
+
+
+def test_changes_are_returned(make_client, mock_tv):
+    client = make_client()
+    assert notifychange(client, {"powerstate": {}}, 2) == {"powerstate": {"powerstate": "On"}}
+
+
+def test_timeout_means_no_change(make_client, mock_tv):
+    client = make_client()
+    assert notifychange(client, {"powerstate": {"powerstate": "On"}}, 0.3) == {}
+
+
+def test_unreachable_tv_returns_none(make_client):
+    client = make_client()
+    client.base_url = "http://127.0.0.1:9/6/"
+    assert notifychange(client, {"powerstate": {}}, 1) is None
+
+
+def test_notifier_backs_off_and_falls_back_to_polling(answer, monkeypatch):
+    client = answer(404, "")
+    client.config["DEFAULT"]["notify_max_failures"] = "3"
+    sleeps = []
+    monkeypatch.setattr(tools_mqtt.time, "sleep", sleeps.append)
+    monkeypatch.setattr(tools_mqtt, "start_mqtt_poller", lambda self: "polling")
+    monkeypatch.setattr(client, "mqtt_update_cycle", lambda: None)
+    assert tools_mqtt.start_mqtt_notifier(client, False) == "polling"
+    assert sleeps == [5, 5]
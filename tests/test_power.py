@@ -0,0 +1,56 @@
+# test_power.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import time
+
+import pytest
+
+from pylips_tools.tools_power import magic_packet, tv_mac
+
+
+def test_magic_packet_layout():
+    packet = magic_packet("70:C9:4E:47:8D:82")
+    assert len(packet) == 102
+    assert packet[:6] == b"\xff" * 6
+    assert packet[6:] == bytes.fromhex("70C94E478D82") * 16
+
+
+def test_magic_packet_accepts_other_separators():
+    assert magic_packet("70-c9-4e-47-8d-82") == magic_packet("70c9.4e47.8d82")
+
+
+def test_magic_packet_rejects_invalid_addresses():
+    with pytest.raises(ValueError):
+        magic_packet("70:C9:4E:47:8D")
+
+
+def test_standby_tv_is_switched_on_with_an_open_breaker(make_client, mock_tv):
+    mock_tv.set("powerstate", {"powerstate": "Standby"})
+    client = make_client()
+    client.breaker.failure()
+    result = client.power_on(timeout=3)
+    assert result["ready"], result
+    assert result["method"] == "powerstate"
+    assert mock_tv.state["powerstate"]["powerstate"] == "On"
+
+
+def test_ready_result_does_not_wait_for_the_mac(make_client, mock_tv):
+    # Without network/devices the notifychange request of learn_mac is held for the whole notify timeout
+    del mock_tv.state["network/devices"]
+    mock_tv.notify_timeout = 2.0
+    client = make_client()
+    start = time.monotonic()
+    result = client.power_on(timeout=3)
+    assert result["method"] == "already_on"
+    assert time.monotonic() - start < 1.0
+
+
+def test_mac_is_learned_in_the_background(make_client, mock_tv):
+    client = make_client()
+    client.power_on(timeout=3)
+    deadline = time.monotonic() + 2
+    while tv_mac(client) is None and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert tv_mac(client) == "70:C9:4E:47:8D:82"
@@ -0,0 +1,110 @@
+# test_queue.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import asyncio
+from types import SimpleNamespace
+
+from pylips_tools.tools_queue import CommandQueue, coalesce_key
+
+
+def queue(commands, size=64, drop="oldest"):
+    handled = []
+    pylips = SimpleNamespace(commands=commands, name="", mqtt_handle_message=handled.append)
+    return CommandQueue(pylips, size, drop), handled
+
+
+def test_state_commands_share_a_key(commands):
+    first = coalesce_key(commands, {"command": "ambilight_brightness", "body": {"value": 1}})
+    second = coalesce_key(commands, {"command": "ambilight_brightness", "body": {"value": 9}})
+    assert first is not None and first == second
+
+
+def test_key_presses_and_batches_keep_their_order(commands):
+    assert coalesce_key(commands, {"command": "volume_up"}) is None
+    assert coalesce_key(commands, {"batch": ["volume_up"]}) is None
+    assert coalesce_key(commands, {"keys": ["digit_1"]}) is None
+    assert coalesce_key(commands, {"command": "post", "path": "input/key", "body": {"key": "Mute"}}) is None
+
+
+def test_settings_updates_are_keyed_by_node(commands):
+    body = {"values": [{"value": {"Nodeid": 1, "data": {"value": 1}}}]}
+    other = {"values": [{"value": {"Nodeid": 2, "data": {"value": 1}}}]}
+    path = "menuitems/settings/update"
+    assert coalesce_key(commands, {"command": "post", "path": path, "body": body}) != \
+        coalesce_key(commands, {"command": "post", "path": path, "body": other})
+
+
+def test_gets_share_a_key(commands):
+    assert coalesce_key(commands, {"command": "powerstate"}) == coalesce_key(
+        commands, {"command": "get", "path": "powerstate"}
+    )
+
+
+def test_waiting_command_is_replaced_in_place(commands):
+    command_queue, handled = queue(commands)
+    command_queue.put({"command": "ambilight_brightness", "body": {"value": 1}})
+    command_queue.put({"command": "volume_up"})
+    command_queue.put({"command": "ambilight_brightness", "body": {"value": 9}})
+    assert [message for key, message in command_queue.slots] == [
+        {"command": "ambilight_brightness", "body": {"value": 9}}, {"command": "volume_up"}
+    ]
+    assert command_queue.stats()["coalesced"] == 1
+
+
+def test_full_queue_drops_oldest(commands):
+    command_queue, handled = queue(commands, size=2)
+    for key in ("digit_1", "digit_2", "digit_3"):
+        command_queue.put({"command": key})
+    assert [message["command"] for key, message in command_queue.slots] == ["digit_2", "digit_3"]
+    assert command_queue.stats()["dropped"] == 1
+
+
+def test_full_queue_drops_newest(commands):
+    command_queue, handled = queue(commands, size=2, drop="newest")
+    for key in ("digit_1", "digit_2", "digit_3"):
+        command_queue.put({"command": key})
+    assert [message["command"] for key, message in command_queue.slots] == ["digit_1", "digit_2"]
+
+
+def test_dropped_state_command_can_be_queued_again(commands):
+    command_queue, handled = queue(commands, size=1)
+    command_queue.put({"command": "ambilight_brightness", "body": {"value": 1}})
+    command_queue.put({"command": "volume_up"})
+    command_queue.put({"command": "ambilight_brightness", "body": {"value": 2}})
+    assert [message["command"] for key, message in command_queue.slots] == ["ambilight_brightness"]
+    assert command_queue.stats()["coalesced"] == 0
+
+
+def test_status_messages_bypass_the_queue(commands):
+    command_queue, handled = queue(commands)
+    command_queue.put({"status": {"powerstate": "On"}})
+    assert handled == [{"status": {"powerstate": "On"}}]
+    assert len(command_queue.slots) == 0
+
+
+def test_async_queue_coalesces_and_drops(commands):
+    from pylips_tools.tools_async import AsyncCommandQueue
+
+    handled = []
+
+    async def handle_message(message):
+        handled.append(message)
+
+    async def run():
+        tv = SimpleNamespace(commands=commands, name="", handle_message=handle_message)
+        command_queue = AsyncCommandQueue(tv, size=2)
+        command_queue.put({"command": "ambilight_brightness", "body": {"value": 1}})
+        command_queue.put({"command": "ambilight_brightness", "body": {"value": 5}})
+        command_queue.put({"command": "digit_1"})
+        command_queue.put({"command": "digit_2"})
+        command_queue.start()
+        while command_queue.stats()["depth"] > 0 or command_queue.executed < 2:
+            await asyncio.sleep(0)
+        command_queue.task.cancel()
+        return command_queue.stats()
+
+    stats = asyncio.run(run())
+    assert handled == [{"command": "digit_1"}, {"command": "digit_2"}]
+    assert stats == {"depth": 0, "coalesced": 1, "dropped": 1, "executed": 2}
@@ -0,0 +1,35 @@
+# test_scheduler.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+from pylips_tools.tools_scheduler import StatusScheduler
+
+
+def test_probes_are_counted(make_client, mock_tv):
+    scheduler = StatusScheduler(make_client())
+    scheduler.run_probe("powerstate")
+    assert scheduler.powered
+    assert scheduler.stats()["probes"]["powerstate"]["requests"] == 1
+
+
+def test_fast_failed_probes_are_not_counted(make_client):
+    client = make_client()
+    client.breaker.failure()
+    scheduler = StatusScheduler(client)
+    for _ in range(3):
+        scheduler.run_probe("powerstate")
+    assert scheduler.failures == 3
+    assert scheduler.stats()["requests"] == 0
+    assert scheduler.request_rate() == 0
+
+
+def test_interval_backs_off_while_unreachable(make_client):
+    client = make_client(backoff_max=40)
+    client.breaker.failure()
+    scheduler = StatusScheduler(client)
+    intervals = []
+    for _ in range(5):
+        scheduler.run_probe("powerstate")
+        intervals.append(scheduler.interval("powerstate"))
+    assert intervals == [10, 20, 40, 40, 40]
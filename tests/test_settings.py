@@ -0,0 +1,80 @@
+# test_settings.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import asyncio
+import threading
+from types import SimpleNamespace
+
+from pylips_tools import tools_settings
+from pylips_tools.tools_async import AsyncPylips
+from pylips_tools.tools_settings import command_node_ids, settings_node_index
+
+
+def test_command_names_resolve_without_a_request(make_client, mock_tv):
+    client = make_client()
+    node_ids = command_node_ids(client.commands)
+    assert node_ids["ambilight_brightness"] == 2130968780
+    settings = client.get_settings(["ambilight_brightness_state"])
+    assert settings == {"ambilight_brightness_state": {"value": 0, "selected_item": 0}}
+    assert client.settings_nodes is None
+
+
+def test_settings_are_written_and_read_in_one_request(make_client, mock_tv):
+    client = make_client()
+    client.set_settings({"ambilight_brightness": 7, "display_light_sensor": {"selected_item": 1}})
+    settings = client.get_settings(["ambilight_brightness", "display_light_sensor"])
+    assert settings == {"ambilight_brightness": {"value": 7}, "display_light_sensor": {"selected_item": 1}}
+    assert mock_tv.requests["POST menuitems/settings/update"] == 1
+    assert mock_tv.requests["POST menuitems/settings/current"] == 1
+
+
+def test_structure_names_are_indexed(make_client, mock_tv):
+    client = make_client()
+    node_ids = settings_node_index(client)
+    assert "menu_0_item_0" in node_ids
+    assert client.get_settings(["menu_0_item_0"])["menu_0_item_0"] == {"value": 0, "selected_item": 0}
+
+
+def test_slow_tv_does_not_block_other_tvs(make_client, monkeypatch):
+    slow = make_client()
+    fast = make_client()
+    fast.tv["host"] = "127.0.0.2"
+    fetching = threading.Event()
+    release = threading.Event()
+
+    def structure(self):
+        if self is slow:
+            fetching.set()
+            release.wait(5)
+        return iter(())
+
+    monkeypatch.setattr(tools_settings, "iter_settings_nodes", structure)
+    thread = threading.Thread(target=settings_node_index, args=(slow,))
+    thread.start()
+    try:
+        assert fetching.wait(5)
+        finished = threading.Event()
+        threading.Thread(target=lambda: (settings_node_index(fast), finished.set()), daemon=True).start()
+        assert finished.wait(2)
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_async_bridge_writes_settings_and_stops_effects(make_client, mock_tv):
+    client = make_client()
+    stopped = []
+    client.effect_player = SimpleNamespace(stop=lambda: stopped.append(True))
+    sent = []
+
+    async def run_command(command, body, verbose):
+        sent.append(command)
+
+    tv = SimpleNamespace(pylips=client, commands=client.commands, run_command=run_command, verbose=False)
+    asyncio.run(AsyncPylips.handle_message(tv, {"settings": {"ambilight_brightness": 7}}))
+    assert client.get_settings(["ambilight_brightness"]) == {"ambilight_brightness": {"value": 7}}
+    asyncio.run(AsyncPylips.handle_message(tv, {"command": "ambilight_off"}))
+    assert stopped == [True] and client.effect_player is None
+    assert sent == ["ambilight_off"]
@@ -0,0 +1,54 @@
+# test_status.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import json
+
+from pylips_tools.tools_status import StatusStore
+
+
+def test_only_changes_are_published():
+    store = StatusStore("pylips/status", {"powerstate": "Off", "ambilight": False})
+    messages = store.update({"powerstate": "On", "ambilight": False})
+    assert messages == [("pylips/status", json.dumps({"powerstate": "On", "ambilight": False}))]
+    assert store.update({"powerstate": "On"}) == []
+
+
+def test_nested_values_are_compared_structurally():
+    store = StatusStore("pylips/status", {"ambilight": {"styleName": "FOLLOW_VIDEO", "menuSetting": "STANDARD"}})
+    assert store.update({"ambilight": {"menuSetting": "STANDARD", "styleName": "FOLLOW_VIDEO"}}) == []
+
+
+def test_cycle_is_published_at_once():
+    store = StatusStore("pylips/status", {"powerstate": "Off"}, subtopics=True, snapshot=True)
+    store.begin()
+    assert store.update({"powerstate": "On"}) == []
+    assert store.update({"ambihue": True}) == []
+    messages = store.commit()
+    assert messages == [
+        ("pylips/status/powerstate", "On"), ("pylips/status/ambihue", "true"),
+        ("pylips/status", json.dumps({"powerstate": "On", "ambihue": True}))
+    ]
+    store.begin()
+    store.update({"powerstate": "On"})
+    assert store.commit() == []
+
+
+def test_nested_cycles_publish_when_the_outer_one_ends():
+    store = StatusStore("pylips/status", {}, snapshot=False, subtopics=True)
+    store.begin()
+    store.begin()
+    store.update({"app": "Netflix"})
+    assert store.commit() == []
+    assert store.commit() == [("pylips/status/app", "Netflix")]
+
+
+def test_standby_is_published_in_poll_mode(mock_tv, make_client):
+    mock_tv.set("powerstate", {"powerstate": "Standby"})
+    client = make_client()
+    client.mqtt_update_cycle()
+    topic, payload = client.mqtt.published[-1]
+    assert topic == "pylips/status"
+    assert json.loads(payload)["powerstate"] == "Standby"
+    assert json.loads(payload)["ambilight"] is False
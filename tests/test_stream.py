@@ -0,0 +1,51 @@
+# test_stream.py
+# version 0.0.1b1
+# dude code - alexander lauterbach
+# 161026
+
+import json
+
+import pytest
+
+from pylips_tools.tools_stream import iter_array
+
+DOCUMENTS = (
+    '{"Channel": [1.5]}',
+    '{"id": "all", "Channel": [-2e3, 10, 0.25, {"ccid": 1, "name": "A [1]"}, "x", true, null, [1, 2]]}',
+    '{"a": "Channel", "Channel":[]}',
+    '{"version": 1, "Channel"' + ' ' * 40 + '\n\t:' + ' ' * 40 + '[ 1.25 , 7 ] }',
+)
+
+
+def split(document, size):
+    return [document[index:index + size].encode("utf-8") for index in range(0, len(document), size)]
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_items_are_the_same_at_every_chunk_size(document):
+    expected = json.loads(document)["Channel"]
+    for size in range(1, len(document) + 1):
+        assert list(iter_array(split(document, size), "Channel")) == expected
+
+
+def test_multibyte_characters_split_across_chunks():
+    document = json.dumps({"Channel": [{"name": "Das Erste HD äöü €"}]}, ensure_ascii=False)
+    for size in range(1, 8):
+        assert list(iter_array(split(document, size), "Channel")) == json.loads(document)["Channel"]
+
+
+def test_items_are_yielded_before_the_document_ends():
+    def chunks():
+        yield b'{"Channel": [{"ccid": 1}, '
+        raise AssertionError("read past the first item")
+
+    assert next(iter_array(chunks(), "Channel")) == {"ccid": 1}
+
+
+def test_missing_key_yields_nothing():
+    assert list(iter_array([b'{"other": [1, 2]}'], "Channel")) == []
+
+
+def test_truncated_array_raises():
+    with pytest.raises(ValueError):
+        list(iter_array([b'{"Channel": [{"ccid": 1}, {"cc'], "Channel"))